@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmarks offline do pipeline de correção e de cada etapa, sem rede e sem chaves de API.
+
+Os serviços externos são trocados pelos substitutos determinísticos de stubs.py
+(LLMs com latência simulada, embeddings por hashing, Cross-Encoder por sobreposição
+de tokens) e a busca roda sobre um corpus sintético gravado em um diretório
+temporário, com o mesmo código de produção (Chroma ou índice NumPy, BM25, RRF,
+cascata de re-ranking, empacotamento do contexto).
+
+Etapas:
+    hyde       generate_hypothetical_document
+    retrieval  aretrieve_fused (embedding da consulta + busca vetorial + BM25)
+    rerank     rerank_with_cross_encoder
+    prompt     empacotamento do contexto + montagem do prompt da correção
+    pipeline   correct_essay_pipeline, de ponta a ponta
+
+Cada etapa roda em um processo novo, para que o pico de memória (RSS) seja o dela.
+Para cada uma são exibidos p50/p95/p99, vazão e pico de RSS. Os resultados podem
+ser gravados como baseline (JSON) e comparados em execuções seguintes: o script
+termina com código 1 se o p50, o p95 ou o pico de RSS piorar além do limiar.
+
+Exemplo:
+    python benchmarks/run_benchmarks.py --retriever numpy --save-baseline benchmarks/baselines/local.json
+    python benchmarks/run_benchmarks.py --retriever numpy --baseline benchmarks/baselines/local.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import stubs
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STAGES = ["hyde", "retrieval", "rerank", "prompt", "pipeline"]
+
+# Diferenças menores que estas não contam como regressão (ruído de medição)
+MIN_DELTA_MS = 1.0
+MIN_RSS_DELTA_MB = 16.0
+
+# Opções que não alteram o que é medido (ignoradas ao comparar com o baseline)
+NON_WORKLOAD_OPTIONS = {"stages", "baseline", "save_baseline", "output", "threshold", "log_level"}
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo, em MB (None onde `resource` não existe, ex.: Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss é em KB no Linux e em bytes no macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def build_corpus(options: dict, corpus_dir: str):
+    """Grava o corpus sintético nos índices usados pelo pipeline (vetorial e BM25)."""
+    start = time.perf_counter()
+    chunks = stubs.synthetic_corpus(options["corpus_size"], seed=options["seed"])
+    embeddings = stubs.HashingEmbeddings(options["dimensions"])
+    if options["retriever"] == "chroma":
+        stubs.build_chroma_index(chunks, embeddings, os.path.join(corpus_dir, "chroma"))
+    else:
+        stubs.build_numpy_index(chunks, embeddings, os.path.join(corpus_dir, "numpy"))
+    if options["bm25"]:
+        stubs.build_bm25_index(chunks, os.path.join(corpus_dir, "bm25"), os.path.join(corpus_dir, "chunks.jsonl"))
+    logging.info(f"Corpus sintético: {len(chunks)} chunks ({options['retriever']}) em {time.perf_counter() - start:.1f}s")
+
+
+def _configure(options: dict, corpus_dir: str):
+    """No processo da etapa: aponta o config para o corpus e troca os serviços externos pelos substitutos."""
+    import config
+    from src.core.components import ComponentRegistry, set_registry
+
+    config.OPENAI_API_KEY = config.OPENAI_API_KEY or "benchmark"
+    config.MARITACA_API_KEY = config.MARITACA_API_KEY or "benchmark"
+    config.HYDE_CACHE_ENABLED = False
+    config.RESULT_CACHE_ENABLED = False
+    config.PIPELINE_MODE = options["mode"]
+    config.RETRIEVER_BACKEND = options["retriever"]
+    config.DB_PATH = os.path.join(corpus_dir, "chroma")
+    config.NUMPY_INDEX_PATH = os.path.join(corpus_dir, "numpy")
+    config.BM25_ENABLED = options["bm25"]
+    config.BM25_INDEX_PATH = os.path.join(corpus_dir, "bm25")
+    config.CHUNKS_PATH = os.path.join(corpus_dir, "chunks.jsonl")
+
+    registry = ComponentRegistry()
+    registry.override(
+        llm_openai=stubs.FakeChatModel(latency_ms=options["hyde_latency_ms"], jitter=options["latency_jitter"]),
+        llm_sabia=stubs.FakeLLM(latency_ms=options["generation_latency_ms"], jitter=options["latency_jitter"]),
+        embeddings=stubs.HashingEmbeddings(options["dimensions"]),
+    )
+    if options["reranker"] == "stub":
+        registry.override(cross_encoder=stubs.FakeCrossEncoder(options["rerank_pair_ms"]))
+    else:
+        config.RERANKER_BACKEND = options["reranker"]
+    set_registry(registry)
+    logging.getLogger().setLevel(options["log_level"])
+    return registry
+
+
+def _prepare(stage: str, registry, essays: list, options: dict):
+    """Prepara as entradas de cada redação fora da medição e retorna a função medida (índice -> None)."""
+    import config
+    from src.core.correction_pipeline import _pack_context, _run_sync, _select_retrievers, correct_essay_pipeline, correction_prompt
+    from src.core.rag_advanced import generate_hypothetical_document, rerank_with_cross_encoder
+    from src.core.retrieval import aretrieve_fused
+
+    if stage == "hyde":
+        return lambda i: generate_hypothetical_document(essays[i], registry.llm_openai)
+    if stage == "pipeline":
+        return lambda i: correct_essay_pipeline(essays[i], options["mode"])
+
+    # As demais etapas recebem a saída da anterior, calculada agora (LLM sem latência)
+    instant_llm = stubs.FakeChatModel(latency_ms=0)
+    queries = [generate_hypothetical_document(essay, instant_llm) for essay in essays]
+    retrievers = _select_retrievers(options["mode"], registry.base_retriever)
+    if stage == "retrieval":
+        return lambda i: _run_sync(aretrieve_fused(queries[i], retrievers, rrf_k=config.RRF_K))
+
+    candidates = [_run_sync(aretrieve_fused(query, retrievers, rrf_k=config.RRF_K)) for query in queries]
+    if stage == "rerank":
+        return lambda i: rerank_with_cross_encoder(queries[i], candidates[i])
+
+    relevant = [rerank_with_cross_encoder(query, docs) for query, docs in zip(queries, candidates)]
+    if stage == "prompt":
+        def assemble(i):
+            context, _ = _pack_context(essays[i], relevant[i])
+            return correction_prompt.format(contexto=context, redacao=essays[i])
+        return assemble
+    raise ValueError(f"Etapa desconhecida: {stage}")
+
+
+def run_stage(stage: str, options: dict, corpus_dir: str) -> dict:
+    """Executa uma etapa (em um processo próprio) e retorna suas estatísticas."""
+    from src.core.tracing import trace_request
+
+    registry = _configure(options, corpus_dir)
+    warmup, iterations = options["warmup"], options["iterations"]
+    # Uma redação diferente por execução: nenhuma etapa é servida por cache
+    essays = [stubs.synthetic_essay(i, seed=options["seed"]) for i in range(warmup + iterations)]
+    measured = _prepare(stage, registry, essays, options)
+    setup_rss = peak_rss_mb()
+
+    for i in range(warmup):
+        measured(i)
+
+    breakdown = {}
+
+    def timed(i):
+        with trace_request(f"{stage}:{i}") as trace:
+            start = time.perf_counter()
+            measured(i)
+            seconds = time.perf_counter() - start
+        for name, stage_seconds in trace.stages.items():
+            breakdown.setdefault(name, []).append(stage_seconds * 1000)
+        return seconds * 1000
+
+    start = time.perf_counter()
+    if options["concurrency"] > 1:
+        with ThreadPoolExecutor(options["concurrency"]) as pool:
+            latencies = list(pool.map(timed, range(warmup, warmup + iterations)))
+    else:
+        latencies = [timed(i) for i in range(warmup, warmup + iterations)]
+    wall_seconds = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    result = {
+        "iterations": iterations,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(np.mean(latencies)), 3),
+        "throughput_per_s": round(iterations / wall_seconds, 2),
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if stage == "pipeline":
+        # Quanto de cada execução de ponta a ponta foi gasto em cada etapa (p50)
+        result["breakdown_p50_ms"] = {
+            name: round(float(np.percentile(values, 50)), 3) for name, values in breakdown.items()
+        }
+    return result
+
+
+def run_benchmarks(options: dict) -> dict:
+    """Constrói o corpus e mede cada etapa em um processo novo (spawn)."""
+    if options["reranker"] != "stub":
+        # O modelo real precisa estar no cache local; nada é baixado durante a medição
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="elysia-bench-") as corpus_dir:
+        build_corpus(options, corpus_dir)
+        context = multiprocessing.get_context("spawn")
+        for stage in options["stages"]:
+            logging.info(f"Medindo a etapa '{stage}' ({options['warmup']} aquecimento + {options['iterations']} execuções)...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                results[stage] = pool.submit(run_stage, stage, options, corpus_dir).result()
+
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "options": options,
+        "stages": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Regressões em relação ao baseline: p50/p95 ou pico de RSS acima de (1 + threshold) vezes o anterior."""
+    workload = {key: value for key, value in report["options"].items() if key not in NON_WORKLOAD_OPTIONS}
+    baseline_workload = {key: value for key, value in baseline.get("options", {}).items() if key not in NON_WORKLOAD_OPTIONS}
+    if workload != baseline_workload:
+        logging.warning("O baseline foi gerado com outras opções de carga; a comparação pode não ser significativa.")
+
+    regressions = []
+    for stage, current in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous is None:
+            continue
+        checks = [("p50_ms", MIN_DELTA_MS), ("p95_ms", MIN_DELTA_MS), ("peak_rss_mb", MIN_RSS_DELTA_MB)]
+        for metric, min_delta in checks:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + threshold) and after - before >= min_delta:
+                regressions.append(f"{stage}.{metric}: {before:g} -> {after:g} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict = None):
+    header = f"{'etapa':<10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'vazão/s':>9} {'RSS MB':>8}"
+    print("\n" + header + ("  " + "Δp50 vs baseline" if baseline else ""))
+    print("-" * (len(header) + (18 if baseline else 0)))
+    for stage, stats in report["stages"].items():
+        line = (
+            f"{stage:<10} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f} "
+            f"{stats['throughput_per_s']:>9.2f} {stats['peak_rss_mb'] if stats['peak_rss_mb'] is not None else '-':>8}"
+        )
+        previous = (baseline or {}).get("stages", {}).get(stage)
+        if previous and previous.get("p50_ms"):
+            line += f"  {(stats['p50_ms'] / previous['p50_ms'] - 1) * 100:+.1f}%"
+        print(line)
+    breakdown = report["stages"].get("pipeline", {}).get("breakdown_p50_ms")
+    if breakdown:
+        print("\npipeline por etapa (p50 ms): " + " ".join(f"{name}={ms:.1f}" for name, ms in breakdown.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks offline do pipeline de correção (sem rede).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Etapas a medir.")
+    parser.add_argument("--iterations", type=int, default=30, help="Execuções medidas por etapa.")
+    parser.add_argument("--warmup", type=int, default=3, help="Execuções de aquecimento (não medidas).")
+    parser.add_argument("--concurrency", type=int, default=1, help="Execuções simultâneas (threads) por etapa.")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Número de chunks do corpus sintético.")
+    parser.add_argument("--dimensions", type=int, default=256, help="Dimensão dos embeddings por hashing.")
+    parser.add_argument("--seed", type=int, default=13, help="Semente do corpus e das redações.")
+    parser.add_argument("--retriever", choices=["chroma", "numpy"], default="chroma", help="Backend da busca vetorial.")
+    parser.add_argument("--no-bm25", dest="bm25", action="store_false", help="Desabilita o BM25 na busca.")
+    parser.add_argument("--mode", choices=["full", "fast"], default="full", help="Modo do pipeline.")
+    parser.add_argument(
+        "--reranker", choices=["stub", "torch", "onnx-int8"], default="stub",
+        help="Cross-Encoder substituto ou o modelo real (precisa estar no cache local).",
+    )
+    parser.add_argument("--hyde-latency-ms", type=float, default=50.0, help="Latência simulada do LLM do HyDE.")
+    parser.add_argument("--generation-latency-ms", type=float, default=200.0, help="Latência simulada do Sabiá.")
+    parser.add_argument("--latency-jitter", type=float, default=0.1, help="Variação relativa das latências simuladas.")
+    parser.add_argument("--rerank-pair-ms", type=float, default=0.5, help="Custo de CPU por par do Cross-Encoder substituto.")
+    parser.add_argument("--baseline", help="Baseline (JSON) para comparar; regressões terminam com código 1.")
+    parser.add_argument("--save-baseline", help="Grava os resultados como baseline neste arquivo JSON.")
+    parser.add_argument("--output", help="Grava os resultados completos neste arquivo JSON.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Piora relativa tolerada em relação ao baseline.")
+    parser.add_argument("--log-level", default="WARNING", help="Nível de log durante as medições.")
+    options = vars(parser.parse_args())
+
+    baseline_path, save_path, output_path = options["baseline"], options["save_baseline"], options["output"]
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    report = run_benchmarks(options)
+    print_report(report, baseline)
+
+    for path in (save_path, output_path):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            logging.info(f"Resultados gravados em {path}")
+
+    if baseline is not None:
+        regressions = compare(report, baseline, options["threshold"])
+        if regressions:
+            logging.error(f"{len(regressions)} regressão(ões) acima de {options['threshold']:.0%}:")
+            for regression in regressions:
+                logging.error(f"  {regression}")
+            sys.exit(1)
+        logging.info(f"Sem regressões acima de {options['threshold']:.0%} em relação a {baseline_path}.")
+
+
+if __name__ == "__main__":
+    main()
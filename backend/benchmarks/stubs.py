@@ -0,0 +1,233 @@
+"""
+Substitutos locais e determinísticos dos serviços externos, para os benchmarks.
+
+- FakeChatModel / FakeLLM: no lugar do ChatOpenAI (HyDE) e do Sabiá, com latência
+  configurável (e variação determinística por prompt) e saída derivada do prompt.
+- HashingEmbeddings: embeddings por feature hashing dos tokens (sem rede).
+- FakeCrossEncoder: pontuação por sobreposição de tokens, com custo de CPU por par.
+- Corpus e redações sintéticos, gerados a partir de uma semente.
+
+Nada aqui acessa a rede: o pipeline roda inteiro em um notebook sem chaves de API.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import hashlib
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.llms import LLM
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.bm25 import BM25Index, portuguese_tokens
+from src.core.chunk_store import ChunkStoreWriter
+from src.core.numpy_index import CHUNKS_FILE, METADATA_FILE, VECTORS_FILE
+
+TOPICS = {
+    "educacao": "escola professor ensino aprendizagem aluno leitura formação currículo evasão alfabetização",
+    "saude": "saúde hospital vacina prevenção doença atendimento médico sus epidemia sanitário",
+    "ambiente": "ambiente desmatamento poluição clima sustentabilidade reciclagem floresta água queimada energia",
+    "tecnologia": "tecnologia internet dados algoritmo rede digital inclusão privacidade informação celular",
+    "violencia": "violência segurança policiamento criminalidade juventude desigualdade periferia vítima justiça",
+    "mobilidade": "mobilidade transporte trânsito cidade ônibus bicicleta acessibilidade urbano metrô calçada",
+}
+COMPETENCY_VOCABULARY = (
+    "competência norma culta ortografia concordância regência coesão coerência conectivos argumentação "
+    "repertório sociocultural tese proposta intervenção agente ação meio finalidade detalhamento "
+    "parágrafo introdução desenvolvimento conclusão projeto texto estrutura dissertativo argumentativa"
+)
+FILLER = (
+    "além disso portanto contudo nesse sentido por exemplo dessa forma sociedade brasileira governo "
+    "população problema questão importante necessário cenário contexto histórico atual país"
+)
+
+
+def _stable_unit(text: str) -> float:
+    """Número em [-1, 1] derivado do texto (a mesma entrada sempre dá o mesmo valor)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / float(2 ** 64 - 1) * 2 - 1
+
+
+def _latency_seconds(prompt: str, latency_ms: float, jitter: float) -> float:
+    return max(0.0, latency_ms * (1 + jitter * _stable_unit(prompt))) / 1000
+
+
+def fake_text(prompt: str, words: int) -> str:
+    """Texto de `words` palavras: os termos do prompt, repetidos em ordem fixa."""
+    tokens = list(dict.fromkeys(portuguese_tokens(prompt))) or ["redação"]
+    return " ".join(tokens[i % len(tokens)] for i in range(words))
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    input_tokens, output_tokens = len(prompt) // 4, len(completion) // 4
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+class FakeChatModel(BaseChatModel):
+    """Modelo de chat (no lugar do ChatOpenAI do HyDE) com latência simulada."""
+
+    latency_ms: float = 50.0
+    jitter: float = 0.1
+    completion_words: int = 150
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-benchmark"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": "fake-chat-benchmark"}
+
+    def _result(self, messages) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        text = fake_text(prompt, self.completion_words)
+        message = AIMessage(content=text, usage_metadata=_usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        time.sleep(_latency_seconds(prompt, self.latency_ms, self.jitter))
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        await asyncio.sleep(_latency_seconds(prompt, self.latency_ms, self.jitter))
+        return self._result(messages)
+
+
+class FakeLLM(LLM):
+    """LLM de texto (no lugar do Sabiá) com latência simulada."""
+
+    latency_ms: float = 200.0
+    jitter: float = 0.1
+    completion_words: int = 400
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-llm-benchmark"
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        time.sleep(_latency_seconds(prompt, self.latency_ms, self.jitter))
+        return fake_text(prompt, self.completion_words)
+
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> str:
+        await asyncio.sleep(_latency_seconds(prompt, self.latency_ms, self.jitter))
+        return fake_text(prompt, self.completion_words)
+
+
+class HashingEmbeddings(Embeddings):
+    """Embeddings por feature hashing dos tokens (com sinal), normalizados."""
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in portuguese_tokens(text):
+            value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+            vector[value % self.dimensions] += 1.0 if value >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeCrossEncoder:
+    """
+    Cross-Encoder com a interface `predict(pares)`: pontua pela sobreposição de tokens
+    entre consulta e documento e gasta `pair_cost_ms` de CPU por par, como a inferência real.
+    """
+
+    def __init__(self, pair_cost_ms: float = 0.5):
+        self.pair_cost_ms = pair_cost_ms
+
+    def predict(self, pairs, **kwargs):
+        scores = []
+        for query, document in pairs:
+            deadline = time.perf_counter() + self.pair_cost_ms / 1000
+            query_tokens, doc_tokens = set(portuguese_tokens(query)), set(portuguese_tokens(document))
+            overlap = len(query_tokens & doc_tokens) / (len(doc_tokens) ** 0.5 or 1.0)
+            while time.perf_counter() < deadline:
+                pass
+            scores.append(overlap * 4 - 2)  # logits, como os do modelo real
+        return np.asarray(scores, dtype=np.float32)
+
+
+def _words(rng: random.Random, vocabulary: list, count: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(count))
+
+
+def synthetic_corpus(size: int = 2000, seed: int = 13, chunks_per_file: int = 20) -> List[Document]:
+    """
+    Chunks sintéticos no formato dos reais (chunk_id, chunk_index, filename, source):
+    cada arquivo trata de um tema, com o vocabulário das competências misturado.
+    """
+    rng = random.Random(seed)
+    topics = list(TOPICS)
+    competency, filler = COMPETENCY_VOCABULARY.split(), FILLER.split()
+    chunks = []
+    for i in range(size):
+        file_number, chunk_index = divmod(i, chunks_per_file)
+        topic = topics[file_number % len(topics)]
+        vocabulary = TOPICS[topic].split() * 3 + competency + filler
+        filename = f"guia_{topic}_{file_number:03d}.md"
+        chunks.append(Document(
+            page_content=_words(rng, vocabulary, rng.randint(80, 160)).capitalize() + ".",
+            metadata={
+                "chunk_id": f"sintetico_{file_number:03d}_{chunk_index:03d}",
+                "chunk_index": chunk_index,
+                "filename": filename,
+                "source": f"data/processed/{filename}",
+            },
+        ))
+    return chunks
+
+
+def synthetic_essay(index: int, seed: int = 13, paragraphs: int = 4) -> str:
+    """Redação sintética de ~300 palavras; cada índice gera um texto diferente (sem acertos de cache)."""
+    rng = random.Random(f"{seed}:{index}")
+    topic = rng.choice(list(TOPICS))
+    vocabulary = TOPICS[topic].split() * 2 + FILLER.split() + ["argumento", "exemplo", "dados", "brasil"]
+    return "\n\n".join(
+        _words(rng, vocabulary, rng.randint(60, 90)).capitalize() + "." for _ in range(paragraphs)
+    ) + f"\n\nRedação {index}."
+
+
+def build_numpy_index(chunks: List[Document], embeddings: Embeddings, path: str):
+    """Grava o índice NumPy (vetores, metadados e chunk store) no layout de numpy_index.py."""
+    os.makedirs(path, exist_ok=True)
+    vectors = np.asarray(embeddings.embed_documents([chunk.page_content for chunk in chunks]), dtype=np.float32)
+    np.save(os.path.join(path, VECTORS_FILE), vectors)
+    with open(os.path.join(path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump([chunk.metadata for chunk in chunks], f, ensure_ascii=False)
+    with ChunkStoreWriter(os.path.join(path, CHUNKS_FILE)) as writer:
+        writer.write_all(chunks)
+
+
+def build_chroma_index(chunks: List[Document], embeddings: Embeddings, path: str):
+    """Grava um Chroma persistente com os chunks (exige langchain_chroma)."""
+    from langchain_chroma import Chroma
+    Chroma.from_documents(
+        chunks, embedding=embeddings, persist_directory=path, ids=[chunk.metadata["chunk_id"] for chunk in chunks]
+    )
+
+
+def build_bm25_index(chunks: List[Document], index_path: str, chunks_path: str):
+    """Grava o índice BM25 e o chunk store usado pelo BM25Retriever."""
+    with ChunkStoreWriter(chunks_path) as writer:
+        writer.write_all(chunks)
+    BM25Index.build(chunks).save(index_path)
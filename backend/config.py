@@ -8,6 +8,141 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 MARITACA_API_KEY = os.getenv("MARITACA_API_KEY") # Chave da Maritaca AI
 COHERE_API_KEY = os.getenv("COHERE_API_KEY")     # Chave da Cohere
 
+# Endpoints das APIs compatíveis com a OpenAI (ex.: um mock local nos testes de carga)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # None = endpoint padrão da OpenAI
+MARITACA_BASE_URL = os.getenv("MARITACA_BASE_URL", "https://chat.maritaca.ai/api")
+# Tokeniza (tiktoken) e divide os textos longos antes dos embeddings; endpoints compatíveis esperam o texto puro
+EMBEDDING_CHECK_CTX_LENGTH = os.getenv("EMBEDDING_CHECK_CTX_LENGTH", "true").lower() == "true"
+# Pede à Maritaca o uso de tokens no streaming (stream_options, extensão da OpenAI). Desligado,
+# os tokens das correções em streaming são estimados pelo prompt e pelo texto gerado
+MARITACA_STREAM_USAGE = os.getenv("MARITACA_STREAM_USAGE", "false").lower() == "true"
+
 # Caminhos do projeto (pode adicionar outros conforme necessário)
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 DB_PATH = os.path.join(PROJECT_ROOT, "db")
+
+# Modelos utilizados no pipeline de correção
+HYDE_MODEL = os.getenv("HYDE_MODEL", "gpt-3.5-turbo")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+CROSS_ENCODER_MODEL = os.getenv("CROSS_ENCODER_MODEL", "amberoad/bert-multilingual-passage-reranking-msmarco")
+
+# Parâmetros de busca
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "20"))
+
+# Re-ranking em lotes dinâmicos (micro-batching) entre requisições concorrentes
+RERANK_BATCHING_ENABLED = os.getenv("RERANK_BATCHING_ENABLED", "true").lower() == "true"
+RERANK_MAX_BATCH_SIZE = int(os.getenv("RERANK_MAX_BATCH_SIZE", "64"))
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "5"))
+RERANK_NUM_THREADS = int(os.getenv("RERANK_NUM_THREADS", "0"))  # 0 = padrão do PyTorch
+
+# Re-ranking em cascata: a primeira etapa (busca + sobreposição léxica) aceita ou poda os
+# candidatos bem separados do corte do top-n; o Cross-Encoder pontua apenas a faixa incerta
+RERANK_CASCADE_ENABLED = os.getenv("RERANK_CASCADE_ENABLED", "true").lower() == "true"
+RERANK_CASCADE_MARGIN = float(os.getenv("RERANK_CASCADE_MARGIN", "0.25"))
+RERANK_CASCADE_MAX_CANDIDATES = int(os.getenv("RERANK_CASCADE_MAX_CANDIDATES", "12"))
+RERANK_SCORE_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_SCORE_CACHE_MAX_ENTRIES", "20000"))
+
+# Backend de inferência do Cross-Encoder: "torch" (sentence-transformers) ou "onnx-int8" (ONNX Runtime quantizado)
+RERANKER_BACKEND = os.getenv("RERANKER_BACKEND", "torch")
+
+# Cache persistente dos documentos hipotéticos (HyDE)
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(PROJECT_ROOT, "cache"))
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(CACHE_DIR, "onnx"))
+HYDE_CACHE_ENABLED = os.getenv("HYDE_CACHE_ENABLED", "true").lower() == "true"
+HYDE_CACHE_PATH = os.getenv("HYDE_CACHE_PATH", os.path.join(CACHE_DIR, "hyde_cache.sqlite3"))
+HYDE_CACHE_MAX_ENTRIES = int(os.getenv("HYDE_CACHE_MAX_ENTRIES", "10000"))
+HYDE_CACHE_TTL_SECONDS = float(os.getenv("HYDE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Cache das correções finais com detecção de redações quase duplicadas (MinHash + LSH)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_THRESHOLD = float(os.getenv("RESULT_CACHE_THRESHOLD", "0.9"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "2000"))
+RESULT_CACHE_NUM_PERM = int(os.getenv("RESULT_CACHE_NUM_PERM", "128"))
+RESULT_CACHE_BANDS = int(os.getenv("RESULT_CACHE_BANDS", "16"))
+RESULT_CACHE_SHINGLE_SIZE = int(os.getenv("RESULT_CACHE_SHINGLE_SIZE", "5"))
+
+# Backend da busca vetorial: "chroma" (padrão) ou "numpy" (índice em memória, ver export_numpy_index.py)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma")
+NUMPY_INDEX_PATH = os.getenv("NUMPY_INDEX_PATH", os.path.join(PROJECT_ROOT, "data", "index", "numpy"))
+
+# Índice léxico BM25 (ver scripts/preprocessing/build_bm25_index.py), fundido à busca vetorial com RRF
+CHUNKS_PATH = os.getenv("CHUNKS_PATH", os.path.join(PROJECT_ROOT, "data", "chunks", "chunks.jsonl"))
+BM25_ENABLED = os.getenv("BM25_ENABLED", "true").lower() == "true"
+BM25_INDEX_PATH = os.getenv("BM25_INDEX_PATH", os.path.join(PROJECT_ROOT, "data", "index", "bm25"))
+BM25_K = int(os.getenv("BM25_K", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Modo do pipeline: "full" (HyDE + busca híbrida) ou "fast" (busca direta com o texto da redação, sem HyDE)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "full")
+FAST_MODE_USE_EMBEDDING = os.getenv("FAST_MODE_USE_EMBEDDING", "true").lower() == "true"
+
+# Orçamento de tokens do contexto (materiais de referência) e limite total do prompt de correção
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+PROMPT_TOKEN_LIMIT = int(os.getenv("PROMPT_TOKEN_LIMIT", "12000"))
+
+# Geração: "single" (uma chamada cobrindo as cinco competências) ou "competency"
+# (uma chamada por competência em paralelo, com tempo limite por ramo, e um fechamento curto)
+GENERATION_MODE = os.getenv("GENERATION_MODE", "single")
+COMPETENCY_TIMEOUT_SECONDS = float(os.getenv("COMPETENCY_TIMEOUT_SECONDS", "60"))
+COMPETENCY_MAX_TOKENS = int(os.getenv("COMPETENCY_MAX_TOKENS", "700"))
+COMPETENCY_MERGE_MAX_TOKENS = int(os.getenv("COMPETENCY_MERGE_MAX_TOKENS", "300"))
+COMPETENCY_CONTEXT_TOKEN_BUDGET = int(os.getenv("COMPETENCY_CONTEXT_TOKEN_BUDGET", "1200"))
+
+# Busca com várias consultas em paralelo (HyDE + redação + seções), fundidas antes do re-ranking
+MULTI_QUERY_ENABLED = os.getenv("MULTI_QUERY_ENABLED", "true").lower() == "true"
+MULTI_QUERY_PARAGRAPHS = os.getenv("MULTI_QUERY_PARAGRAPHS", "false").lower() == "true"
+MULTI_QUERY_MAX_CANDIDATES = int(os.getenv("MULTI_QUERY_MAX_CANDIDATES", "30"))
+
+# Limites de execuções simultâneas por etapa (compartilhados por requisições e jobs em lote).
+# HyDE e embeddings usam a OpenAI; a geração, a Maritaca (OPENAI_/MARITACA_MAX_CONCURRENCY ainda valem como padrão).
+# No modo por competência cada redação ocupa 5 vagas da geração ao mesmo tempo: o limite deve ser de pelo menos 5
+HYDE_MAX_CONCURRENCY = int(os.getenv("HYDE_MAX_CONCURRENCY", os.getenv("OPENAI_MAX_CONCURRENCY", "8")))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", os.getenv("OPENAI_MAX_CONCURRENCY", "8")))
+RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "4"))
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", os.getenv("MARITACA_MAX_CONCURRENCY", "10")))
+
+# Controle de admissão do /correct/ e /correct/stream: correções simultâneas, tamanho da fila
+# de espera e tempo máximo na fila. Acima disso, a API responde 429/503 com Retry-After
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "10"))
+
+# Correção em lote (POST /correct/batch): fila persistida em SQLite e pool de workers
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ESSAYS = int(os.getenv("JOB_MAX_ESSAYS", "200"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# O banco é compartilhado pelos processos da API: cada item é reservado por um worker por
+# JOB_LEASE_SECONDS (renovado enquanto corrige); com a fila vazia, o banco é consultado a cada JOB_POLL_INTERVAL_SECONDS
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+
+# Clientes dos LLMs: pool de conexões compartilhado, tempo limite por etapa, retry com
+# backoff exponencial e jitter, circuito por serviço e requisições "hedged" (ver llm_clients.py)
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+HYDE_TIMEOUT_SECONDS = float(os.getenv("HYDE_TIMEOUT_SECONDS", "20"))
+EMBEDDING_TIMEOUT_SECONDS = float(os.getenv("EMBEDDING_TIMEOUT_SECONDS", "15"))
+GENERATION_TIMEOUT_SECONDS = float(os.getenv("GENERATION_TIMEOUT_SECONDS", "120"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "32"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+# Hedge: dispara uma cópia da chamada quando ela passa do p95 recente (dobra o custo dessas chamadas)
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "2"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Correção por arquivo (POST /correct/file): o texto de PDF/DOCX/TXT é extraído no servidor,
+# em um processo por arquivo (até FILE_EXTRACTION_WORKERS simultâneos) com tempo limite,
+# e guardado em cache pelo hash do arquivo
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+FILE_EXTRACTION_WORKERS = int(os.getenv("FILE_EXTRACTION_WORKERS", "2"))
+FILE_EXTRACTION_TIMEOUT_SECONDS = float(os.getenv("FILE_EXTRACTION_TIMEOUT_SECONDS", "20"))
+FILE_EXTRACTION_MAX_PAGES = int(os.getenv("FILE_EXTRACTION_MAX_PAGES", "20"))
+FILE_EXTRACTION_MEMORY_MB = int(os.getenv("FILE_EXTRACTION_MEMORY_MB", "1024"))  # 0 = sem limite
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(CACHE_DIR, "extraction_cache.sqlite3"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
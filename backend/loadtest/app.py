@@ -0,0 +1,26 @@
+"""
+A API (src/api/main.py) como é servida nos testes de carga.
+
+Os LLMs e os embeddings já são desviados para o mock por OPENAI_BASE_URL e
+MARITACA_BASE_URL; o Cross-Encoder roda no processo e, com LOADTEST_RERANKER=stub
+(padrão), é trocado pelo substituto de benchmarks/stubs.py, que dispensa o download
+do modelo. Cada worker do uvicorn importa este módulo e aplica a troca no seu registro.
+
+Executado por run_loadtest.py, a partir da raiz do repositório:
+    uvicorn backend.loadtest.app:app --workers 4
+"""
+import os
+import sys
+
+from backend.src.api.main import app
+from backend.src.core.components import get_registry
+
+# Adiciona o diretório dos benchmarks ao path para reutilizar os substitutos determinísticos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from stubs import FakeCrossEncoder
+
+if os.getenv("LOADTEST_RERANKER", "stub") == "stub":
+    get_registry().override(cross_encoder=FakeCrossEncoder(float(os.getenv("LOADTEST_RERANK_PAIR_MS", "0.5"))))
+
+__all__ = ["app"]
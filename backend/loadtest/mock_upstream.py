@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita as APIs da OpenAI (chat e embeddings) e da Maritaca, para
+os testes de carga: a aplicação faz as chamadas HTTP reais, mas sem custo e com
+latências e taxas de erro controladas.
+
+Rotas:
+    POST /v1/chat/completions   chat da OpenAI (HyDE)
+    POST /v1/embeddings         embeddings da OpenAI (HashingEmbeddings, como nos benchmarks)
+    POST /api/chat/completions  chat da Maritaca (Sabiá), com ou sem streaming
+
+Aponte a aplicação para ele com OPENAI_BASE_URL=http://host:porta/v1 e
+MARITACA_BASE_URL=http://host:porta/api.
+
+Latências: "fixed:MS", "uniform:MIN,MAX", "exp:MÉDIA" ou "lognormal:MEDIANA,SIGMA"
+(em milissegundos). Uma fração `error_rate` das chamadas responde com `error_status`.
+
+Exemplo:
+    python loadtest/mock_upstream.py --port 8100 --generation-latency lognormal:6000,0.4 --maritaca-error-rate 0.02
+"""
+import os
+import sys
+import json
+import math
+import base64
+import time
+import random
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Adiciona o diretório dos benchmarks ao path para reutilizar os substitutos determinísticos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+
+from stubs import HashingEmbeddings, fake_text
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STREAM_CHUNKS = 20
+
+
+class LatencyDistribution:
+    """Distribuição de latência descrita por "tipo:parâmetros" (ver o docstring do módulo)."""
+
+    def __init__(self, spec: str, rng: random.Random = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, params = spec.partition(":")
+        self.kind = kind
+        try:
+            self.params = [float(value) for value in params.split(",")] if params else []
+        except ValueError:
+            raise ValueError(f"Distribuição de latência inválida: {spec}")
+        expected = {"fixed": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if expected.get(kind) != len(self.params):
+            raise ValueError(f"Distribuição de latência inválida: {spec} (use fixed:MS, uniform:MIN,MAX, exp:MÉDIA ou lognormal:MEDIANA,SIGMA)")
+
+    def sample(self) -> float:
+        """Uma latência, em segundos."""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.params)
+        elif self.kind == "exp":
+            ms = self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
+        else:
+            median, sigma = self.params
+            ms = self.rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+
+@dataclass
+class UpstreamProfile:
+    """Comportamento simulado de uma rota."""
+
+    latency: LatencyDistribution
+    error_rate: float = 0.0
+    error_status: int = 503
+    calls: int = 0
+    errors: int = 0
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+def _prompt(body: dict) -> str:
+    return "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(completion) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def _completion(body: dict, text: str, usage: dict) -> dict:
+    return {
+        "id": f"chatcmpl-mock-{time.monotonic_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+        "usage": usage,
+    }
+
+
+def _chunk(body: dict, delta: dict, finish_reason=None, usage=None) -> str:
+    chunk = {
+        "id": "chatcmpl-mock-stream",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+    }
+    if usage is not None:
+        chunk["usage"] = usage
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+
+def create_app(profiles: dict, completion_words: int = 400, embedding_dimensions: int = 1536, seed: int = None) -> FastAPI:
+    """
+    Aplicação do mock. `profiles` tem as chaves "chat", "embeddings" e "generation"
+    (UpstreamProfile de cada rota).
+    """
+    app = FastAPI(title="Mock das APIs da OpenAI e da Maritaca")
+    rng = random.Random(seed)
+    embeddings = HashingEmbeddings(embedding_dimensions)
+
+    async def simulate(name: str):
+        """Aplica a latência da rota; retorna a resposta de erro, se a chamada deve falhar."""
+        profile = profiles[name]
+        profile.calls += 1
+        await asyncio.sleep(profile.latency.sample())
+        if profile.should_fail(rng):
+            profile.errors += 1
+            return JSONResponse(
+                status_code=profile.error_status,
+                content={"error": {"message": "Falha simulada pelo mock.", "type": "mock_error", "code": profile.error_status}},
+            )
+        return None
+
+    async def chat(name: str, body: dict, words: int):
+        prompt = _prompt(body)
+        if not body.get("stream"):
+            error = await simulate(name)
+            if error is not None:
+                return error
+            text = fake_text(prompt, min(words, body.get("max_tokens") or words))
+            return _completion(body, text, _usage(prompt, text))
+
+        # Streaming: o erro sai antes do primeiro byte; a latência é distribuída entre os pedaços
+        profile = profiles[name]
+        total = profile.latency.sample()
+        profile.calls += 1
+        if profile.should_fail(rng):
+            profile.errors += 1
+            await asyncio.sleep(total / STREAM_CHUNKS)
+            return JSONResponse(status_code=profile.error_status, content={"error": {"message": "Falha simulada pelo mock."}})
+
+        text = fake_text(prompt, min(words, body.get("max_tokens") or words))
+        pieces = text.split(" ")
+        size = max(1, math.ceil(len(pieces) / STREAM_CHUNKS))
+
+        async def events():
+            yield _chunk(body, {"role": "assistant", "content": ""})
+            for start in range(0, len(pieces), size):
+                await asyncio.sleep(total / STREAM_CHUNKS)
+                yield _chunk(body, {"content": " ".join(pieces[start:start + size]) + " "})
+            yield _chunk(body, {}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield _chunk(body, {}, usage=_usage(prompt, text))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        return await chat("chat", await request.json(), words=150)
+
+    @app.post("/api/chat/completions")
+    async def maritaca_chat(request: Request):
+        return await chat("generation", await request.json(), words=completion_words)
+
+    @app.post("/v1/embeddings")
+    async def openai_embeddings(request: Request):
+        body = await request.json()
+        error = await simulate("embeddings")
+        if error is not None:
+            return error
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        # Entradas já tokenizadas (listas de ids) são embutidas pelos próprios ids
+        texts = [item if isinstance(item, str) else " ".join(f"t{token}" for token in item) for item in inputs]
+        vectors = await asyncio.to_thread(embeddings.embed_documents, texts)
+        if body.get("encoding_format") == "base64":
+            # Formato pedido por padrão pelo SDK da OpenAI: float32 em base64
+            vectors = [base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii") for vector in vectors]
+        tokens = sum(len(text) // 4 for text in texts)
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+            "model": body.get("model", "mock"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return {name: {"calls": profile.calls, "errors": profile.errors} for name, profile in profiles.items()}
+
+    return app
+
+
+def build_profiles(options: dict) -> dict:
+    """Perfis das rotas a partir das opções da linha de comando (dicionário de `vars(args)`)."""
+    rng = random.Random(options.get("seed"))
+    return {
+        "chat": UpstreamProfile(
+            LatencyDistribution(options["hyde_latency"], rng), options["openai_error_rate"], options["error_status"]
+        ),
+        "embeddings": UpstreamProfile(
+            LatencyDistribution(options["embedding_latency"], rng), options["openai_error_rate"], options["error_status"]
+        ),
+        "generation": UpstreamProfile(
+            LatencyDistribution(options["generation_latency"], rng), options["maritaca_error_rate"], options["error_status"]
+        ),
+    }
+
+
+def add_upstream_arguments(parser: argparse.ArgumentParser):
+    """Opções do mock (compartilhadas com run_loadtest.py)."""
+    parser.add_argument("--hyde-latency", default="lognormal:800,0.3", help="Latência do chat da OpenAI (HyDE).")
+    parser.add_argument("--embedding-latency", default="lognormal:120,0.3", help="Latência dos embeddings da OpenAI.")
+    parser.add_argument("--generation-latency", default="lognormal:6000,0.35", help="Latência do chat da Maritaca (Sabiá).")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Fração das chamadas à OpenAI que falham.")
+    parser.add_argument("--maritaca-error-rate", type=float, default=0.0, help="Fração das chamadas à Maritaca que falham.")
+    parser.add_argument("--error-status", type=int, default=503, help="Status HTTP das falhas simuladas.")
+    parser.add_argument("--completion-words", type=int, default=400, help="Palavras de cada correção gerada.")
+    parser.add_argument("--embedding-dimensions", type=int, default=1536, help="Dimensão dos embeddings.")
+    parser.add_argument("--seed", type=int, default=None, help="Semente das latências e falhas sorteadas.")
+
+
+def serve(options: dict, host: str, port: int):
+    app = create_app(
+        build_profiles(options),
+        completion_words=options["completion_words"],
+        embedding_dimensions=options["embedding_dimensions"],
+        seed=options["seed"],
+    )
+    logging.info(f"Mock das APIs em http://{host}:{port} (OpenAI: /v1, Maritaca: /api)")
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local das APIs da OpenAI e da Maritaca.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+    serve(vars(args), args.host, args.port)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Teste de carga HTTP da API, de ponta a ponta, contra o mock local das APIs externas.
+
+Sobe o mock (mock_upstream.py), constrói um corpus sintético (índice NumPy + BM25,
+com os mesmos embeddings por hashing do mock) e inicia a API com uvicorn e
+`--workers` processos, apontada para o mock. Depois dispara POST /correct/ em malha
+aberta: as chegadas seguem um processo de Poisson na taxa pedida, independentemente
+das respostas, como usuários reais. Para cada taxa são medidos vazão útil
+(respostas 200 por segundo), latências p50/p95/p99 e erros (429/503 do controle de
+admissão, 5xx, tempos limite).
+
+A taxa é considerada saturada quando a vazão útil fica abaixo de 90% da oferecida,
+quando a fração de erros passa de --max-error-rate ou quando o p95 passa de --slo-p95.
+O relatório mostra a curva latência x vazão e, para cada número de workers, a maior
+taxa sustentável e o ponto de saturação: a base para dimensionar os workers em produção.
+
+Exemplos (a partir de backend/):
+    python loadtest/run_loadtest.py --workers 1 2 4 --rates 0.5 1 2 4 8 --duration 60
+    python loadtest/run_loadtest.py --app-url http://localhost:8000 --rates 1 2   # API já em execução
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+# Adiciona os diretórios dos benchmarks e do backend ao path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import stubs
+from mock_upstream import add_upstream_arguments
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.getLogger("httpx").setLevel(logging.WARNING)  # uma linha por requisição encobriria o relatório
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REPO_ROOT = os.path.dirname(BACKEND_DIR)
+MOCK_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_upstream.py")
+
+# Vazão útil mínima, em fração da taxa oferecida, para a taxa não ser considerada saturada
+MIN_GOODPUT_RATIO = 0.9
+
+
+def _wait_until(url: str, process: subprocess.Popen, timeout: float, consecutive: int = 1):
+    """Aguarda `url` responder 200 (`consecutive` vezes seguidas); falha se o processo terminar antes."""
+    deadline = time.monotonic() + timeout
+    successes = 0
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"O processo terminou antes de ficar pronto (código {process.returncode}).")
+        try:
+            successes = successes + 1 if httpx.get(url, timeout=2).status_code == 200 else 0
+        except httpx.HTTPError:
+            successes = 0
+        if successes >= consecutive:
+            return
+        time.sleep(0.5)
+    raise TimeoutError(f"{url} não ficou pronto em {timeout:.0f}s.")
+
+
+def _stop(process: subprocess.Popen):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def _tail(path: str, lines: int = 20) -> str:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return "".join(f.readlines()[-lines:])
+    except OSError:
+        return ""
+
+
+def start_mock(options: dict, work_dir: str) -> subprocess.Popen:
+    args = [sys.executable, MOCK_SCRIPT, "--host", "127.0.0.1", "--port", str(options["mock_port"])]
+    for name in ("hyde_latency", "embedding_latency", "generation_latency", "openai_error_rate",
+                 "maritaca_error_rate", "error_status", "completion_words", "embedding_dimensions", "seed"):
+        if options[name] is not None:
+            args += [f"--{name.replace('_', '-')}", str(options[name])]
+    log = open(os.path.join(work_dir, "mock.log"), "w")
+    process = subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT)
+    _wait_until(f"http://127.0.0.1:{options['mock_port']}/stats", process, timeout=60)
+    return process
+
+
+def build_corpus(options: dict, work_dir: str) -> dict:
+    """Corpus sintético com os embeddings do mock; retorna as variáveis de ambiente que o apontam."""
+    chunks = stubs.synthetic_corpus(options["corpus_size"], seed=13)
+    embeddings = stubs.HashingEmbeddings(options["embedding_dimensions"])
+    stubs.build_numpy_index(chunks, embeddings, os.path.join(work_dir, "numpy"))
+    stubs.build_bm25_index(chunks, os.path.join(work_dir, "bm25"), os.path.join(work_dir, "chunks.jsonl"))
+    logging.info(f"Corpus sintético: {len(chunks)} chunks em {work_dir}")
+    return {
+        "RETRIEVER_BACKEND": "numpy",
+        "NUMPY_INDEX_PATH": os.path.join(work_dir, "numpy"),
+        "BM25_INDEX_PATH": os.path.join(work_dir, "bm25"),
+        "CHUNKS_PATH": os.path.join(work_dir, "chunks.jsonl"),
+    }
+
+
+def start_app(options: dict, workers: int, work_dir: str, corpus_env: dict) -> subprocess.Popen:
+    mock_url = f"http://127.0.0.1:{options['mock_port']}"
+    env = dict(os.environ)
+    env.update(corpus_env)
+    env.update({
+        "OPENAI_BASE_URL": f"{mock_url}/v1",
+        "MARITACA_BASE_URL": f"{mock_url}/api",
+        "OPENAI_API_KEY": "loadtest",
+        "MARITACA_API_KEY": "loadtest",
+        # O mock recebe o texto puro (sem tokenizar com o tiktoken, que baixaria seus arquivos)
+        "EMBEDDING_CHECK_CTX_LENGTH": "false",
+        # Cada requisição é uma redação nova: os caches só mascarariam a carga
+        "RESULT_CACHE_ENABLED": "false",
+        "HYDE_CACHE_ENABLED": "false",
+        "CACHE_DIR": os.path.join(work_dir, f"cache-{workers}"),
+        "JOBS_DB_PATH": os.path.join(work_dir, f"jobs-{workers}.sqlite3"),
+        "LOADTEST_RERANKER": "stub" if options["reranker"] == "stub" else "model",
+        "LOADTEST_RERANK_PAIR_MS": str(options["rerank_pair_ms"]),
+    })
+    if options["reranker"] != "stub":
+        env["RERANKER_BACKEND"] = options["reranker"]
+
+    args = [
+        sys.executable, "-m", "uvicorn", "backend.loadtest.app:app",
+        "--host", "127.0.0.1", "--port", str(options["port"]),
+        "--workers", str(workers), "--log-level", "warning",
+    ]
+    log_path = os.path.join(work_dir, f"app-{workers}.log")
+    process = subprocess.Popen(args, cwd=REPO_ROOT, env=env, stdout=open(log_path, "w"), stderr=subprocess.STDOUT)
+    try:
+        # Com vários workers, cada um aquece separadamente: espera algumas respostas seguidas
+        _wait_until(f"http://127.0.0.1:{options['port']}/ready", process, options["startup_timeout"], consecutive=workers * 2)
+    except Exception:
+        logging.error(f"A API não ficou pronta. Últimas linhas de {log_path}:\n{_tail(log_path)}")
+        _stop(process)
+        raise
+    return process
+
+
+async def run_rate(app_url: str, rate: float, duration: float, options: dict, essay_offset: int) -> dict:
+    """Dispara chegadas de Poisson a `rate` req/s por `duration` segundos e mede as respostas."""
+    rng = random.Random(f"{options['seed']}:{rate}")
+    loop = asyncio.get_running_loop()
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=options["request_timeout"], limits=limits) as client:
+
+        async def send(index: int):
+            essay = stubs.synthetic_essay(essay_offset + index, seed=options["seed"])
+            start = loop.time()
+            try:
+                response = await client.post("/correct/", json={"text": essay, "mode": options["mode"]})
+                status = str(response.status_code)
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError:
+                status = "connection_error"
+            results.append({"status": status, "seconds": loop.time() - start, "finished_at": loop.time()})
+
+        tasks = []
+        started_at = loop.time()
+        offset = 0.0
+        while True:
+            offset += rng.expovariate(rate)
+            if offset >= duration:
+                break
+            await asyncio.sleep(max(0.0, started_at + offset - loop.time()))
+            tasks.append(asyncio.create_task(send(len(tasks))))
+        await asyncio.gather(*tasks)
+
+    ok = [r["seconds"] for r in results if r["status"] == "200"]
+    statuses = {}
+    for r in results:
+        statuses[r["status"]] = statuses.get(r["status"], 0) + 1
+
+    # Janela da vazão: as chegadas mais o escoamento das últimas respostas. Sem fila,
+    # a última resposta sai ~uma latência mediana após o fim das chegadas; se a fila
+    # cresceu, o escoamento se estende e a vazão útil cai abaixo da taxa oferecida.
+    p50, p95, p99 = np.percentile(ok, [50, 95, 99]) if ok else (None, None, None)
+    finished = max((r["finished_at"] for r in results), default=started_at + duration) - started_at
+    window = max(duration, finished - (p50 or 0.0))
+
+    point = {
+        "offered_rate": rate,
+        "sent": len(results),
+        "send_rate": round(len(results) / duration, 3),
+        "ok": len(ok),
+        "goodput": round(len(ok) / window, 3),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else 0.0,
+        "statuses": statuses,
+        "p50_s": round(float(p50), 3) if ok else None,
+        "p95_s": round(float(p95), 3) if ok else None,
+        "p99_s": round(float(p99), 3) if ok else None,
+    }
+    point["saturated"] = (
+        not ok
+        or point["goodput"] < MIN_GOODPUT_RATIO * point["send_rate"]
+        or point["error_rate"] > options["max_error_rate"]
+        or point["p95_s"] > options["slo_p95"]
+    )
+    return point
+
+
+async def sweep(app_url: str, options: dict) -> list:
+    """Percorre as taxas em ordem crescente; por padrão para na primeira saturada."""
+    # Alguns segundos de carga leve antes da medição, para abrir conexões e aquecer os caminhos de código
+    if options["warmup_seconds"]:
+        await run_rate(app_url, 1.0, options["warmup_seconds"], options, essay_offset=10 ** 6)
+
+    points = []
+    for i, rate in enumerate(sorted(options["rates"])):
+        logging.info(f"Taxa {rate:g} req/s por {options['duration']:g}s...")
+        point = await run_rate(app_url, rate, options["duration"], options, essay_offset=(i + 1) * 10 ** 5)
+        points.append(point)
+        logging.info(
+            f"  vazão útil {point['goodput']:.2f}/s, p95 {point['p95_s']}s, erros {point['error_rate']:.1%} {point['statuses']}"
+        )
+        if point["saturated"] and not options["keep_going"]:
+            break
+        await asyncio.sleep(options["cooldown"])
+    return points
+
+
+def saturation_summary(points: list) -> dict:
+    """Maior taxa sustentável (antes da primeira saturada), ponto de saturação e maior vazão útil."""
+    sustainable, saturation = None, None
+    for point in points:
+        if point["saturated"]:
+            saturation = point["offered_rate"]
+            break
+        sustainable = point["offered_rate"]
+    return {
+        "max_sustainable_rate": sustainable,
+        "saturation_rate": saturation,
+        "peak_goodput": max((point["goodput"] for point in points), default=0.0),
+    }
+
+
+def print_curve(label: str, points: list, summary: dict):
+    print(f"\n{label}")
+    print(f"{'taxa/s':>8} {'enviadas':>9} {'vazão/s':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'erros':>7}  status")
+    for p in points:
+        latencies = " ".join(f"{p[key]:>8.2f}" if p[key] is not None else f"{'-':>8}" for key in ("p50_s", "p95_s", "p99_s"))
+        flag = "  ← saturada" if p["saturated"] else ""
+        print(f"{p['offered_rate']:>8g} {p['sent']:>9} {p['goodput']:>9.2f} {latencies} {p['error_rate']:>7.1%}  {p['statuses']}{flag}")
+    print(
+        f"sustentável até {summary['max_sustainable_rate']} req/s; saturação em {summary['saturation_rate']} req/s; "
+        f"maior vazão útil {summary['peak_goodput']:.2f} req/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga HTTP da API contra o mock das APIs externas.")
+    parser.add_argument("--rates", nargs="+", type=float, default=[0.5, 1, 2, 4, 8], help="Taxas de chegada (req/s).")
+    parser.add_argument("--duration", type=float, default=60.0, help="Segundos de chegadas em cada taxa.")
+    parser.add_argument("--cooldown", type=float, default=5.0, help="Pausa entre as taxas (s).")
+    parser.add_argument("--warmup-seconds", type=float, default=5.0, help="Segundos de aquecimento a 1 req/s, fora da medição (0 desliga).")
+    parser.add_argument("--keep-going", action="store_true", help="Continua após a primeira taxa saturada.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1], help="Números de workers do uvicorn a comparar.")
+    parser.add_argument("--app-url", help="Usa uma API já em execução (não sobe o mock nem a API).")
+    parser.add_argument("--port", type=int, default=8200, help="Porta da API iniciada pelo script.")
+    parser.add_argument("--mock-port", type=int, default=8100, help="Porta do mock das APIs externas.")
+    parser.add_argument("--mode", choices=["full", "fast"], default="full", help="Modo do pipeline nas requisições.")
+    parser.add_argument("--corpus-size", type=int, default=2000, help="Número de chunks do corpus sintético.")
+    parser.add_argument(
+        "--reranker", choices=["stub", "torch", "onnx-int8"], default="stub",
+        help="Cross-Encoder substituto ou o modelo real (baixado na primeira execução).",
+    )
+    parser.add_argument("--rerank-pair-ms", type=float, default=0.5, help="Custo de CPU por par do Cross-Encoder substituto.")
+    parser.add_argument("--request-timeout", type=float, default=180.0, help="Tempo limite de cada requisição (s).")
+    parser.add_argument("--startup-timeout", type=float, default=300.0, help="Tempo máximo para a API ficar pronta (s).")
+    parser.add_argument("--slo-p95", type=float, default=30.0, help="p95 máximo (s) para a taxa não ser considerada saturada.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Fração de erros tolerada por taxa.")
+    parser.add_argument("--output", help="Grava a curva e o resumo neste arquivo JSON.")
+    add_upstream_arguments(parser)
+    options = vars(parser.parse_args())
+    if options["seed"] is None:
+        options["seed"] = 13
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "options": options,
+        "runs": [],
+    }
+
+    if options["app_url"]:
+        points = asyncio.run(sweep(options["app_url"], options))
+        summary = saturation_summary(points)
+        print_curve(f"API em {options['app_url']}", points, summary)
+        report["runs"].append({"workers": None, "points": points, **summary})
+    else:
+        with tempfile.TemporaryDirectory(prefix="elysia-loadtest-") as work_dir:
+            corpus_env = build_corpus(options, work_dir)
+            mock = start_mock(options, work_dir)
+            try:
+                for workers in options["workers"]:
+                    logging.info(f"Iniciando a API com {workers} worker(s)...")
+                    app = start_app(options, workers, work_dir, corpus_env)
+                    try:
+                        points = asyncio.run(sweep(f"http://127.0.0.1:{options['port']}", options))
+                    finally:
+                        _stop(app)
+                    summary = saturation_summary(points)
+                    report["runs"].append({"workers": workers, "points": points, **summary})
+                report["upstream_calls"] = httpx.get(f"http://127.0.0.1:{options['mock_port']}/stats", timeout=5).json()
+            finally:
+                _stop(mock)
+
+        for run in report["runs"]:
+            print_curve(f"{run['workers']} worker(s)", run["points"], run)
+
+    if options["output"]:
+        with open(options["output"], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logging.info(f"Relatório gravado em {options['output']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Correção de redações em massa (backfills), com concorrência configurável.
+
+Entrada: um diretório com arquivos .txt/.md (uma redação por arquivo, id = caminho
+relativo) ou um arquivo .jsonl com {"id": ..., "text": ...} por linha.
+Saída: um JSONL gravado à medida que cada redação termina. Ao reiniciar, as redações
+já corrigidas com sucesso na saída são puladas; as que falharam ou saíram parciais
+(algum ramo por competência indisponível) são refeitas.
+Ao final, exibe os percentis de latência por etapa e a vazão (redações/minuto).
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.correction_pipeline import acorrect_essay_with_cache, is_partial_correction
+from src.core.tracing import trace_request
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+STAGES = ["hyde", "retrieval", "rerank", "packing", "generation"]
+
+def iter_essays(input_path: Path):
+    """Gera (id, texto) para cada redação da entrada."""
+    if input_path.is_dir():
+        for path in sorted(input_path.rglob("*")):
+            if path.suffix.lower() in (".txt", ".md") and path.is_file():
+                yield str(path.relative_to(input_path)), path.read_text(encoding="utf-8")
+        return
+
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logging.warning(f"Linha {line_number} inválida em {input_path}; ignorando.")
+                continue
+            yield str(record.get("id", line_number)), record.get("text", "")
+
+def completed_ids(output_path: Path) -> set:
+    """Ids já corrigidos com sucesso em uma execução anterior."""
+    done = set()
+    if not output_path.exists():
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # última linha incompleta de uma execução interrompida
+            if record.get("status") == "ok":
+                done.add(record["id"])
+    return done
+
+async def correct_one(essay_id: str, text: str, mode: str) -> dict:
+    start = time.perf_counter()
+    error = None
+    with trace_request(essay_id) as trace:
+        try:
+            correction, cache_status = await acorrect_essay_with_cache(text, mode)
+        except Exception as e:
+            correction, cache_status, error = None, None, str(e)
+    seconds = time.perf_counter() - start
+
+    ok = error is None and bool(correction)
+    if not ok:
+        status, error = "error", error or "Correção vazia."
+    elif is_partial_correction(correction):
+        # Mantém o texto, mas a redação é refeita na próxima execução
+        status, error = "partial", "Análise indisponível para alguma competência."
+    else:
+        status = "ok"
+    return {
+        "id": essay_id,
+        "status": status,
+        "correction": correction if ok else None,
+        "error": error,
+        "cache": cache_status,
+        "seconds": round(seconds, 3),
+        "stages": {name: round(value, 3) for name, value in trace.stages.items()},
+        "tokens": trace.tokens,
+    }
+
+async def bulk_correct(input_path: Path, output_path: Path, concurrency: int = 4, mode: str = None, limit: int = None) -> list:
+    """Corrige as redações pendentes com `concurrency` workers e grava cada resultado assim que sai."""
+    done = completed_ids(output_path)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    results = []
+    skipped = 0
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output = open(output_path, "a", encoding="utf-8")
+
+    async def producer():
+        nonlocal skipped
+        queued = 0
+        for essay_id, text in iter_essays(input_path):
+            if essay_id in done:
+                skipped += 1
+                continue
+            if not text.strip():
+                logging.warning(f"Redação vazia ignorada: {essay_id}")
+                continue
+            if limit is not None and queued >= limit:
+                break
+            await queue.put((essay_id, text))
+            queued += 1
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            record = await correct_one(item[0], item[1], mode)
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            results.append(record)
+            status = {"ok": "✅", "partial": "⚠️"}.get(record["status"], "❌")
+            logging.info(f"{status} {record['id']} ({record['seconds']:.1f}s) — {len(results)} concluídas")
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(producer(), *(worker() for _ in range(concurrency)))
+    finally:
+        output.close()
+
+    report(results, skipped, time.perf_counter() - start)
+    return results
+
+def _percentiles(values: list) -> str:
+    if not values:
+        return "-"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50={p50:.2f}s p95={p95:.2f}s p99={p99:.2f}s"
+
+def report(results: list, skipped: int, elapsed: float):
+    """Exibe o resumo da execução: contagens, vazão e percentis por etapa."""
+    ok = [record for record in results if record["status"] == "ok"]
+    partial = sum(1 for record in results if record["status"] == "partial")
+    logging.info("=" * 60)
+    logging.info(
+        f"Concluídas: {len(ok)} | Parciais (refeitas na próxima execução): {partial} | "
+        f"Erros: {len(results) - len(ok) - partial} | Puladas (já corrigidas): {skipped}"
+    )
+    if not results:
+        return
+    logging.info(f"Tempo total: {elapsed:.1f}s | Vazão: {len(results) / elapsed * 60:.1f} redações/minuto")
+    logging.info(f"{'total':<11} {_percentiles([record['seconds'] for record in results])}")
+    for name in STAGES:
+        values = [record["stages"][name] for record in ok if name in record["stages"]]
+        if values:
+            logging.info(f"{name:<11} {_percentiles(values)}")
+    cache_hits = sum(1 for record in ok if record["cache"] in ("exact", "near"))
+    if cache_hits:
+        logging.info(f"Servidas pelo cache de correções: {cache_hits}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Corrige redações em massa com o pipeline de correção.")
+    parser.add_argument("input", help="Diretório com .txt/.md ou arquivo .jsonl com {\"id\", \"text\"} por linha.")
+    parser.add_argument("--output", default="data/corrections/results.jsonl", help="Arquivo JSONL de saída (também usado para retomar).")
+    parser.add_argument("--concurrency", type=int, default=4, help="Redações corrigidas em paralelo.")
+    parser.add_argument("--mode", choices=["full", "fast"], default=None, help="Modo do pipeline (padrão: PIPELINE_MODE).")
+    parser.add_argument("--limit", type=int, default=None, help="Corrige no máximo N redações pendentes.")
+    args = parser.parse_args()
+
+    input_path = Path(args.input)
+    if not input_path.exists():
+        logging.error(f"Entrada não encontrada: {input_path}")
+        sys.exit(1)
+
+    asyncio.run(bulk_correct(input_path, Path(args.output), args.concurrency, args.mode, args.limit))
@@ -0,0 +1,73 @@
+"""
+Compara o índice NumPy com o Chroma: recall@k (tomando o Chroma como referência)
+e latência por consulta. As consultas são os próprios vetores de chunks sorteados
+do índice, de modo que a comparação não chama a API de embeddings.
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import numpy as np
+from langchain_chroma import Chroma
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.numpy_index import NumpyVectorIndex
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DB_PATH = "db"
+NUMPY_INDEX_PATH = "data/index/numpy"
+
+def _percentiles(samples: list) -> str:
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000.0, [50, 95, 99])
+    return f"p50={p50:.2f}ms p95={p95:.2f}ms p99={p99:.2f}ms"
+
+def compare_retrievers(num_queries: int = 200, k: int = 20, batch_size: int = 16, seed: int = 0):
+    collection = Chroma(persist_directory=DB_PATH)._collection
+    index = NumpyVectorIndex(NUMPY_INDEX_PATH)
+
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(index), size=min(num_queries, len(index)), replace=False)
+    queries = np.asarray(index.vectors[rows], dtype=np.float32)
+
+    chroma_ids, chroma_latency = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        chroma_latency.append(time.perf_counter() - start)
+        chroma_ids.append(result["ids"][0])
+
+    numpy_ids, numpy_latency = [], []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, k=k)[0]
+        numpy_latency.append(time.perf_counter() - start)
+        numpy_ids.append([index.metadata[row]["chunk_id"] for row, _ in hits])
+
+    batched_latency = []
+    for start_row in range(0, len(queries), batch_size):
+        start = time.perf_counter()
+        index.search(queries[start_row:start_row + batch_size], k=k)
+        batched_latency.append((time.perf_counter() - start) / len(queries[start_row:start_row + batch_size]))
+
+    recall = np.mean([len(set(a) & set(b)) / max(1, len(a)) for a, b in zip(chroma_ids, numpy_ids)])
+
+    logging.info(f"Consultas: {len(queries)} | k={k} | vetores no índice: {len(index)}")
+    logging.info(f"Recall@{k} do NumPy em relação ao Chroma: {recall:.4f}")
+    logging.info(f"Chroma:                 {_percentiles(chroma_latency)}")
+    logging.info(f"NumPy (1 consulta):     {_percentiles(numpy_latency)}")
+    logging.info(f"NumPy (lotes de {batch_size}): {_percentiles(batched_latency)} por consulta")
+    return {"recall": float(recall), "chroma": chroma_latency, "numpy": numpy_latency, "numpy_batched": batched_latency}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara recall e latência entre o Chroma e o índice NumPy.")
+    parser.add_argument("--queries", type=int, default=200, help="Número de consultas sorteadas.")
+    parser.add_argument("--k", type=int, default=20, help="Documentos por consulta.")
+    parser.add_argument("--batch-size", type=int, default=16, help="Consultas por lote na busca em lote do NumPy.")
+    args = parser.parse_args()
+
+    compare_retrievers(args.queries, args.k, args.batch_size)
@@ -0,0 +1,388 @@
+"""
+Motor de ingestão de embeddings: concorrente, sensível a limites de taxa e retomável.
+
+Os chunks são enviados em lotes ao provedor de embeddings com um número configurável
+de requisições simultâneas. Respostas 429 e cabeçalhos de rate limit reduzem a
+concorrência e pausam novos envios; cada lote concluído é gravado em um checkpoint
+em disco, de modo que uma execução interrompida retoma de onde parou.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class RateLimitedError(Exception):
+    """O provedor recusou a requisição por limite de taxa (HTTP 429)."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryableEmbeddingError(Exception):
+    """Falha transitória (conexão, timeout, erro 5xx) que pode ser repetida."""
+
+
+def parse_reset_duration(value) -> float:
+    """Converte durações dos cabeçalhos de rate limit ("20ms", "1s", "6m0s") em segundos."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    units = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|s|m|h)", value)
+    if not parts:
+        return None
+    return sum(float(amount) * units[unit] for amount, unit in parts)
+
+
+class EmbeddingProvider:
+    """
+    Interface dos provedores de embeddings.
+    `embed` recebe uma lista de textos e retorna (vetores, pausa), onde `pausa` é o
+    tempo em segundos que os próximos envios devem aguardar (0 se não houver).
+    """
+
+    name = "base"
+
+    def embed(self, texts: list):
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """Provedor da OpenAI. Lê os cabeçalhos de rate limit de cada resposta."""
+
+    name = "openai"
+
+    def __init__(self, model: str = "text-embedding-ada-002", api_key: str = None, timeout: float = 60.0):
+        from openai import OpenAI
+
+        self.model = model
+        # As novas tentativas são feitas pelo motor, que conhece a concorrência global
+        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"), max_retries=0, timeout=timeout)
+
+    @staticmethod
+    def _cooldown_from_headers(headers) -> float:
+        """Pausa sugerida quando a cota de requisições ou tokens chegou a zero."""
+        cooldown = 0.0
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is not None and remaining.isdigit() and int(remaining) == 0:
+                reset = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                cooldown = max(cooldown, reset or 1.0)
+        return cooldown
+
+    @staticmethod
+    def _retry_after(headers) -> float:
+        retry_after_ms = headers.get("retry-after-ms")
+        if retry_after_ms:
+            try:
+                return float(retry_after_ms) / 1000.0
+            except ValueError:
+                pass
+        return (
+            parse_reset_duration(headers.get("retry-after"))
+            or parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            or parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+        )
+
+    def embed(self, texts: list):
+        import openai
+
+        try:
+            raw = self.client.embeddings.with_raw_response.create(input=texts, model=self.model)
+        except openai.RateLimitError as e:
+            raise RateLimitedError(str(e), retry_after=self._retry_after(e.response.headers)) from e
+        except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+            raise RetryableEmbeddingError(str(e)) from e
+
+        response = raw.parse()
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return vectors, self._cooldown_from_headers(raw.headers)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    Provedor local e determinístico (feature hashing das palavras), sem rede.
+    Serve para testes e ensaios do pipeline de ingestão; os vetores não são
+    compatíveis com os embeddings da OpenAI usados nas consultas.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = 1536, latency: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+
+    def embed_text(self, text: str) -> list:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed(self, texts: list):
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed_text(text) for text in texts], 0.0
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limita as requisições simultâneas. Um 429 reduz o limite pela metade e pausa
+    novos envios; cada sequência de sucessos devolve uma vaga, até `max_in_flight`.
+    """
+
+    def __init__(self, max_in_flight: int, recovery_successes: int = 5):
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = self.max_in_flight
+        self.recovery_successes = recovery_successes
+        self._in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._condition.wait(timeout=wait)
+                    continue
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._condition.wait()
+
+    def release(self, success: bool, cooldown: float = 0.0):
+        with self._condition:
+            self._in_flight -= 1
+            if cooldown:
+                self._paused_until = max(self._paused_until, time.monotonic() + cooldown)
+            if success:
+                self._successes += 1
+                if self.limit < self.max_in_flight and self._successes >= self.recovery_successes:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    def on_rate_limited(self, retry_after: float):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logging.warning(f"Limite de taxa atingido: concorrência reduzida para {self.limit}, pausa de {retry_after:.1f}s.")
+            self._condition.notify_all()
+
+
+class EmbeddingCheckpoint:
+    """
+    Checkpoint em disco (JSON por linha) dos embeddings já calculados, indexados
+    por (chunk_id, content_hash). Um chunk alterado não reaproveita o vetor antigo.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._vectors = {}
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última linha incompleta de uma execução interrompida
+                        continue
+                    self._vectors[(record["chunk_id"], record["content_hash"])] = record["embedding"]
+            logging.info(f"Checkpoint carregado: {len(self._vectors)} embeddings já calculados.")
+
+    def get(self, chunk_id: str, content_hash: str):
+        return self._vectors.get((chunk_id, content_hash))
+
+    def append(self, chunks: list, vectors: list):
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for chunk, vector in zip(chunks, vectors):
+                    f.write(json.dumps({
+                        "chunk_id": chunk.metadata["chunk_id"],
+                        "content_hash": chunk.metadata.get("content_hash"),
+                        "embedding": vector,
+                    }) + "\n")
+                    self._vectors[(chunk.metadata["chunk_id"], chunk.metadata.get("content_hash"))] = vector
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class EmbeddingIngestionEngine:
+    """Calcula os embeddings de chunks em lotes concorrentes, com retomada e relatório de vazão."""
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        checkpoint: EmbeddingCheckpoint = None,
+        batch_size: int = 100,
+        max_in_flight: int = 4,
+        max_retries: int = 8,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.provider = provider
+        self.checkpoint = checkpoint
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.limiter = AdaptiveConcurrencyLimiter(self.max_in_flight)
+
+        self.embedded = 0
+        self.resumed = 0
+        self.rate_limited = 0
+        self.elapsed = 0.0
+
+    def _backoff(self, attempt: int) -> float:
+        """Backoff exponencial com jitter completo."""
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _embed_batch(self, chunks: list) -> list:
+        texts = [chunk.page_content for chunk in chunks]
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                vectors, cooldown = self.provider.embed(texts)
+            except RateLimitedError as e:
+                self.limiter.release(success=False)
+                self.rate_limited += 1
+                self.limiter.on_rate_limited(e.retry_after or self._backoff(attempt))
+                continue
+            except RetryableEmbeddingError as e:
+                self.limiter.release(success=False)
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"Falha transitória ao gerar embeddings ({e}); nova tentativa em {delay:.1f}s.")
+                time.sleep(delay)
+                continue
+            except Exception:
+                self.limiter.release(success=False)
+                raise
+
+            self.limiter.release(success=True, cooldown=cooldown)
+            if self.checkpoint is not None:
+                self.checkpoint.append(chunks, vectors)
+            return vectors
+
+        raise RuntimeError(f"Lote de {len(chunks)} chunks não processado após {self.max_retries + 1} tentativas.")
+
+    def run(self, chunks):
+        """
+        Gera (lote_de_chunks, embeddings) à medida que os lotes terminam. Os chunks já
+        presentes no checkpoint são devolvidos primeiro, sem nova chamada ao provedor.
+        `chunks` pode ser qualquer iterável; os lotes são enviados conforme são formados,
+        com no máximo `max_in_flight` lotes pendentes: a leitura espera um lote terminar
+        antes de enviar o próximo, em vez de acumular o corpus na fila do executor.
+        """
+        start = time.perf_counter()
+        last_report = start
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embedding") as executor:
+            futures = {}
+            batch, resumed_batch = [], []
+
+            def completed(block: bool):
+                """Entrega os lotes concluídos; com `block`, espera ao menos um terminar."""
+                nonlocal last_report
+                if block:
+                    wait(futures, return_when=FIRST_COMPLETED)
+                for future in [f for f in futures if f.done()]:
+                    done_batch = futures.pop(future)
+                    vectors = future.result()
+                    self.embedded += len(done_batch)
+                    yield done_batch, vectors
+
+                    now = time.perf_counter()
+                    if now - last_report >= 10:
+                        last_report = now
+                        logging.info(f"Embeddings gerados: {self.embedded} ({self.throughput(now - start):.1f} chunks/s)")
+
+            def submit(current_batch):
+                # Contrapressão: com `max_in_flight` lotes pendentes, espera um terminar antes de enviar outro
+                if len(futures) >= self.max_in_flight:
+                    yield from completed(block=True)
+                futures[executor.submit(self._embed_batch, current_batch)] = current_batch
+
+            for chunk in chunks:
+                vector = None
+                if self.checkpoint is not None:
+                    vector = self.checkpoint.get(chunk.metadata["chunk_id"], chunk.metadata.get("content_hash"))
+                if vector is not None:
+                    resumed_batch.append((chunk, vector))
+                    if len(resumed_batch) >= self.batch_size:
+                        self.resumed += len(resumed_batch)
+                        yield [c for c, _ in resumed_batch], [v for _, v in resumed_batch]
+                        resumed_batch = []
+                    continue
+
+                batch.append(chunk)
+                if len(batch) >= self.batch_size:
+                    yield from submit(batch)
+                    batch = []
+
+                # Entrega os lotes já concluídos sem esperar o fim da leitura
+                yield from completed(block=False)
+
+            if resumed_batch:
+                self.resumed += len(resumed_batch)
+                yield [c for c, _ in resumed_batch], [v for _, v in resumed_batch]
+            if batch:
+                yield from submit(batch)
+
+            while futures:
+                yield from completed(block=True)
+
+        self.elapsed = time.perf_counter() - start
+        logging.info(
+            f"Ingestão concluída: {self.embedded} chunks embutidos, {self.resumed} retomados do checkpoint, "
+            f"{self.rate_limited} respostas 429, {self.throughput(self.elapsed):.1f} chunks/s."
+        )
+
+    def throughput(self, elapsed: float) -> float:
+        return (self.embedded / elapsed) if elapsed > 0 else 0.0
+
+
+def build_provider(name: str, model: str = "text-embedding-ada-002") -> EmbeddingProvider:
+    """Cria o provedor de embeddings pelo nome ("openai" ou "hashing")."""
+    if name == "openai":
+        return OpenAIEmbeddingProvider(model=model)
+    if name == "hashing":
+        return HashingEmbeddingProvider()
+    raise ValueError(f"Provedor de embeddings desconhecido: {name}")
@@ -0,0 +1,86 @@
+"""
+Exporta os embeddings e metadados do ChromaDB para o layout do índice NumPy
+(matriz float32 contígua + metadados + chunk store), usado quando
+RETRIEVER_BACKEND = "numpy".
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import numpy as np
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.chunk_store import ChunkStoreWriter
+from src.core.numpy_index import CHUNKS_FILE, METADATA_FILE, VECTORS_FILE
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Define os caminhos
+DB_PATH = "db"
+OUTPUT_PATH = "data/index/numpy"
+
+# Documentos lidos do Chroma por página
+PAGE_SIZE = 1000
+
+def export_numpy_index(db_path: str = DB_PATH, output_path: str = OUTPUT_PATH):
+    """
+    Lê o Chroma em páginas e grava os vetores normalizados diretamente em um
+    arquivo .npy (memory-map), sem manter a matriz inteira na memória.
+    """
+    collection = Chroma(persist_directory=db_path)._collection
+    total = collection.count()
+    if total == 0:
+        logging.error(f"Nenhum documento no banco em {db_path}. Execute index_documents.py primeiro.")
+        return 0
+
+    os.makedirs(output_path, exist_ok=True)
+    vectors_tmp = os.path.join(output_path, VECTORS_FILE + ".tmp")
+    vectors = None
+    metadata = []
+    row = 0
+
+    with ChunkStoreWriter(os.path.join(output_path, CHUNKS_FILE)) as writer:
+        for offset in range(0, total, PAGE_SIZE):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+            embeddings = np.asarray(page["embeddings"], dtype=np.float32)
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(vectors_tmp, mode="w+", dtype=np.float32, shape=(total, embeddings.shape[1]))
+
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            vectors[row:row + len(embeddings)] = embeddings / np.where(norms == 0, 1.0, norms)
+
+            for doc_id, content, doc_metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                doc_metadata = dict(doc_metadata or {})
+                doc_metadata.setdefault("chunk_id", doc_id)
+                metadata.append(doc_metadata)
+                writer.write(Document(page_content=content or "", metadata=doc_metadata))
+
+            row += len(embeddings)
+            logging.info(f"Exportados {row}/{total} vetores")
+
+    vectors.flush()
+    del vectors
+    os.replace(vectors_tmp, os.path.join(output_path, VECTORS_FILE))
+    with open(os.path.join(output_path, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+
+    logging.info(f"🎉 Índice NumPy salvo em {output_path} ({row} vetores)")
+    return row
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta o ChromaDB para o índice NumPy.")
+    parser.add_argument("--db", default=DB_PATH, help="Diretório do ChromaDB.")
+    parser.add_argument("--output", default=OUTPUT_PATH, help="Diretório de saída do índice NumPy.")
+    args = parser.parse_args()
+
+    try:
+        export_numpy_index(args.db, args.output)
+    except Exception as e:
+        logging.error(f"Erro durante a exportação: {e}")
+        raise
@@ -1,9 +1,18 @@
 import os
-import pickle
+import sys
+import json
+import hashlib
 import logging
+import argparse
 from dotenv import load_dotenv
 from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
+
+from embedding_ingestion import EmbeddingCheckpoint, EmbeddingIngestionEngine, build_provider
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.chunk_store import ChunkStore
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -11,63 +20,165 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
 
-# Verifica se a chave da API da OpenAI foi definida
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("OPENAI_API_KEY não encontrada. Por favor, defina-a no seu arquivo .env")
-
 # Define os caminhos
-CHUNKS_PATH = "data/chunks/chunks.pkl"
+CHUNKS_PATH = "data/chunks/chunks.jsonl"
 DB_PATH = "db"  # Diretório para armazenar os arquivos do ChromaDB
+CHECKPOINT_PATH = "data/chunks/embeddings_checkpoint.jsonl"  # Embeddings já calculados (retomada)
+
+# Modelo de embeddings (deve ser o mesmo usado nas consultas, ver config.EMBEDDING_MODEL)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+
+# Tamanho dos lotes enviados ao ChromaDB (o cliente limita o tamanho de cada operação)
+UPSERT_BATCH_SIZE = 500
+
+def chunk_content_hash(chunk) -> str:
+    """Hash do conteúdo e dos metadados de origem de um chunk."""
+    metadata = {k: v for k, v in chunk.metadata.items() if k != "content_hash"}
+    payload = chunk.page_content + "\x1f" + json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-def index_documents():
+def new_plan() -> dict:
+    """Contadores do plano de indexação incremental."""
+    return {"added": 0, "updated": 0, "unchanged": 0, "removed": [], "seen": set()}
+
+def classify_chunks(chunks, existing_hashes: dict, plan: dict):
     """
-    Carrega os chunks, gera os embeddings com a OpenAI e os armazena
-    em um banco de dados vetorial Chroma.
+    Compara, em streaming, os chunks atuais com o que já está no banco
+    (chunk_id -> content_hash). Gera os chunks novos ou alterados, que precisam de
+    embedding, e atualiza as contagens de `plan`. Ao final, `plan["removed"]` lista os
+    ids a remover (chunks cujo arquivo de origem sumiu ou que deixaram de existir
+    após o re-chunking).
     """
-    # Carrega os chunks
+    seen = plan["seen"]
+    for chunk in chunks:
+        chunk_id = chunk.metadata.get("chunk_id")
+        if not chunk_id:
+            logging.warning(f"Chunk sem 'chunk_id' ignorado (origem: {chunk.metadata.get('source')}).")
+            continue
+        if chunk_id in seen:
+            logging.warning(f"chunk_id duplicado '{chunk_id}'; a última ocorrência prevalece.")
+        seen.add(chunk_id)
+
+        chunk.metadata["content_hash"] = chunk_content_hash(chunk)
+        if chunk_id not in existing_hashes:
+            plan["added"] += 1
+            yield chunk
+        elif existing_hashes[chunk_id] != chunk.metadata["content_hash"]:
+            plan["updated"] += 1
+            yield chunk
+        else:
+            plan["unchanged"] += 1
+
+    plan["removed"] = sorted(set(existing_hashes) - seen)
+
+def log_plan(plan: dict, dry_run: bool):
+    """Exibe o relatório com as contagens do plano de indexação."""
+    prefix = "[dry-run] " if dry_run else ""
+    logging.info(f"{prefix}Adicionados: {plan['added']}")
+    logging.info(f"{prefix}Atualizados: {plan['updated']}")
+    logging.info(f"{prefix}Inalterados: {plan['unchanged']}")
+    logging.info(f"{prefix}Removidos: {len(plan['removed'])}")
+
+def index_documents(
+    dry_run: bool = False,
+    provider_name: str = "openai",
+    batch_size: int = 100,
+    max_in_flight: int = 4,
+    checkpoint_path: str = CHECKPOINT_PATH,
+):
+    """
+    Carrega os chunks e sincroniza o banco vetorial Chroma de forma incremental:
+    usa o `chunk_id` como id no banco, gera embeddings apenas para chunks novos ou
+    alterados e remove chunks que não existem mais. Executar novamente sem mudanças
+    não gera nenhum embedding.
+
+    Os embeddings são gerados pelo motor de ingestão, com `max_in_flight` lotes de
+    `batch_size` chunks em paralelo e checkpoint em disco para retomar execuções
+    interrompidas. Os chunks são lidos do chunk store sob demanda: a geração de
+    embeddings começa antes de o arquivo ter sido lido por inteiro.
+    """
+    # Abre o chunk store (leitura sob demanda)
     if not os.path.exists(CHUNKS_PATH):
         logging.error(f"Arquivo de chunks não encontrado em {CHUNKS_PATH}. Execute o script create_chunks.py primeiro.")
         return
 
-    try:
-        with open(CHUNKS_PATH, "rb") as f:
-            chunks = pickle.load(f)
-        logging.info(f"Carregados {len(chunks)} chunks de {CHUNKS_PATH}")
-    except Exception as e:
-        logging.error(f"Não foi possível carregar os chunks. Erro: {e}")
-        return
+    chunks = ChunkStore(CHUNKS_PATH)
+    logging.info(f"Lendo {len(chunks)} chunks de {CHUNKS_PATH}")
 
-    if not chunks:
+    if len(chunks) == 0:
         logging.warning("Nenhum chunk para indexar.")
         return
 
-    # Inicializa o modelo de embeddings da OpenAI
-    embedding_function = OpenAIEmbeddings(api_key=os.getenv("OPENAI_API_KEY"))
+    # Verifica se a chave da API da OpenAI foi definida (o dry-run não gera embeddings)
+    if not dry_run and provider_name == "openai" and not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY não encontrada. Por favor, defina-a no seu arquivo .env")
 
-    # Verifica se já existe um banco de dados
-    if os.path.exists(DB_PATH) and os.listdir(DB_PATH):
-        logging.info("Banco de dados existente encontrado. Adicionando novos documentos...")
-        vector_store = Chroma(
-            persist_directory=DB_PATH,
-            embedding_function=embedding_function
-        )
-        # Adiciona os novos documentos
-        vector_store.add_documents(chunks)
-    else:
-        # Cria o ChromaDB a partir dos documentos
-        logging.info("Criando o banco de dados vetorial e gerando os embeddings... Isso pode levar algum tempo.")
-        vector_store = Chroma.from_documents(
-            documents=chunks,
-            embedding=embedding_function,
-            persist_directory=DB_PATH # Onde o banco de dados será salvo
+    # Abre (ou cria) o banco de dados vetorial. Os embeddings são calculados pelo
+    # motor de ingestão, então o banco não precisa de função de embedding aqui.
+    vector_store = Chroma(persist_directory=DB_PATH)
+
+    # Lê os hashes já indexados
+    existing = vector_store.get(include=["metadatas"])
+    existing_hashes = {
+        doc_id: (metadata or {}).get("content_hash")
+        for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+    logging.info(f"Documentos já presentes no banco: {len(existing_hashes)}")
+
+    plan = new_plan()
+    to_upsert = classify_chunks(chunks, existing_hashes, plan)
+
+    if dry_run:
+        for _ in to_upsert:
+            pass
+        log_plan(plan, dry_run)
+        return plan
+
+    # Gera embeddings apenas para chunks novos ou alterados (upsert pelo chunk_id)
+    engine = EmbeddingIngestionEngine(
+        build_provider(provider_name, model=EMBEDDING_MODEL),
+        checkpoint=EmbeddingCheckpoint(checkpoint_path),
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+    )
+    for batch, vectors in engine.run(to_upsert):
+        vector_store._collection.upsert(
+            ids=[chunk.metadata["chunk_id"] for chunk in batch],
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch],
         )
+    # Todos os lotes foram gravados no banco: o checkpoint não é mais necessário
+    engine.checkpoint.clear()
+
+    # Remove chunks que não existem mais
+    removed = plan["removed"]
+    for start in range(0, len(removed), UPSERT_BATCH_SIZE):
+        vector_store.delete(ids=removed[start:start + UPSERT_BATCH_SIZE])
 
-    logging.info(f"Banco de dados vetorial criado e salvo com sucesso em {DB_PATH}")
+    log_plan(plan, dry_run)
+
+    logging.info(f"Banco de dados vetorial sincronizado com sucesso em {DB_PATH}")
     logging.info(f"Total de documentos no banco: {vector_store._collection.count()}")
+    return plan
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indexa os chunks no banco vetorial de forma incremental.")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas relata o que seria adicionado, atualizado, mantido e removido.")
+    parser.add_argument("--provider", choices=["openai", "hashing"], default="openai", help="Provedor de embeddings ('hashing' é local, apenas para testes).")
+    parser.add_argument("--batch-size", type=int, default=100, help="Chunks por requisição de embeddings.")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="Máximo de requisições de embeddings simultâneas.")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Arquivo de checkpoint para retomar execuções interrompidas.")
+    args = parser.parse_args()
+
     try:
-        index_documents()
+        index_documents(
+            dry_run=args.dry_run,
+            provider_name=args.provider,
+            batch_size=args.batch_size,
+            max_in_flight=args.max_in_flight,
+            checkpoint_path=args.checkpoint,
+        )
     except Exception as e:
         logging.error(f"Erro durante a indexação: {e}")
-        raise
\ No newline at end of file
+        raise
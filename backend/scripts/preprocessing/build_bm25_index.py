@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script para construir o índice léxico BM25 a partir dos chunks (data/chunks/chunks.jsonl)
+"""
+import os
+import sys
+import time
+import logging
+from pathlib import Path
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.bm25 import BM25Index
+from src.core.chunk_store import ChunkStore
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Define os caminhos
+CHUNKS_PATH = Path("data/chunks/chunks.jsonl")
+INDEX_PATH = Path("data/index/bm25")
+
+def build_bm25_index(chunks_path: Path = CHUNKS_PATH, index_path: Path = INDEX_PATH) -> int:
+    """Constrói e grava o índice BM25. Retorna o número de documentos indexados."""
+    if not chunks_path.exists():
+        logging.error(f"Arquivo de chunks não encontrado em {chunks_path}. Execute o script create_chunks.py primeiro.")
+        return 0
+
+    start = time.perf_counter()
+    index = BM25Index.build(ChunkStore(str(chunks_path)))
+    if len(index) == 0:
+        logging.error("Nenhum chunk para indexar.")
+        return 0
+    index.save(str(index_path))
+
+    size_kb = sum(f.stat().st_size for f in index_path.iterdir()) / 1024
+    logging.info(f"🎉 Índice BM25 salvo em {index_path}: {len(index)} documentos, {len(index.terms)} termos, "
+                 f"{size_kb:.0f} KB ({time.perf_counter() - start:.1f}s)")
+    return len(index)
+
+if __name__ == "__main__":
+    try:
+        build_bm25_index()
+    except Exception as e:
+        logging.error(f"Erro durante a construção do índice BM25: {e}")
@@ -0,0 +1,97 @@
+"""
+Etapa de chunking compartilhada pelos scripts create_chunks.py e create_training_chunks.py.
+Os chunks são produzidos por um gerador e gravados no chunk store à medida que saem,
+sem acumular o corpus inteiro na memória.
+"""
+import os
+import sys
+import logging
+from pathlib import Path
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.core.chunk_store import ChunkStoreWriter
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def build_text_splitter() -> RecursiveCharacterTextSplitter:
+    """Configura o text splitter usado em todos os chunks."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", "! ", "? ", " ", ""]
+    )
+
+def iter_markdown_chunks(md_files, doc_type: str, text_splitter=None):
+    """Gera os chunks de cada arquivo Markdown, um arquivo por vez."""
+    text_splitter = text_splitter or build_text_splitter()
+
+    for md_file in md_files:
+        try:
+            logging.info(f"Processando: {md_file.name}")
+
+            # Lê o conteúdo do arquivo
+            with open(md_file, 'r', encoding='utf-8') as f:
+                content = f.read()
+
+            # Verifica se o arquivo não está vazio
+            if not content.strip():
+                logging.warning(f"Arquivo vazio: {md_file.name}")
+                continue
+
+            # Cria o documento
+            document = Document(
+                page_content=content,
+                metadata={
+                    "source": str(md_file),
+                    "filename": md_file.name,
+                    "type": doc_type
+                }
+            )
+
+            # Cria os chunks
+            chunks = text_splitter.split_documents([document])
+
+            # Adiciona informações extras aos metadados
+            for i, chunk in enumerate(chunks):
+                chunk.metadata.update({
+                    "chunk_id": f"{md_file.stem}_{i}",
+                    "chunk_index": i,
+                    "total_chunks": len(chunks)
+                })
+                yield chunk
+
+            logging.info(f"✅ {md_file.name}: {len(chunks)} chunks criados")
+
+        except Exception as e:
+            logging.error(f"❌ Erro ao processar {md_file.name}: {e}")
+            continue
+
+def write_chunks(md_files, doc_type: str, chunks_file: Path) -> int:
+    """Grava os chunks dos arquivos no chunk store. Retorna o número de chunks gravados."""
+    writer = ChunkStoreWriter(str(chunks_file))
+    try:
+        writer.write_all(iter_markdown_chunks(md_files, doc_type))
+    except Exception as e:
+        writer.abort()
+        logging.error(f"❌ Erro ao salvar chunks: {e}")
+        return 0
+
+    # Verifica se algum chunk foi criado (mantém o arquivo anterior, se houver)
+    if writer.count == 0:
+        writer.abort()
+        logging.error("Nenhum chunk foi criado!")
+        return 0
+    writer.close()
+
+    logging.info(f"🎉 Chunks salvos com sucesso em {chunks_file}")
+    logging.info(f"Total de chunks criados: {writer.count}")
+
+    # Estatísticas dos chunks
+    logging.info(f"Tamanho médio dos chunks: {writer.total_chars / writer.count:.1f} caracteres")
+    return writer.count
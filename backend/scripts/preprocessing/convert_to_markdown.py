@@ -3,105 +3,289 @@
 Script para converter documentos (PDF, DOC, TXT) para Markdown usando Docling
 """
 import os
+import json
+import time
+import hashlib
 import logging
+import argparse
+import multiprocessing
+from collections import deque
 from pathlib import Path
-from docling.document_converter import DocumentConverter
-from docling.datamodel.base_models import InputFormat
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def convert_documents():
+# Manifesto com hash, mtime e saída de cada arquivo já convertido
+MANIFEST_NAME = ".manifest.json"
+
+# Tempo máximo (segundos) de conversão de um único arquivo
+DEFAULT_TIMEOUT = 600
+
+# Conversor do Docling de cada processo trabalhador (criado uma vez por processo)
+_converter = None
+
+def _init_docling_worker(threads_per_worker: int):
+    """Inicializa o processo trabalhador: limita as threads e carrega o Docling uma única vez."""
+    global _converter
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    from docling.document_converter import DocumentConverter
+
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+    _converter = DocumentConverter()
+
+def _convert_with_docling(source: str, output: str) -> float:
+    """Converte um documento com o Docling. Retorna o tempo gasto em segundos."""
+    start = time.perf_counter()
+
+    # Converte o documento e extrai o conteúdo em Markdown
+    result = _converter.convert(Path(source))
+    markdown_content = result.document.export_to_markdown()
+
+    # Salva o arquivo Markdown
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(markdown_content)
+
+    return time.perf_counter() - start
+
+def _convert_txt(source: str, output: str) -> float:
+    """Conversão simples de TXT (sem Docling). Retorna o tempo gasto em segundos."""
+    start = time.perf_counter()
+    source_path = Path(source)
+
+    with open(source_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(f"# {source_path.stem}\n\n{content}")
+
+    return time.perf_counter() - start
+
+def file_sha256(path: Path) -> str:
+    """Hash SHA-256 do conteúdo do arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_manifest(processed_path: Path) -> dict:
+    manifest_path = processed_path / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logging.warning(f"Manifesto inválido ({e}); todos os arquivos serão convertidos.")
+        return {}
+
+def save_manifest(processed_path: Path, manifest: dict):
+    """Grava o manifesto de forma atômica."""
+    manifest_path = processed_path / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+def plan_conversions(documents: list, processed_path: Path, manifest: dict, converter_name: str):
+    """
+    Separa os documentos alterados dos inalterados. Um arquivo é considerado inalterado
+    se mtime e tamanho batem com o manifesto ou, caso contrário, se o hash é o mesmo,
+    e a saída ainda existe.
+    """
+    to_convert, unchanged = [], []
+    for doc_path in documents:
+        output_path = processed_path / (doc_path.stem + ".md")
+        stat = doc_path.stat()
+        entry = manifest.get(doc_path.name)
+
+        if entry and entry.get("converter") == converter_name and output_path.exists():
+            if entry.get("mtime") == stat.st_mtime and entry.get("size") == stat.st_size:
+                unchanged.append(doc_path)
+                continue
+            source_hash = file_sha256(doc_path)
+            if entry.get("sha256") == source_hash:
+                # Apenas o mtime mudou (ex.: arquivo copiado): atualiza o manifesto
+                entry.update({"mtime": stat.st_mtime, "size": stat.st_size})
+                unchanged.append(doc_path)
+                continue
+        else:
+            source_hash = file_sha256(doc_path)
+
+        to_convert.append((doc_path, output_path, source_hash, stat))
+    return to_convert, unchanged
+
+def run_in_pool(tasks: list, worker, initializer=None, initargs=(), max_workers: int = None, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """
+    Executa `worker(origem, saida)` para cada tarefa em um pool de processos.
+    Um arquivo que ultrapassa `timeout` é marcado como falha; o pool é reiniciado
+    e as demais conversões em andamento são reenfileiradas, de modo que um PDF
+    problemático não trava a execução.
+    Retorna {origem: ("ok", segundos) | ("timeout", None) | ("error", mensagem)}.
+    """
+    max_workers = max(1, min(max_workers or os.cpu_count() or 1, len(tasks) or 1))
+    pending = deque(tasks)
+    in_flight = {}
+    results = {}
+
+    def new_pool():
+        return multiprocessing.Pool(processes=max_workers, initializer=initializer, initargs=initargs)
+
+    pool = new_pool()
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) < max_workers:
+                source, output = pending.popleft()
+                in_flight[source] = (output, pool.apply_async(worker, (source, output)), time.monotonic())
+
+            time.sleep(0.05)
+
+            timed_out = []
+            for source, (output, async_result, started) in list(in_flight.items()):
+                if async_result.ready():
+                    del in_flight[source]
+                    try:
+                        results[source] = ("ok", async_result.get())
+                    except Exception as e:
+                        results[source] = ("error", str(e))
+                elif timeout and time.monotonic() - started > timeout:
+                    timed_out.append(source)
+
+            if timed_out:
+                for source in timed_out:
+                    del in_flight[source]
+                    results[source] = ("timeout", None)
+                    logging.error(f"⏱️  Tempo limite ({timeout}s) excedido: {Path(source).name}")
+
+                # Não há como interromper uma única tarefa: reinicia o pool e reenfileira as demais
+                pool.terminate()
+                pool.join()
+                for source, (output, _, _) in in_flight.items():
+                    pending.appendleft((source, output))
+                in_flight.clear()
+                pool = new_pool()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    return results
+
+def convert_documents(use_docling: bool = True, max_workers: int = None, timeout: float = DEFAULT_TIMEOUT, force: bool = False):
     """
-    Converte todos os documentos da pasta data/raw para Markdown na pasta data/processed
+    Converte os documentos da pasta data/raw para Markdown na pasta data/processed.
+
+    As conversões rodam em um pool de processos (um por núcleo, por padrão) com tempo
+    limite por arquivo. Arquivos inalterados desde a última execução (segundo o
+    manifesto) são ignorados. Com `use_docling=False`, apenas arquivos TXT são
+    convertidos, pelo mesmo mecanismo (conversão alternativa).
     """
-    
+
     # Define os caminhos
     raw_path = Path("data/raw")
     processed_path = Path("data/processed")
-    
+
     # Cria a pasta processed se não existir
     processed_path.mkdir(parents=True, exist_ok=True)
-    
+
     # Verifica se a pasta raw existe
     if not raw_path.exists():
         logging.error(f"Pasta {raw_path} não encontrada!")
         return
-    
+
     # Encontra todos os documentos suportados
-    supported_extensions = ['.pdf', '.doc', '.docx', '.txt']
+    supported_extensions = ['.pdf', '.doc', '.docx', '.txt'] if use_docling else ['.txt']
     documents = []
-    
+
     for ext in supported_extensions:
         documents.extend(raw_path.glob(f"*{ext}"))
-    
+
     if not documents:
         logging.error(f"Nenhum documento encontrado em {raw_path}")
         logging.info(f"Extensões suportadas: {supported_extensions}")
         return
-    
-    logging.info(f"Encontrados {len(documents)} documentos para conversão")
-    
-    # Inicializa o conversor
-    converter = DocumentConverter()
-    
-    # Processa cada documento
-    for doc_path in documents:
-        try:
-            logging.info(f"Convertendo: {doc_path.name}")
-            
-            # Converte o documento
-            result = converter.convert(doc_path)
-            
-            # Extrai o conteúdo em Markdown
-            markdown_content = result.document.export_to_markdown()
-            
-            # Define o nome do arquivo de saída
-            output_name = doc_path.stem + ".md"
-            output_path = processed_path / output_name
-            
-            # Salva o arquivo Markdown
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(markdown_content)
-            
-            logging.info(f"✅ Salvo: {output_path}")
-            
-        except Exception as e:
-            logging.error(f"❌ Erro ao converter {doc_path.name}: {e}")
-            continue
-    
+
+    converter_name = "docling" if use_docling else "txt"
+    manifest = {} if force else load_manifest(processed_path)
+    to_convert, unchanged = plan_conversions(documents, processed_path, manifest, converter_name)
+
+    logging.info(f"Encontrados {len(documents)} documentos: {len(to_convert)} para conversão, {len(unchanged)} inalterados")
+
+    if to_convert:
+        workers = max(1, min(max_workers or os.cpu_count() or 1, len(to_convert)))
+        threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+        logging.info(f"Convertendo com {workers} processos (tempo limite de {timeout}s por arquivo)")
+
+        tasks = [(str(doc_path), str(output_path)) for doc_path, output_path, _, _ in to_convert]
+        if use_docling:
+            results = run_in_pool(tasks, _convert_with_docling, _init_docling_worker, (threads_per_worker,), workers, timeout)
+        else:
+            results = run_in_pool(tasks, _convert_txt, max_workers=workers, timeout=timeout)
+
+        # Atualiza o manifesto e exibe o tempo de cada arquivo
+        timings = []
+        for doc_path, output_path, source_hash, stat in to_convert:
+            status, value = results.get(str(doc_path), ("error", "não executado"))
+            if status == "ok":
+                manifest[doc_path.name] = {
+                    "sha256": source_hash,
+                    "mtime": stat.st_mtime,
+                    "size": stat.st_size,
+                    "output": str(output_path),
+                    "converter": converter_name,
+                }
+                timings.append((value, doc_path.name))
+                logging.info(f"✅ Salvo: {output_path} ({value:.1f}s)")
+            elif status == "error":
+                manifest.pop(doc_path.name, None)
+                logging.error(f"❌ Erro ao converter {doc_path.name}: {value}")
+            else:
+                manifest.pop(doc_path.name, None)
+
+        if timings:
+            total = sum(seconds for seconds, _ in timings)
+            slowest = ", ".join(f"{name} ({seconds:.1f}s)" for seconds, name in sorted(timings, reverse=True)[:5])
+            logging.info(f"Tempo de conversão: total {total:.1f}s, média {total / len(timings):.1f}s por arquivo")
+            logging.info(f"Mais lentos: {slowest}")
+
+    # Remove os arquivos que não existem mais em data/raw: o Markdown gerado e a entrada do manifesto.
+    # Sem o .md, a divisão em chunks e a indexação incremental também removem seus chunks
+    existing_names = {doc_path.name for doc_path in raw_path.iterdir()}
+    removed = [name for name in manifest if name not in existing_names]
+    for name in removed:
+        entry = manifest.pop(name)
+        output_path = processed_path / Path(entry.get("output") or (Path(name).stem + ".md")).name
+        still_used = any(Path(other.get("output", "")).name == output_path.name for other in manifest.values())
+        if output_path.exists() and not still_used:
+            output_path.unlink()
+            logging.info(f"🗑️  Removido: {output_path} ({name} não existe mais em {raw_path})")
+    save_manifest(processed_path, manifest)
+
     # Resumo final
     converted_files = list(processed_path.glob("*.md"))
-    logging.info(f"🎉 Conversão concluída! {len(converted_files)} arquivos Markdown criados em {processed_path}")
-    
+    logging.info(f"🎉 Conversão concluída! {len(converted_files)} arquivos Markdown em {processed_path}")
+
     return len(converted_files)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte os documentos de data/raw para Markdown.")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de conversão (padrão: número de núcleos).")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Tempo limite por arquivo, em segundos.")
+    parser.add_argument("--force", action="store_true", help="Ignora o manifesto e converte todos os arquivos.")
+    args = parser.parse_args()
+
     try:
-        convert_documents()
+        import docling  # noqa: F401 - verifica a instalação antes de iniciar o pool
+        convert_documents(max_workers=args.workers, timeout=args.timeout, force=args.force)
     except Exception as e:
         logging.error(f"Erro durante a conversão: {e}")
-        
+
         # Fallback: conversão simples para TXT se Docling falhar
         logging.info("Tentando conversão alternativa...")
-        
-        raw_path = Path("data/raw")
-        processed_path = Path("data/processed")
-        processed_path.mkdir(parents=True, exist_ok=True)
-        
-        # Para arquivos TXT, apenas copiar
-        txt_files = list(raw_path.glob("*.txt"))
-        for txt_file in txt_files:
-            try:
-                with open(txt_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                output_path = processed_path / (txt_file.stem + ".md")
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(f"# {txt_file.stem}\n\n{content}")
-                
-                logging.info(f"✅ TXT convertido: {output_path}")
-            except Exception as e:
-                logging.error(f"❌ Erro na conversão alternativa: {e}")
-        
-        logging.info("⚠️  Para conversão completa de PDFs, instale: pip install docling")
\ No newline at end of file
+        convert_documents(use_docling=False, max_workers=args.workers, timeout=args.timeout, force=args.force)
+
+        logging.info("⚠️  Para conversão completa de PDFs, instale: pip install docling")
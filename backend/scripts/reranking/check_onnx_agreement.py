@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Verifica se o Cross-Encoder ONNX int8 ordena os documentos como o modelo PyTorch original.
+
+Consultas e candidatos vêm do chunk store (ou do índice BM25, quando disponível, para
+que os candidatos sejam parecidos com os do pipeline). Para cada consulta, compara as
+ordenações dos dois backends (correlação de Spearman e sobreposição do top-n) e mede
+o tempo de inferência. Sai com código 1 se a concordância ficar abaixo do limite.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import numpy as np
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+import config
+from src.core.chunk_store import ChunkStore
+from src.core.onnx_reranker import load_onnx_cross_encoder
+from src.core.rag_advanced import _relevance_scores
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def spearman(a: np.ndarray, b: np.ndarray) -> float:
+    """Correlação de Spearman (sem empates) entre duas listas de pontuações."""
+    rank_a = np.argsort(np.argsort(a)).astype(np.float64)
+    rank_b = np.argsort(np.argsort(b)).astype(np.float64)
+    if rank_a.std() == 0 or rank_b.std() == 0:
+        return 1.0
+    return float(np.corrcoef(rank_a, rank_b)[0, 1])
+
+def build_queries(chunks: ChunkStore, num_queries: int, candidates: int, seed: int) -> list:
+    """Gera (consulta, [documentos]) usando trechos de chunks como consulta."""
+    rng = random.Random(seed)
+    ids = chunks.ids()
+    bm25 = None
+    if os.path.exists(config.BM25_INDEX_PATH):
+        from src.core.bm25 import BM25Index
+        bm25 = BM25Index.load(config.BM25_INDEX_PATH)
+
+    queries = []
+    for chunk_id in rng.sample(ids, min(num_queries, len(ids))):
+        query = chunks.get(chunk_id).page_content[:400]
+        if bm25 is not None:
+            candidate_ids = [doc_id for doc_id, _ in bm25.search(query, k=candidates)]
+        else:
+            candidate_ids = rng.sample(ids, min(candidates, len(ids)))
+        documents = [doc.page_content for doc in chunks.get_many(candidate_ids)]
+        if len(documents) >= 2:
+            queries.append((query, documents))
+    return queries
+
+def timed_scores(model, pairs: list):
+    start = time.perf_counter()
+    scores = _relevance_scores(model.predict(pairs))
+    return scores, time.perf_counter() - start
+
+def check_agreement(num_queries: int = 50, candidates: int = 20, top_n: int = 5, threshold: float = 0.9, seed: int = 0) -> bool:
+    from sentence_transformers import CrossEncoder
+
+    queries = build_queries(ChunkStore(config.CHUNKS_PATH), num_queries, candidates, seed)
+    if not queries:
+        logging.error("Nenhuma consulta gerada. Verifique o arquivo de chunks.")
+        return False
+
+    torch_model = CrossEncoder(config.CROSS_ENCODER_MODEL)
+    onnx_model = load_onnx_cross_encoder(config.CROSS_ENCODER_MODEL, config.ONNX_CACHE_DIR, config.RERANK_NUM_THREADS)
+
+    # Uma passada de aquecimento em cada backend antes de medir
+    warmup = [[queries[0][0], queries[0][1][0]]]
+    torch_model.predict(warmup)
+    onnx_model.predict(warmup)
+
+    correlations, overlaps = [], []
+    torch_seconds = onnx_seconds = 0.0
+    for query, documents in queries:
+        pairs = [[query, doc] for doc in documents]
+        torch_scores, elapsed = timed_scores(torch_model, pairs)
+        torch_seconds += elapsed
+        onnx_scores, elapsed = timed_scores(onnx_model, pairs)
+        onnx_seconds += elapsed
+
+        n = min(top_n, len(documents))
+        correlations.append(spearman(torch_scores, onnx_scores))
+        overlaps.append(len(set(np.argsort(-torch_scores)[:n]) & set(np.argsort(-onnx_scores)[:n])) / n)
+
+    agreement = float(np.mean(overlaps))
+    logging.info(f"Consultas: {len(queries)} | candidatos por consulta: até {candidates}")
+    logging.info(f"Spearman médio: {np.mean(correlations):.4f} (mínimo {np.min(correlations):.4f})")
+    logging.info(f"Sobreposição média do top-{top_n}: {agreement:.4f} (limite {threshold})")
+    logging.info(f"Tempo de inferência: torch {torch_seconds:.2f}s | onnx-int8 {onnx_seconds:.2f}s "
+                 f"({torch_seconds / max(onnx_seconds, 1e-9):.1f}x)")
+
+    if agreement < threshold:
+        logging.error("❌ Concordância abaixo do limite: mantenha RERANKER_BACKEND=torch.")
+        return False
+    logging.info("✅ Concordância dentro do limite: RERANKER_BACKEND=onnx-int8 pode ser usado.")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara as ordenações do Cross-Encoder ONNX int8 e PyTorch.")
+    parser.add_argument("--queries", type=int, default=50, help="Número de consultas.")
+    parser.add_argument("--candidates", type=int, default=20, help="Documentos candidatos por consulta.")
+    parser.add_argument("--top-n", type=int, default=5, help="Tamanho do top-n comparado (o pipeline usa 5).")
+    parser.add_argument("--threshold", type=float, default=0.9, help="Sobreposição média mínima do top-n.")
+    args = parser.parse_args()
+
+    sys.exit(0 if check_agreement(args.queries, args.candidates, args.top_n, args.threshold) else 1)
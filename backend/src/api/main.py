@@ -1,25 +1,69 @@
 import sys
 import os
-from fastapi import FastAPI, HTTPException
+import json
+import math
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from typing import List, Literal, Optional
 from pydantic import BaseModel
 import logging
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile
 
 # Adiciona o diretório raiz do projeto ao path para encontrar os módulos
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
 
-from ..core.correction_pipeline import correct_essay_pipeline
+from ..core.correction_pipeline import (
+    PIPELINE_MODES,
+    acorrect_essay_pipeline,
+    acorrect_essay_with_cache,
+    astream_correction,
+    lookup_cached_correction,
+    store_correction,
+)
+from ..core.components import get_registry
+from ..core.errors import CircuitOpenError, CorrectionError, OverloadedError
+from ..core.file_extraction import aextract_upload_text
+from ..core.tracing import current_trace, stage, trace_request
+from ..core import metrics
+import config
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+async def _warm_up_components():
+    """Aquece os componentes do pipeline sem bloquear o event loop."""
+    try:
+        await asyncio.to_thread(get_registry().warm_up)
+    except Exception as e:
+        logging.error(f"Aquecimento dos componentes falhou: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Dispara o aquecimento dos componentes na inicialização e inicia os workers
+    da fila de correções em lote. O aquecimento roda em segundo plano: /health
+    responde imediatamente e /ready só indica prontidão quando ele termina.
+    """
+    app.state.warmup_task = asyncio.create_task(_warm_up_components())
+    # Retoma os jobs em lote pendentes (inclusive os interrompidos por uma parada anterior)
+    await get_registry().job_queue.start(acorrect_essay_with_cache)
+    yield
+    app.state.warmup_task.cancel()
+    await get_registry().job_queue.stop()
+    get_registry().shutdown()
+
 # Inicializa a aplicação FastAPI
 app = FastAPI(
     title="Elysia-Sabia API",
     description="API para correção de redações utilizando RAG e LLMs.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Adiciona o middleware CORS logo após a criação do app
@@ -29,8 +73,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Correction-Cache", "X-Extraction-Cache", "Server-Timing"],
 )
 
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Atribui um id a cada requisição (o X-Request-ID recebido ou um novo), mede as
+    etapas do pipeline e devolve seus tempos no cabeçalho Server-Timing. No
+    streaming, os tempos vão no evento "done", pois os cabeçalhos saem antes.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    with trace_request(request_id) as trace:
+        response = await call_next(request)
+
+    # Rota (ex.: "/jobs/{job_id}") em vez do caminho, para não criar uma série por URL
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", "other")
+    metrics.REQUEST_SECONDS.labels(endpoint, request.method, str(response.status_code)).observe(trace.elapsed())
+
+    response.headers["X-Request-ID"] = request_id
+    if trace.stages:
+        response.headers["Server-Timing"] = trace.server_timing()
+        logging.info(f"[{request_id}] {request.method} {endpoint} {response.status_code} — {trace.summary()}")
+    return response
+
 # Serve arquivos estáticos do frontend
 frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..', 'frontend'))
 app.mount("/assets", StaticFiles(directory=os.path.join(frontend_path, "assets")), name="assets")
@@ -39,6 +106,12 @@ app.mount("/static", StaticFiles(directory=frontend_path), name="static")
 # Define o modelo de dados para a requisição (o que a API espera receber)
 class EssayRequest(BaseModel):
     text: str
+    # "full" (HyDE + busca híbrida) ou "fast" (sem HyDE, menor latência); padrão: config.PIPELINE_MODE
+    mode: Optional[Literal["full", "fast"]] = None
+
+class BatchEssayRequest(BaseModel):
+    essays: List[str]
+    mode: Optional[Literal["full", "fast"]] = None
 
 @app.get("/", summary="Frontend principal")
 async def read_index():
@@ -56,10 +129,17 @@ async def read_style():
     return FileResponse(os.path.join(frontend_path, "style.css"))
 
 @app.post("/correct/", summary="Corrige uma redação")
-async def correct_essay(request: EssayRequest):
+async def correct_essay(request: EssayRequest, response: Response):
     """
     Recebe o texto de uma redação, executa o pipeline de correção completo
-    e retorna a análise gerada pela IA.
+    e retorna a análise gerada pela IA. O cabeçalho X-Correction-Cache indica
+    se a correção veio do cache ("exact" ou "near") ou foi gerada ("miss").
+    Com `mode="fast"`, o HyDE é pulado e a busca usa diretamente o texto da redação.
+    Falhas respondem com o status da exceção: 502 (erro do LLM), 503 (serviço
+    indisponível, com Retry-After), 504 (tempo limite) ou 500.
+
+    Só as correções que não estão em cache passam pelo controle de admissão: com
+    o servidor no limite, a requisição espera na fila ou recebe 429/503 com Retry-After.
     """
     logging.info("Recebida nova requisição de correção.")
     
@@ -67,23 +147,200 @@ async def correct_essay(request: EssayRequest):
         logging.warning("Requisição recebida com texto vazio.")
         raise HTTPException(status_code=400, detail="O texto da redação não pode estar vazio.")
     
+    correction_result = await _correct(request.text, request.mode, response, "/correct/")
+    return {"correction": correction_result}
+
+# Folga para os cabeçalhos do multipart e o campo "mode", além do próprio arquivo
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+
+@app.post("/correct/file", summary="Corrige uma redação enviada como arquivo (PDF, DOCX ou TXT)")
+async def correct_essay_file(request: Request, response: Response):
+    """
+    Recebe a redação como arquivo (multipart/form-data, campo "file"; opcionalmente
+    "mode"), extrai o texto no servidor e segue como o /correct/. A extração roda em
+    um processo por arquivo, com tempo limite, e o texto fica em cache pelo hash do
+    arquivo: reenvios do mesmo arquivo não são extraídos de novo (cabeçalho
+    X-Extraction-Cache: "hit" ou "miss"). O upload é gravado em um arquivo
+    temporário (em memória até 1 MB) e recusado com 413 acima de UPLOAD_MAX_BYTES;
+    formatos não suportados recebem 415 e arquivos ilegíveis, 422.
+    """
+    logging.info("Recebida nova requisição de correção por arquivo.")
+
+    content_length = request.headers.get("content-length")
+    if content_length is None:
+        raise HTTPException(status_code=411, detail="Envie o arquivo com o cabeçalho Content-Length.")
+    if not content_length.isdigit() or int(content_length) > config.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        # Recusa antes de receber o corpo
+        raise HTTPException(status_code=413, detail=f"O arquivo passa do limite de {config.UPLOAD_MAX_BYTES // (1024 * 1024)} MB.")
+
+    # Multipart malformado ou com mais partes que o esperado: o Starlette responde 400
+    form = await request.form(max_files=1, max_fields=1)
     try:
-        # Chama a função principal do seu backend
-        correction_result = correct_essay_pipeline(request.text)
-        
-        # Verifica se houve erro no pipeline
-        if "Erro" in correction_result:
-            logging.error(f"Erro retornado pelo pipeline: {correction_result}")
-            raise HTTPException(status_code=500, detail=correction_result)
-            
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=422, detail="Envie o arquivo da redação no campo 'file'.")
+        mode = form.get("mode") or None
+        if mode is not None and mode not in PIPELINE_MODES:
+            raise HTTPException(status_code=422, detail=f"Modo inválido: {mode}. Use 'full' ou 'fast'.")
+
+        registry = get_registry()
+        try:
+            with stage("extraction"):
+                essay_text, extraction_cache = await aextract_upload_text(
+                    upload, registry.file_extractor, registry.extraction_cache, config.UPLOAD_MAX_BYTES
+                )
+        except CorrectionError as e:
+            logging.warning(f"Arquivo recusado: {e}")
+            raise _http_error(e)
+        response.headers["X-Extraction-Cache"] = extraction_cache
+    finally:
+        await form.close()
+
+    correction_result = await _correct(essay_text, mode, response, "/correct/file")
+    return {"correction": correction_result, "text": essay_text}
+
+async def _correct(essay_text: str, mode: Optional[str], response: Response, endpoint: str) -> str:
+    """
+    Correção de /correct/ e /correct/file: o cache de resultados e, fora dele, o
+    pipeline sob o controle de admissão. Falhas viram a resposta HTTP correspondente.
+    """
+    try:
+        correction_result, cache_status = lookup_cached_correction(essay_text)
+        if correction_result is None:
+            # Chama a versão assíncrona do pipeline, que não bloqueia o event loop
+            async with get_registry().admission.admit():
+                correction_result = await acorrect_essay_pipeline(essay_text, mode)
+            store_correction(essay_text, correction_result, mode)
+        response.headers["X-Correction-Cache"] = cache_status
         logging.info("Correção gerada com sucesso.")
-        return {"correction": correction_result}
+        return correction_result
 
+    except OverloadedError as e:
+        logging.warning(f"Requisição recusada: {e}")
+        raise _http_error(e)
+    except CorrectionError as e:
+        logging.error(f"Erro retornado pelo pipeline: {e}")
+        raise _http_error(e)
     except Exception as e:
-        logging.error(f"Erro inesperado no endpoint /correct/: {e}")
+        logging.error(f"Erro inesperado no endpoint {endpoint}: {e}")
         raise HTTPException(status_code=500, detail=f"Erro interno no servidor: {str(e)}")
 
+def _http_error(error: CorrectionError) -> HTTPException:
+    """Converte uma falha do pipeline na resposta HTTP correspondente."""
+    headers = None
+    if isinstance(error, (CircuitOpenError, OverloadedError)):
+        headers = {"Retry-After": str(max(1, math.ceil(error.retry_after)))}
+    return HTTPException(status_code=error.status_code, detail=str(error), headers=headers)
+
+def _sse_event(event: str, data) -> str:
+    """Formata um evento no padrão Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/correct/stream", summary="Corrige uma redação com streaming (SSE)")
+async def correct_essay_stream(request: EssayRequest):
+    """
+    Executa o pipeline de correção enviando Server-Sent Events: um evento ao fim
+    de cada etapa (hyde, retrieved, reranked, packed), os tokens gerados ("token") e,
+    ao final, "done" (com os tempos de cada etapa em ms) ou "error". Se houver
+    correção em cache, ela é enviada em um único evento "token". A vaga do controle de admissão é obtida antes de
+    abrir o stream (a recusa é um 429/503 comum) e liberada quando ele termina.
+    """
+    logging.info("Recebida nova requisição de correção (streaming).")
+
+    if not request.text or not request.text.strip():
+        logging.warning("Requisição recebida com texto vazio.")
+        raise HTTPException(status_code=400, detail="O texto da redação não pode estar vazio.")
+
+    cached_correction, cache_status = lookup_cached_correction(request.text)
+
+    ticket = None
+    if cached_correction is None:
+        try:
+            ticket = await get_registry().admission.acquire()
+        except CorrectionError as e:
+            logging.warning(f"Requisição de streaming recusada: {e}")
+            raise _http_error(e)
+
+    async def event_stream():
+        if cached_correction is not None:
+            yield _sse_event("token", {"text": cached_correction})
+            yield _sse_event("done", {})
+            return
+
+        trace = current_trace()
+        try:
+            tokens = []
+            async for event, data in astream_correction(request.text, request.mode):
+                if event == "token":
+                    tokens.append(data["text"])
+                elif event == "done":
+                    store_correction(request.text, "".join(tokens), request.mode)
+                    if trace is not None:
+                        data = {**data, "timings": trace.timings_ms()}
+                yield _sse_event(event, data)
+        finally:
+            ticket.release()
+            if trace is not None:
+                logging.info(f"[{trace.request_id}] POST /correct/stream (fim do stream) — {trace.summary()}")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Correction-Cache": cache_status},
+        # Garante a liberação da vaga mesmo se o cliente desconectar antes do stream começar
+        background=BackgroundTask(ticket.release) if ticket is not None else None,
+    )
+
+@app.post("/correct/batch", status_code=202, summary="Corrige um lote de redações em segundo plano")
+async def correct_essay_batch(request: BatchEssayRequest):
+    """
+    Recebe várias redações (ex.: uma turma inteira) e retorna imediatamente o id
+    do job. As correções são feitas por um pool de workers e acompanhadas em
+    GET /jobs/{job_id}. O job fica gravado em disco e sobrevive a reinícios.
+    """
+    essays = request.essays
+    if not essays:
+        raise HTTPException(status_code=400, detail="Envie ao menos uma redação.")
+    if len(essays) > config.JOB_MAX_ESSAYS:
+        raise HTTPException(status_code=413, detail=f"O lote pode ter no máximo {config.JOB_MAX_ESSAYS} redações.")
+    empty = [idx for idx, essay in enumerate(essays) if not essay or not essay.strip()]
+    if empty:
+        raise HTTPException(status_code=400, detail=f"Redações vazias nas posições: {empty}.")
+
+    job_id = await get_registry().job_queue.submit(essays, request.mode)
+    logging.info(f"Recebido lote de {len(essays)} redações (job {job_id}).")
+    return {"job_id": job_id, "status": "queued", "total": len(essays), "status_url": f"/jobs/{job_id}"}
+
+@app.get("/jobs/{job_id}", summary="Estado de um job de correção em lote")
+async def read_job(job_id: str, include_results: bool = True):
+    """Estado do job e de cada redação (queued, running, done ou error), com as correções prontas."""
+    job = await get_registry().job_queue.get(job_id, include_results)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado.")
+    return job
+
 @app.get("/health", summary="Endpoint de verificação")
 def read_root():
     """Endpoint raiz para verificar se a API está funcionando."""
-    return {"status": "Elysia-Sabia API está online!"}
\ No newline at end of file
+    return {"status": "Elysia-Sabia API está online!"}
+
+@app.get("/ready", summary="Endpoint de prontidão")
+def read_ready():
+    """Indica se os componentes do pipeline já foram carregados e aquecidos."""
+    registry = get_registry()
+    if registry.is_ready:
+        return {"status": "ready"}
+
+    status = "failed" if registry.warmup_error else "warming_up"
+    return JSONResponse(status_code=503, content={"status": status, "detail": registry.warmup_error})
+
+@app.get("/metrics", summary="Métricas no formato do Prometheus")
+def read_metrics():
+    """Histogramas por etapa e por endpoint, tokens, caches, fallbacks e erros (deste processo)."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/stats", summary="Estatísticas internas")
+def read_stats():
+    """Estatísticas dos componentes compartilhados (ex.: tamanhos de lote do re-ranking)."""
+    return get_registry().stats()
@@ -0,0 +1,124 @@
+"""
+Controle de admissão das correções interativas (/correct/ e /correct/stream).
+
+No máximo `max_in_flight` correções rodam ao mesmo tempo; as demais esperam em uma
+fila FIFO de até `max_queue` requisições, por no máximo `max_wait_seconds`. Com a
+fila cheia, a requisição é recusada na hora (429); se a espera estimada ou real
+passar do máximo, com 503. Ambas trazem um Retry-After estimado pela duração
+recente das correções. Sob sobrecarga, a vazão fica estável e a latência limitada,
+em vez de todas as requisições disputarem os serviços externos até o tempo limite.
+"""
+import time
+import asyncio
+from contextlib import asynccontextmanager
+
+from .errors import OverloadedError, QueueFullError
+from .metrics import ADMISSION_REJECTIONS
+
+
+class AdmissionTicket:
+    """Vaga concedida a uma requisição. `release()` pode ser chamado mais de uma vez."""
+
+    def __init__(self, controller, admitted_at: float):
+        self._controller = controller
+        self._admitted_at = admitted_at
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._admitted_at)
+
+
+class AdmissionController:
+    """Limite de correções simultâneas com fila de espera limitada (ver o docstring do módulo)."""
+
+    def __init__(self, max_in_flight: int = 16, max_queue: int = 32, max_wait_seconds: float = 10.0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_wait = 0
+        self._service_seconds = None  # média móvel da duração de uma correção
+        self._wait_seconds = 0.0
+
+    def _estimated_wait(self, position: int) -> float:
+        """Espera estimada para quem entra na posição `position` da fila."""
+        if self._service_seconds is None:
+            return 0.0
+        return self._service_seconds * (position + 1) / self.max_in_flight
+
+    def retry_after(self) -> float:
+        """Segundos sugeridos no Retry-After: o tempo para a fila atual andar."""
+        return max(1.0, self._estimated_wait(self.waiting))
+
+    async def acquire(self) -> AdmissionTicket:
+        """Aguarda uma vaga e retorna o ticket, ou levanta QueueFullError/OverloadedError."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        start = time.monotonic()
+        if self._semaphore.locked() or self.waiting:
+            if self.waiting >= self.max_queue:
+                self.rejected_queue_full += 1
+                ADMISSION_REJECTIONS.labels("queue_full").inc()
+                raise QueueFullError("Servidor sobrecarregado: fila de correções cheia. Tente novamente mais tarde.", self.retry_after())
+            if self._estimated_wait(self.waiting) > self.max_wait_seconds:
+                # Nem vale entrar na fila: a espera estimada já passa do máximo
+                self.rejected_wait += 1
+                ADMISSION_REJECTIONS.labels("estimated_wait").inc()
+                raise OverloadedError("Servidor sobrecarregado: tempo de espera estimado acima do limite.", self.retry_after())
+
+            self.waiting += 1
+            try:
+                async with asyncio.timeout(self.max_wait_seconds):
+                    await self._semaphore.acquire()
+            except TimeoutError:
+                self.rejected_wait += 1
+                ADMISSION_REJECTIONS.labels("wait_timeout").inc()
+                raise OverloadedError("Servidor sobrecarregado: tempo máximo na fila de correções excedido.", self.retry_after())
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        waited = time.monotonic() - start
+        self._wait_seconds = waited if not self.admitted else 0.9 * self._wait_seconds + 0.1 * waited
+        self.in_flight += 1
+        self.admitted += 1
+        return AdmissionTicket(self, time.monotonic())
+
+    def _release(self, service_seconds: float):
+        self.in_flight -= 1
+        self._semaphore.release()
+        if self._service_seconds is None:
+            self._service_seconds = service_seconds
+        else:
+            self._service_seconds = 0.9 * self._service_seconds + 0.1 * service_seconds
+
+    @asynccontextmanager
+    async def admit(self):
+        """Ocupa uma vaga durante o bloco."""
+        ticket = await self.acquire()
+        try:
+            yield
+        finally:
+            ticket.release()
+
+    def stats(self) -> dict:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_wait": self.rejected_wait,
+            "avg_wait_seconds": round(self._wait_seconds, 3),
+            "avg_service_seconds": round(self._service_seconds, 3) if self._service_seconds is not None else None,
+        }
@@ -0,0 +1,194 @@
+"""
+Índice léxico BM25 para português, construído a partir dos mesmos chunks do banco vetorial.
+
+Tokenização: remoção de acentos, minúsculas, stopwords e um stemmer leve
+(plural, advérbios em -mente e vogal temática). O índice é gravado de forma compacta:
+    bm25.npz    listas invertidas em formato CSR (indptr, documentos, frequências)
+                e o tamanho de cada documento
+    bm25.json   vocabulário, ids dos chunks e parâmetros (k1, b)
+"""
+import os
+import re
+import json
+import asyncio
+import logging
+import unicodedata
+from collections import Counter
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+ARRAYS_FILE = "bm25.npz"
+VOCAB_FILE = "bm25.json"
+
+# Stopwords do português (já sem acentos, pois são comparadas após a remoção)
+STOPWORDS = frozenset("""
+a ao aos aquela aquelas aquele aqueles aquilo as ate com como da das de dela delas dele deles
+depois do dos e ela elas ele eles em entre era eram essa essas esse esses esta estas este estes
+eu foi foram ha isso isto ja la lhe lhes mais mas me mesmo meu meus minha minhas muito na nao
+nas nem no nos nossa nossas nosso nossos num numa o os ou para pela pelas pelo pelos por qual
+quando que quem se sem ser seu seus so sua suas tambem te tem tinha tu tua tuas um uma umas uns
+voce voces vos sao estao esta estava foi sera seria ser sido tendo ter teve tiver pois porque
+assim onde apenas cada ainda sobre sob ate tal tais todo toda todos todas outro outra outros outras
+""".split())
+
+# Regras de plural (aplicadas sobre o texto sem acentos), em ordem de prioridade
+_PLURAL_RULES = (
+    ("oes", "ao"), ("aes", "ao"), ("aos", "ao"), ("ais", "al"), ("eis", "el"),
+    ("ois", "ol"), ("res", "r"), ("zes", "z"), ("ns", "m"),
+)
+
+
+def fold_accents(text: str) -> str:
+    """Remove acentos e cedilhas (ex.: "argumentação" -> "argumentacao")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def light_stem(token: str) -> str:
+    """Stemmer leve: reduz plural, advérbios em -mente e a vogal final (gênero)."""
+    if len(token) > 3 and token.endswith("s"):
+        for suffix, replacement in _PLURAL_RULES:
+            if token.endswith(suffix):
+                token = token[: -len(suffix)] + replacement
+                break
+        else:
+            token = token[:-1]
+    if len(token) > 7 and token.endswith("mente"):
+        token = token[:-5]
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def portuguese_tokens(text: str) -> list:
+    """Tokeniza o texto para o BM25 (sem acentos, sem stopwords, com stemming leve)."""
+    tokens = re.findall(r"[a-z0-9]+", fold_accents(text).lower())
+    return [light_stem(token) for token in tokens if len(token) > 1 and token not in STOPWORDS]
+
+
+class BM25Index:
+    """Índice invertido BM25 com pontuação vetorizada por termo da consulta."""
+
+    def __init__(self, terms: list, doc_ids: list, indptr, postings_docs, postings_tf, doc_len, k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.doc_ids = doc_ids
+        self.indptr = indptr
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+
+        num_docs = len(doc_ids)
+        doc_freq = np.diff(indptr).astype(np.float32)
+        self.idf = np.log1p((num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if num_docs else 1.0
+        # Parte do denominador que depende só do documento, pré-calculada
+        self._length_norm = (k1 * (1 - b + b * doc_len / max(avgdl, 1.0))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, chunks, k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        """Constrói o índice a partir de um iterável de chunks (Documents com `chunk_id`)."""
+        doc_ids, doc_len = [], []
+        postings = {}
+        for chunk in chunks:
+            chunk_id = chunk.metadata.get("chunk_id")
+            if not chunk_id:
+                continue
+            counts = Counter(portuguese_tokens(chunk.page_content))
+            doc = len(doc_ids)
+            doc_ids.append(chunk_id)
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            indptr[i + 1] = indptr[i] + len(postings[term])
+        postings_docs = np.empty(indptr[-1], dtype=np.int32)
+        postings_tf = np.empty(indptr[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            docs, tfs = zip(*postings[term])
+            postings_docs[indptr[i]:indptr[i + 1]] = docs
+            postings_tf[indptr[i]:indptr[i + 1]] = np.minimum(tfs, np.iinfo(np.uint16).max)
+
+        return cls(terms, doc_ids, indptr, postings_docs, postings_tf, np.asarray(doc_len, dtype=np.int32), k1, b)
+
+    def save(self, path: str):
+        """Grava o índice no diretório `path`."""
+        os.makedirs(path, exist_ok=True)
+        np.savez_compressed(
+            os.path.join(path, ARRAYS_FILE),
+            indptr=self.indptr, postings_docs=self.postings_docs, postings_tf=self.postings_tf, doc_len=self.doc_len,
+        )
+        with open(os.path.join(path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"terms": self.terms, "doc_ids": self.doc_ids, "k1": self.k1, "b": self.b}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Carrega um índice gravado por `save`."""
+        arrays_path = os.path.join(path, ARRAYS_FILE)
+        if not os.path.exists(arrays_path):
+            raise FileNotFoundError(
+                f"Índice BM25 não encontrado em {path}. Execute scripts/preprocessing/build_bm25_index.py."
+            )
+        with open(os.path.join(path, VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with np.load(arrays_path) as arrays:
+            index = cls(
+                vocab["terms"], vocab["doc_ids"], arrays["indptr"], arrays["postings_docs"],
+                arrays["postings_tf"], arrays["doc_len"], vocab["k1"], vocab["b"],
+            )
+        logging.info(f"Índice BM25 carregado: {len(index)} documentos, {len(index.terms)} termos.")
+        return index
+
+    def search(self, query: str, k: int = 20) -> list:
+        """Retorna até `k` pares (chunk_id, pontuação) em ordem decrescente."""
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term, query_tf in Counter(portuguese_tokens(query)).items():
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            scores[docs] += query_tf * self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(self.doc_ids[i], float(scores[i])) for i in ordered]
+
+
+class BM25Retriever(BaseRetriever):
+    """Retriever do LangChain sobre o `BM25Index`; o conteúdo vem do chunk store."""
+
+    index: Any
+    chunks: Any
+    k: int = 20
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        hits = self.index.search(query, k=self.k)
+        scores = dict(hits)
+        documents = []
+        for doc in self.chunks.get_many([chunk_id for chunk_id, _ in hits]):
+            metadata = dict(doc.metadata)
+            metadata["bm25_score"] = scores[metadata["chunk_id"]]
+            documents.append(Document(page_content=doc.page_content, metadata=metadata))
+        return documents
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # A busca é CPU e leitura de disco: roda fora do event loop
+        return await asyncio.to_thread(self._get_relevant_documents, query, run_manager=run_manager.get_sync())
@@ -0,0 +1,171 @@
+"""
+Armazenamento de chunks em streaming: um arquivo JSON por linha (append-only) e um
+índice pequeno de offsets, para iterar os chunks sob demanda ou buscar pelo `chunk_id`
+sem carregar o arquivo inteiro na memória.
+
+Formato:
+    chunks.jsonl      {"chunk_id": ..., "page_content": ..., "metadata": {...}} por linha
+    chunks.jsonl.idx  "chunk_id<TAB>offset<TAB>tamanho" por linha
+"""
+import os
+import json
+import logging
+
+from langchain_core.documents import Document
+
+INDEX_SUFFIX = ".idx"
+
+
+class ChunkStoreWriter:
+    """
+    Grava chunks incrementalmente. Por padrão reescreve o arquivo: grava em arquivos
+    temporários e os substitui de forma atômica ao fechar, de modo que leitores nunca
+    vejam um arquivo pela metade. Com `append=True`, acrescenta ao arquivo existente.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.append = append
+        self.count = 0
+        self.total_chars = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._data_path = path if append else path + ".tmp"
+        self._index_path = path + INDEX_SUFFIX if append else path + INDEX_SUFFIX + ".tmp"
+        mode = "ab" if append else "wb"
+        self._data = open(self._data_path, mode)
+        self._index = open(self._index_path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, chunk: Document):
+        """Acrescenta um chunk ao arquivo e registra seu offset no índice."""
+        chunk_id = chunk.metadata.get("chunk_id")
+        if not chunk_id:
+            raise ValueError("Todo chunk precisa de 'chunk_id' nos metadados.")
+
+        record = json.dumps(
+            {"chunk_id": chunk_id, "page_content": chunk.page_content, "metadata": chunk.metadata},
+            ensure_ascii=False,
+        ).encode("utf-8") + b"\n"
+
+        offset = self._data.tell()
+        self._data.write(record)
+        self._index.write(f"{chunk_id}\t{offset}\t{len(record)}\n")
+
+        self.count += 1
+        self.total_chars += len(chunk.page_content)
+
+    def write_all(self, chunks) -> int:
+        """Consome um iterável de chunks, gravando cada um assim que é produzido."""
+        for chunk in chunks:
+            self.write(chunk)
+        return self.count
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+        if not self.append:
+            os.replace(self._data_path, self.path)
+            os.replace(self._index_path, self.path + INDEX_SUFFIX)
+
+    def abort(self):
+        """Descarta uma gravação não concluída."""
+        self._data.close()
+        self._index.close()
+        if not self.append:
+            for tmp_path in (self._data_path, self._index_path):
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class ChunkStore:
+    """Leitura dos chunks gravados por `ChunkStoreWriter`."""
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Arquivo de chunks não encontrado: {path}")
+        self.path = path
+        self._offsets = None
+
+    @staticmethod
+    def _to_document(record: dict) -> Document:
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+
+    def __iter__(self):
+        """Itera os chunks sob demanda, na ordem em que foram gravados."""
+        with open(self.path, "rb") as f:
+            for line_number, line in enumerate(f, start=1):
+                try:
+                    yield self._to_document(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Linha {line_number} inválida em {self.path}; ignorando.")
+
+    def _load_index(self) -> dict:
+        """Carrega (uma vez) o índice chunk_id -> (offset, tamanho), reconstruindo-o se necessário."""
+        if self._offsets is not None:
+            return self._offsets
+
+        offsets = {}
+        index_path = self.path + INDEX_SUFFIX
+        if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(self.path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    chunk_id, offset, length = line.rstrip("\n").split("\t")
+                    offsets[chunk_id] = (int(offset), int(length))
+        else:
+            logging.info(f"Índice ausente ou desatualizado; reconstruindo a partir de {self.path}")
+            with open(self.path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        offsets[json.loads(line)["chunk_id"]] = (offset, len(line))
+                    except (json.JSONDecodeError, KeyError):
+                        pass
+                    offset += len(line)
+
+        self._offsets = offsets
+        return offsets
+
+    def ids(self) -> list:
+        return list(self._load_index())
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self._load_index()
+
+    def get(self, chunk_id: str):
+        """Busca um chunk pelo `chunk_id` (acesso direto pelo offset). Retorna None se ausente."""
+        entry = self._load_index().get(chunk_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return self._to_document(json.loads(f.read(length)))
+
+    def get_many(self, chunk_ids) -> list:
+        """Busca vários chunks com um único arquivo aberto, preservando a ordem pedida."""
+        index = self._load_index()
+        documents = []
+        with open(self.path, "rb") as f:
+            for chunk_id in chunk_ids:
+                entry = index.get(chunk_id)
+                if entry is None:
+                    continue
+                f.seek(entry[0])
+                documents.append(self._to_document(json.loads(f.read(entry[1]))))
+        return documents
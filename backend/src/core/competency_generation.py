@@ -0,0 +1,195 @@
+"""
+Geração da correção por competência (map-reduce).
+
+Cada uma das cinco competências do ENEM recebe um prompt focado, com uma fatia do
+contexto escolhida pelas palavras-chave da competência, e as cinco chamadas ao Sabiá
+rodam em paralelo. Uma chamada curta de fechamento escreve o feedback geral a partir
+das cinco análises. Cada ramo tem tempo limite próprio: um ramo lento ou com erro
+vira um aviso na seção correspondente, sem derrubar a correção inteira.
+"""
+import time
+import asyncio
+import logging
+
+from langchain.prompts import PromptTemplate
+
+from .bm25 import portuguese_tokens
+from .concurrency import STAGE_GENERATION, stage_slot
+from .context_packer import pack_context
+from .errors import GenerationError
+from .metrics import record_fallback
+
+COMPETENCIES = [
+    {
+        "id": 1,
+        "title": "Competência 1 - Domínio da norma padrão",
+        "focus": "domínio da modalidade escrita formal da língua portuguesa: gramática, ortografia, acentuação, pontuação, concordância, regência e escolha de registro",
+        "keywords": "norma padrão gramática ortografia acentuação pontuação concordância regência crase desvios registro formal",
+    },
+    {
+        "id": 2,
+        "title": "Competência 2 - Compreensão da proposta e repertório",
+        "focus": "compreensão da proposta de redação, adequação ao tema e ao tipo textual dissertativo-argumentativo e uso de repertório sociocultural legitimado e produtivo",
+        "keywords": "tema proposta tangenciamento tipo textual dissertativo argumentativo repertório sociocultural legitimado produtivo",
+    },
+    {
+        "id": 3,
+        "title": "Competência 3 - Seleção e organização dos argumentos",
+        "focus": "seleção, relação, organização e interpretação de informações, fatos e opiniões em defesa de um ponto de vista; projeto de texto e autoria",
+        "keywords": "argumentação argumentos ponto de vista tese projeto de texto autoria desenvolvimento fundamentação",
+    },
+    {
+        "id": 4,
+        "title": "Competência 4 - Coesão textual",
+        "focus": "conhecimento dos mecanismos linguísticos necessários para a construção da argumentação: conectivos, referenciação e articulação entre frases e parágrafos",
+        "keywords": "coesão conectivos operadores argumentativos referenciação articulação parágrafos repetição pronomes",
+    },
+    {
+        "id": 5,
+        "title": "Competência 5 - Proposta de intervenção",
+        "focus": "elaboração de proposta de intervenção para o problema abordado, respeitando os direitos humanos, com agente, ação, meio/modo, finalidade e detalhamento",
+        "keywords": "proposta de intervenção agente ação meio modo finalidade efeito detalhamento direitos humanos",
+    },
+]
+
+COMPETENCY_TEMPLATE = """
+        Você é um corretor de redações do ENEM extremamente competente. Analise a redação a seguir
+        apenas quanto à {competencia}: {foco}.
+
+        **Instruções:**
+        1.  Aponte os erros e acertos da redação nesta competência, citando trechos do texto.
+        2.  Use os "Materiais de Referência" para embasar a análise.
+        3.  Não forneça notas; sugira melhorias concretas.
+        4.  Seja objetivo: no máximo alguns parágrafos curtos.
+
+        **Materiais de Referência:**
+        ---
+        {contexto}
+        ---
+
+        **Redação do Aluno:**
+        ---
+        {redacao}
+        ---
+
+        **Análise da {competencia}:**
+        """
+
+MERGE_TEMPLATE = """
+        Você é um corretor de redações do ENEM. Abaixo estão as análises de uma redação em cada
+        competência. Escreva um único parágrafo de feedback geral, destacando os pontos fortes
+        e as principais sugestões de melhoria. Não forneça notas.
+
+        {analises}
+
+        **Feedback Geral:**
+        """
+
+# Texto da seção de uma competência cujo ramo falhou ou excedeu o tempo limite
+UNAVAILABLE_SECTION = "_Análise indisponível para esta competência no momento. Tente novamente mais tarde._"
+
+competency_prompt = PromptTemplate(input_variables=["competencia", "foco", "contexto", "redacao"], template=COMPETENCY_TEMPLATE)
+merge_prompt = PromptTemplate(input_variables=["analises"], template=MERGE_TEMPLATE)
+
+
+def competency_context(competency: dict, documents: list, token_budget: int, max_documents: int = 3) -> str:
+    """Fatia do contexto para a competência: os documentos com mais termos em comum com suas palavras-chave."""
+    keywords = set(portuguese_tokens(competency["keywords"]))
+    ranked = sorted(
+        enumerate(documents),
+        key=lambda item: (-len(keywords & set(portuguese_tokens(item[1].page_content))), item[0]),
+    )
+    selected = sorted(ranked[:max_documents], key=lambda item: item[0])
+    context, _ = pack_context([doc for _, doc in selected], token_budget)
+    return context
+
+
+def _is_failed(text: str) -> bool:
+    return not text or not text.strip()
+
+
+async def _ainvoke_in_slot(chain, inputs: dict):
+    """Chamada ao Sabiá dentro de uma vaga da geração; o tempo limite do chamador cobre também a espera pela vaga."""
+    async with stage_slot(STAGE_GENERATION):
+        return await chain.ainvoke(inputs)
+
+
+async def _agenerate_competency(competency: dict, essay_text: str, documents: list, llm, timeout: float, token_budget: int):
+    """Um ramo do map: retorna (competência, texto ou None, status, segundos)."""
+    start = time.perf_counter()
+    chain = competency_prompt | llm
+    inputs = {
+        "competencia": competency["title"],
+        "foco": competency["focus"],
+        "contexto": competency_context(competency, documents, token_budget),
+        "redacao": essay_text,
+    }
+    try:
+        text = await asyncio.wait_for(_ainvoke_in_slot(chain, inputs), timeout=timeout)
+    except asyncio.TimeoutError:
+        return competency, None, "timeout", time.perf_counter() - start
+    except Exception as e:
+        logging.error(f"Erro na geração da {competency['title']}: {e}")
+        return competency, None, "error", time.perf_counter() - start
+
+    if _is_failed(text):
+        logging.error(f"Erro na geração da {competency['title']}: {text}")
+        return competency, None, "error", time.perf_counter() - start
+    return competency, text.strip(), "ok", time.perf_counter() - start
+
+
+async def agenerate_by_competency(
+    essay_text: str,
+    documents: list,
+    llm,
+    timeout: float = 60.0,
+    max_tokens: int = 700,
+    merge_max_tokens: int = 300,
+    context_token_budget: int = 1200,
+):
+    """
+    Gera a correção com uma chamada por competência, em paralelo, e uma chamada de
+    fechamento. Gera eventos (evento, dados): "competency" a cada ramo concluído e,
+    por fim, "result" com o texto final. Se todos os ramos falharem, levanta GenerationError.
+    """
+    branch_llm = llm.bind(max_tokens=max_tokens)
+    tasks = [
+        asyncio.create_task(_agenerate_competency(competency, essay_text, documents, branch_llm, timeout, context_token_budget))
+        for competency in COMPETENCIES
+    ]
+
+    sections = {}
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            competency, text, status, seconds = await next_done
+            sections[competency["id"]] = (competency, text)
+            logging.info(f"{competency['title']}: {status} em {seconds:.1f}s")
+            yield "competency", {"id": competency["id"], "status": status, "seconds": round(seconds, 2)}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    completed = [(competency, text) for competency, text in sections.values() if text is not None]
+    if not completed:
+        raise GenerationError("Não foi possível gerar a análise de nenhuma competência.")
+
+    parts = []
+    for competency in COMPETENCIES:
+        _, text = sections[competency["id"]]
+        if text is None:
+            record_fallback("competency_branch")
+            text = UNAVAILABLE_SECTION
+        parts.append(f"**{competency['title']}**\n\n{text}")
+
+    # Reduce: feedback geral a partir das análises concluídas
+    analyses = "\n\n".join(f"{competency['title']}:\n{text}" for competency, text in completed)
+    try:
+        feedback = await asyncio.wait_for(
+            _ainvoke_in_slot(merge_prompt | llm.bind(max_tokens=merge_max_tokens), {"analises": analyses}), timeout=timeout
+        )
+        if not _is_failed(feedback):
+            parts.append(f"**Feedback Geral**\n\n{feedback.strip()}")
+    except Exception as e:
+        logging.warning(f"Feedback geral não gerado: {e!r}")
+
+    yield "result", "\n\n".join(parts)
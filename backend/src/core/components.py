@@ -0,0 +1,353 @@
+import os
+import logging
+import threading
+import config
+
+from .llm_integration import SabiáLLM
+from .rerank_batcher import MicroBatchReranker
+from .disk_cache import SQLiteCache
+from .result_cache import NearDuplicateResultCache
+from .numpy_index import NumpyRetriever, NumpyVectorIndex
+from .bm25 import BM25Index, BM25Retriever
+from .chunk_store import ChunkStore
+from .onnx_reranker import load_onnx_cross_encoder
+from .rerank_cache import RerankScoreCache
+from .context_packer import count_tokens
+from .job_queue import JobQueue, JobStore
+from .admission import AdmissionController
+from .file_extraction import FileExtractor
+from .llm_clients import UPSTREAM_OPENAI, async_http_client, http_client
+from . import concurrency, llm_clients
+
+from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_chroma import Chroma
+from sentence_transformers import CrossEncoder
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ComponentRegistry:
+    """
+    Registro dos componentes do pipeline com o mesmo ciclo de vida do processo.
+    Cada componente é construído uma única vez (sob demanda ou no aquecimento)
+    e compartilhado entre todas as requisições.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._components = {}
+        self._ready = threading.Event()
+        self.warmup_error = None
+
+    def _get_or_build(self, name: str, factory):
+        """Retorna o componente `name`, construindo-o com `factory` na primeira vez."""
+        component = self._components.get(name)
+        if component is not None:
+            return component
+
+        with self._lock:
+            component = self._components.get(name)
+            if component is None:
+                logging.info(f"Construindo componente '{name}'...")
+                component = factory()
+                self._components[name] = component
+        return component
+
+    def override(self, **components):
+        """Substitui componentes já construídos (útil para testes e benchmarks)."""
+        with self._lock:
+            self._components.update(components)
+
+    @property
+    def llm_openai(self):
+        """
+        LLM da OpenAI para gerar o documento hipotético (HyDE), sobre o pool HTTP
+        compartilhado. Sem retries do SDK: o retry é feito em llm_clients.
+        """
+        return self._get_or_build(
+            "llm_openai",
+            lambda: ChatOpenAI(
+                model=config.HYDE_MODEL,
+                temperature=0,
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_BASE_URL,
+                request_timeout=config.HYDE_TIMEOUT_SECONDS,
+                max_retries=0,
+                http_client=http_client(UPSTREAM_OPENAI),
+                http_async_client=async_http_client(UPSTREAM_OPENAI),
+            )
+        )
+
+    @property
+    def llm_sabia(self):
+        """LLM Sabiá para a correção final."""
+        return self._get_or_build("llm_sabia", SabiáLLM)
+
+    @property
+    def embeddings(self):
+        """
+        Modelo de embeddings para a busca inicial, sobre o pool HTTP compartilhado.
+        As chamadas ficam dentro dos retrievers, então o retry aqui é o do próprio SDK.
+        """
+        return self._get_or_build(
+            "embeddings",
+            lambda: OpenAIEmbeddings(
+                model=config.EMBEDDING_MODEL,
+                api_key=config.OPENAI_API_KEY,
+                base_url=config.OPENAI_BASE_URL,
+                request_timeout=config.EMBEDDING_TIMEOUT_SECONDS,
+                check_embedding_ctx_length=config.EMBEDDING_CHECK_CTX_LENGTH,
+                max_retries=config.LLM_MAX_RETRIES,
+                http_client=http_client(UPSTREAM_OPENAI),
+                http_async_client=async_http_client(UPSTREAM_OPENAI),
+            )
+        )
+
+    @property
+    def vector_store(self):
+        """Conexão com o banco de dados vetorial."""
+        return self._get_or_build(
+            "vector_store",
+            lambda: Chroma(persist_directory=config.DB_PATH, embedding_function=self.embeddings)
+        )
+
+    @property
+    def numpy_index(self):
+        """Índice vetorial NumPy (memory-map), usado quando RETRIEVER_BACKEND = "numpy"."""
+        return self._get_or_build("numpy_index", lambda: NumpyVectorIndex(config.NUMPY_INDEX_PATH))
+
+    @property
+    def base_retriever(self):
+        """Retriever base para a busca inicial, conforme o backend configurado."""
+        return self._get_or_build("base_retriever", self._build_base_retriever)
+
+    def _build_base_retriever(self):
+        if config.RETRIEVER_BACKEND == "numpy":
+            return NumpyRetriever(index=self.numpy_index, embeddings=self.embeddings, k=config.RETRIEVER_K)
+        if config.RETRIEVER_BACKEND == "chroma":
+            return self.vector_store.as_retriever(search_kwargs={"k": config.RETRIEVER_K})
+        raise ValueError(f"RETRIEVER_BACKEND desconhecido: {config.RETRIEVER_BACKEND}")
+
+    @property
+    def bm25_retriever(self):
+        """
+        Retriever léxico BM25, ou None se desabilitado ou se o índice ainda não foi
+        construído (nesse caso o pipeline usa apenas a busca vetorial).
+        """
+        if not config.BM25_ENABLED:
+            return None
+        if "bm25_retriever" not in self._components and not os.path.exists(config.BM25_INDEX_PATH):
+            return None
+        return self._get_or_build(
+            "bm25_retriever",
+            lambda: BM25Retriever(
+                index=BM25Index.load(config.BM25_INDEX_PATH),
+                chunks=ChunkStore(config.CHUNKS_PATH),
+                k=config.BM25_K,
+            )
+        )
+
+    @property
+    def cross_encoder(self):
+        """
+        Cross-Encoder usado no re-ranking, conforme RERANKER_BACKEND. Na primeira
+        execução, o modelo será baixado (e, no backend "onnx-int8", exportado e quantizado).
+        """
+        return self._get_or_build("cross_encoder", self._build_cross_encoder)
+
+    def _build_cross_encoder(self):
+        if config.RERANKER_BACKEND == "onnx-int8":
+            return load_onnx_cross_encoder(
+                config.CROSS_ENCODER_MODEL, config.ONNX_CACHE_DIR, num_threads=config.RERANK_NUM_THREADS
+            )
+        if config.RERANKER_BACKEND == "torch":
+            return CrossEncoder(config.CROSS_ENCODER_MODEL)
+        raise ValueError(f"RERANKER_BACKEND desconhecido: {config.RERANKER_BACKEND}")
+
+    @property
+    def reranker(self):
+        """
+        Motor de re-ranking compartilhado. Com o micro-batching habilitado, agrupa os
+        pares de requisições concorrentes; caso contrário, é o próprio Cross-Encoder.
+        """
+        if not config.RERANK_BATCHING_ENABLED:
+            return self.cross_encoder
+        return self._get_or_build(
+            "reranker",
+            lambda: MicroBatchReranker(
+                self.cross_encoder,
+                max_batch_size=config.RERANK_MAX_BATCH_SIZE,
+                max_wait_ms=config.RERANK_MAX_WAIT_MS,
+                num_threads=config.RERANK_NUM_THREADS,
+            )
+        )
+
+    @property
+    def rerank_score_cache(self):
+        """Cache das pontuações do Cross-Encoder por (consulta, chunk_id)."""
+        return self._get_or_build(
+            "rerank_score_cache", lambda: RerankScoreCache(max_entries=config.RERANK_SCORE_CACHE_MAX_ENTRIES)
+        )
+
+    @property
+    def hyde_cache(self):
+        """Cache persistente dos documentos hipotéticos, ou None se desabilitado."""
+        if not config.HYDE_CACHE_ENABLED:
+            return None
+        return self._get_or_build(
+            "hyde_cache",
+            lambda: SQLiteCache(
+                config.HYDE_CACHE_PATH,
+                max_entries=config.HYDE_CACHE_MAX_ENTRIES,
+                ttl_seconds=config.HYDE_CACHE_TTL_SECONDS,
+            )
+        )
+
+    @property
+    def result_cache(self):
+        """Cache das correções finais (com detecção de quase duplicatas), ou None se desabilitado."""
+        if not config.RESULT_CACHE_ENABLED:
+            return None
+        return self._get_or_build(
+            "result_cache",
+            lambda: NearDuplicateResultCache(
+                threshold=config.RESULT_CACHE_THRESHOLD,
+                max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+                num_perm=config.RESULT_CACHE_NUM_PERM,
+                bands=config.RESULT_CACHE_BANDS,
+                shingle_size=config.RESULT_CACHE_SHINGLE_SIZE,
+            )
+        )
+
+    @property
+    def job_queue(self):
+        """Fila das correções em lote (iniciada no startup da API)."""
+        return self._get_or_build(
+            "job_queue",
+            lambda: JobQueue(
+                JobStore(config.JOBS_DB_PATH),
+                workers=config.JOB_WORKERS,
+                retention_seconds=config.JOB_RETENTION_SECONDS,
+                lease_seconds=config.JOB_LEASE_SECONDS,
+                poll_interval=config.JOB_POLL_INTERVAL_SECONDS,
+            )
+        )
+
+    @property
+    def admission(self):
+        """Controle de admissão das correções interativas (/correct/ e /correct/stream)."""
+        return self._get_or_build(
+            "admission",
+            lambda: AdmissionController(
+                max_in_flight=config.ADMISSION_MAX_IN_FLIGHT,
+                max_queue=config.ADMISSION_MAX_QUEUE,
+                max_wait_seconds=config.ADMISSION_MAX_WAIT_SECONDS,
+            )
+        )
+
+    @property
+    def file_extractor(self):
+        """Extração de texto dos arquivos enviados (POST /correct/file), em processos isolados."""
+        return self._get_or_build(
+            "file_extractor",
+            lambda: FileExtractor(
+                max_workers=config.FILE_EXTRACTION_WORKERS,
+                timeout=config.FILE_EXTRACTION_TIMEOUT_SECONDS,
+                max_pages=config.FILE_EXTRACTION_MAX_PAGES,
+                memory_mb=config.FILE_EXTRACTION_MEMORY_MB,
+            )
+        )
+
+    @property
+    def extraction_cache(self):
+        """Cache persistente do texto extraído, pelo hash do arquivo, ou None se desabilitado."""
+        if not config.EXTRACTION_CACHE_ENABLED:
+            return None
+        return self._get_or_build(
+            "extraction_cache",
+            lambda: SQLiteCache(config.EXTRACTION_CACHE_PATH, max_entries=config.EXTRACTION_CACHE_MAX_ENTRIES)
+        )
+
+    def stats(self) -> dict:
+        """Estatísticas dos componentes já construídos."""
+        stats = {"stages": concurrency.stats(), "llm_clients": llm_clients.stats()}
+        reranker = self._components.get("reranker")
+        if isinstance(reranker, MicroBatchReranker):
+            stats["reranker"] = reranker.stats()
+        rerank_score_cache = self._components.get("rerank_score_cache")
+        if rerank_score_cache is not None:
+            stats["rerank_cascade"] = rerank_score_cache.stats()
+        hyde_cache = self._components.get("hyde_cache")
+        if hyde_cache is not None:
+            stats["hyde_cache"] = hyde_cache.stats()
+        admission = self._components.get("admission")
+        if admission is not None:
+            stats["admission"] = admission.stats()
+        job_queue = self._components.get("job_queue")
+        if job_queue is not None:
+            stats["jobs"] = job_queue.stats()
+        result_cache = self._components.get("result_cache")
+        if result_cache is not None:
+            stats["result_cache"] = result_cache.stats()
+        file_extractor = self._components.get("file_extractor")
+        if file_extractor is not None:
+            stats["file_extraction"] = file_extractor.stats()
+        extraction_cache = self._components.get("extraction_cache")
+        if extraction_cache is not None:
+            stats["extraction_cache"] = extraction_cache.stats()
+        return stats
+
+    def shutdown(self):
+        """Encerra os processos próprios dos componentes (processos de extração), se já construídos."""
+        file_extractor = self._components.get("file_extractor")
+        if file_extractor is not None:
+            file_extractor.shutdown()
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    def warm_up(self):
+        """
+        Constrói todos os componentes e executa uma passada de re-ranking fictícia,
+        para que a primeira requisição real não pague o custo de carregamento.
+        """
+        logging.info("Aquecendo componentes do pipeline...")
+        try:
+            _ = self.llm_openai
+            _ = self.llm_sabia
+            _ = self.base_retriever
+            _ = self.bm25_retriever
+            _ = self.hyde_cache
+            self.reranker.predict([["aquecimento", "aquecimento do modelo de re-ranking"]])
+            count_tokens("aquecimento do tokenizer")
+        except Exception as e:
+            self.warmup_error = str(e)
+            logging.error(f"Erro ao aquecer componentes: {e}")
+            raise
+
+        self.warmup_error = None
+        self._ready.set()
+        logging.info("Componentes aquecidos e prontos.")
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ComponentRegistry:
+    """Retorna o registro de componentes compartilhado pelo processo."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ComponentRegistry()
+    return _registry
+
+
+def set_registry(registry: ComponentRegistry):
+    """Substitui o registro compartilhado (útil para testes e benchmarks)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
@@ -0,0 +1,68 @@
+"""
+Limites de concorrência por etapa do pipeline (HyDE, embeddings, re-ranking e geração).
+
+Todas as requisições do processo, interativas ou em lote, disputam os mesmos
+semáforos. Cada etapa tem o seu: uma rajada de geração (Maritaca) não ocupa as
+vagas do HyDE, e a inferência do Cross-Encoder não passa do que a CPU comporta.
+Assim a fila de jobs pode saturar cada etapa sem ultrapassar seus limites.
+"""
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+
+import config
+
+STAGE_HYDE = "hyde"
+STAGE_EMBEDDING = "embedding"
+STAGE_RERANK = "rerank"
+STAGE_GENERATION = "generation"
+
+
+def _limits() -> dict:
+    return {
+        STAGE_HYDE: config.HYDE_MAX_CONCURRENCY,
+        STAGE_EMBEDDING: config.EMBEDDING_MAX_CONCURRENCY,
+        STAGE_RERANK: config.RERANK_MAX_CONCURRENCY,
+        STAGE_GENERATION: config.GENERATION_MAX_CONCURRENCY,
+    }
+
+
+# Semáforos por event loop (o pipeline também roda no loop dedicado das chamadas síncronas)
+_semaphores = weakref.WeakKeyDictionary()
+_waiting = {}
+_in_use = {}
+
+
+def _semaphore(stage: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    per_loop = _semaphores.setdefault(loop, {})
+    semaphore = per_loop.get(stage)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, _limits()[stage]))
+        per_loop[stage] = semaphore
+    return semaphore
+
+
+@asynccontextmanager
+async def stage_slot(stage: str):
+    """Ocupa uma vaga de `stage` durante o bloco, aguardando se o limite foi atingido."""
+    semaphore = _semaphore(stage)
+    _waiting[stage] = _waiting.get(stage, 0) + 1
+    try:
+        await semaphore.acquire()
+    finally:
+        _waiting[stage] -= 1
+    _in_use[stage] = _in_use.get(stage, 0) + 1
+    try:
+        yield
+    finally:
+        _in_use[stage] -= 1
+        semaphore.release()
+
+
+def stats() -> dict:
+    """Limite, vagas em uso e chamadas aguardando, por etapa."""
+    return {
+        stage: {"limit": limit, "in_use": _in_use.get(stage, 0), "waiting": _waiting.get(stage, 0)}
+        for stage, limit in _limits().items()
+    }
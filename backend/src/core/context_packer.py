@@ -0,0 +1,141 @@
+"""
+Montagem do contexto do prompt de correção a partir dos documentos reordenados.
+
+Chunks repetidos são descartados, chunks vizinhos do mesmo arquivo (chunk_index
+consecutivos) são unidos e o trecho repetido pelo `chunk_overlap` do splitter é
+removido. Os blocos resultantes entram no contexto em ordem de relevância até o
+orçamento de tokens.
+"""
+import logging
+from functools import lru_cache
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Menor sobreposição considerada ao unir chunks vizinhos (evita coincidências curtas)
+_MIN_OVERLAP_CHARS = 20
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """Tokenizer do tiktoken, ou None se indisponível (ex.: sem acesso aos arquivos BPE)."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken indisponível ({e}); contagem de tokens aproximada por caracteres.")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Número de tokens do texto (tiktoken) ou, na falta dele, aproximação de 4 caracteres por token."""
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Corta o texto para caber em `max_tokens`."""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _strip_overlap(previous: str, following: str) -> str:
+    """Remove do início de `following` o maior trecho que repete o final de `previous`."""
+    probe = following[:_MIN_OVERLAP_CHARS]
+    if len(probe) < _MIN_OVERLAP_CHARS:
+        return following
+
+    position = previous.find(probe)
+    while position != -1:
+        overlap = len(previous) - position
+        if following.startswith(previous[position:]):
+            return following[overlap:]
+        position = previous.find(probe, position + 1)
+    return following
+
+
+def merge_adjacent_chunks(documents: list) -> list:
+    """
+    Une chunks com o mesmo `filename` e `chunk_index` consecutivos, removendo a
+    sobreposição; chunks repetidos (mesmo arquivo e índice, ou mesmo texto) entram
+    uma vez só, na melhor posição. Retorna blocos {"text", "rank", "chunks", "filename"},
+    em que `rank` é a melhor posição (na lista de entrada) entre os chunks do bloco.
+    """
+    by_file = {}
+    blocks = []
+    seen = set()
+    for rank, doc in enumerate(documents):
+        filename = doc.metadata.get("filename") or doc.metadata.get("source")
+        chunk_index = doc.metadata.get("chunk_index")
+        key = (filename, int(chunk_index)) if filename is not None and chunk_index is not None else doc.page_content
+        if key in seen:
+            continue
+        seen.add(key)
+        if filename is None or chunk_index is None:
+            blocks.append({"text": doc.page_content, "rank": rank, "chunks": 1, "filename": filename})
+        else:
+            by_file.setdefault(filename, []).append((int(chunk_index), rank, doc.page_content))
+
+    for filename, chunks in by_file.items():
+        chunks.sort()
+        current = None
+        for chunk_index, rank, text in chunks:
+            if current is not None and chunk_index == current["last_index"] + 1:
+                current["text"] += _strip_overlap(current["text"], text)
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+                current["last_index"] = chunk_index
+                continue
+            current = {"text": text, "rank": rank, "chunks": 1, "filename": filename, "last_index": chunk_index}
+            blocks.append(current)
+
+    for block in blocks:
+        block.pop("last_index", None)
+    blocks.sort(key=lambda block: block["rank"])
+    return blocks
+
+
+def pack_context(documents: list, token_budget: int, separator: str = CONTEXT_SEPARATOR):
+    """
+    Monta o contexto com os blocos em ordem de relevância até `token_budget` tokens.
+    Um bloco que não cabe inteiro é truncado no espaço restante e encerra o contexto.
+    Retorna (contexto, estatísticas): `chars_saved` conta os caracteres removidos na
+    união dos vizinhos e no descarte de repetidos; `chars_truncated`, os que ficaram
+    de fora pelo orçamento de tokens.
+    """
+    blocks = merge_adjacent_chunks(documents)
+    separator_tokens = count_tokens(separator)
+
+    parts, used = [], 0
+    truncated = 0
+    for block in blocks:
+        cost = count_tokens(block["text"]) + (separator_tokens if parts else 0)
+        if used + cost <= token_budget:
+            parts.append(block["text"])
+            used += cost
+            continue
+
+        remaining = token_budget - used - (separator_tokens if parts else 0)
+        if remaining > 0:
+            parts.append(truncate_to_tokens(block["text"], remaining))
+            used += count_tokens(parts[-1]) + (separator_tokens if len(parts) > 1 else 0)
+            truncated = 1
+        break
+
+    context = separator.join(parts)
+    raw_chars = sum(len(doc.page_content) for doc in documents) + len(separator) * max(0, len(documents) - 1)
+    merged_chars = sum(len(block["text"]) for block in blocks) + len(separator) * max(0, len(blocks) - 1)
+    stats = {
+        "chunks": len(documents),
+        "blocks": len(blocks),
+        "blocks_used": len(parts),
+        "truncated": truncated,
+        "chars_saved": max(0, raw_chars - merged_chars),
+        "chars_truncated": max(0, merged_chars - len(context)),
+        "context_tokens": used,
+        "token_budget": token_budget,
+    }
+    return context, stats
@@ -1,84 +1,40 @@
+import asyncio
 import logging
+import threading
 import config
 
 # Importações dos outros módulos do projeto
-from .llm_integration import SabiáLLM
-from .rag_advanced import generate_hypothetical_document, rerank_with_cross_encoder
+from .components import get_registry
+from .rag_advanced import agenerate_hypothetical_document, arerank_with_cross_encoder
+from .result_cache import CACHE_MISS
+from .competency_generation import UNAVAILABLE_SECTION, agenerate_by_competency
+from .concurrency import STAGE_EMBEDDING, STAGE_GENERATION, STAGE_HYDE, STAGE_RERANK, stage_slot
+from .errors import ConfigurationError, CorrectionError, GenerationError, NoReferenceDocumentsError
+from .metrics import record_cache, record_error
+from .tracing import stage
+from .context_packer import count_tokens, pack_context
+from .retrieval import aretrieve_branch, essay_section_queries, merge_branches
 
 # Importações do LangChain ATUALIZADAS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_chroma import Chroma
 from langchain.prompts import PromptTemplate
-from langchain.schema.runnable import RunnableSequence
 
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def initialize_components():
-    """Inicializa e retorna todos os componentes necessários para o pipeline."""
-    logging.info("Inicializando componentes...")
-    
-    try:
-        # LLM da OpenAI para gerar o documento hipotético (HyDE)
-        llm_openai = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, api_key=config.OPENAI_API_KEY)
-        
-        # LLM Sabiá para a correção final
-        llm_sabia = SabiáLLM()
-        
-        # Modelo de embeddings para a busca inicial
-        embeddings = OpenAIEmbeddings(api_key=config.OPENAI_API_KEY)
-        
-        # Conexão com o banco de dados vetorial
-        vector_store = Chroma(persist_directory=config.DB_PATH, embedding_function=embeddings)
-        
-        # Retriever base para a busca inicial
-        base_retriever = vector_store.as_retriever(search_kwargs={"k": 20})
-        
-        logging.info("Componentes inicializados com sucesso.")
-        return llm_openai, llm_sabia, base_retriever
-        
-    except Exception as e:
-        logging.error(f"Erro ao inicializar componentes: {e}")
-        raise
-
-def correct_essay_pipeline(essay_text: str):
     """
-    Executa o pipeline completo de correção de redação com RAG, HyDE e Re-ranking.
+    Retorna os componentes necessários para o pipeline.
+    Os componentes vêm do registro do processo e são construídos apenas uma vez.
     """
     try:
-        # Verifica se as chaves de API estão configuradas
-        if not all([config.OPENAI_API_KEY, config.MARITACA_API_KEY]):
-            error_msg = "Chaves de API (OpenAI, Maritaca) não foram encontradas. Verifique seus arquivos .env e config.py."
-            logging.error(error_msg)
-            return error_msg
+        registry = get_registry()
+        return registry.llm_openai, registry.llm_sabia, registry.base_retriever
 
-        # 1. Inicializa os componentes
-        llm_openai, llm_sabia, base_retriever = initialize_components()
+    except Exception as e:
+        logging.error(f"Erro ao inicializar componentes: {e}")
+        raise
 
-        # 2. Passo HyDE: Gera um documento hipotético para usar como query de busca
-        hypothetical_doc = generate_hypothetical_document(essay_text, llm_openai)
-        
-        # 3. Passo Retrieve: Faz a busca vetorial inicial
-        logging.info("Buscando documentos iniciais no banco vetorial...")
-        initial_docs = base_retriever.invoke(hypothetical_doc)
-        
-        # Verifica se foram encontrados documentos
-        if not initial_docs:
-            logging.warning("Nenhum documento foi encontrado na busca inicial. Verifique se o banco de dados está populado.")
-            return "Erro: Nenhum documento de referência foi encontrado. Verifique se o banco de dados está configurado corretamente."
-        
-        # 4. Passo Re-rank: Usa o Cross-Encoder para reordenar os resultados
-        relevant_docs = rerank_with_cross_encoder(query=hypothetical_doc, documents=initial_docs)
-        
-        # Verifica se há documentos após o re-ranking
-        if not relevant_docs:
-            logging.warning("Nenhum documento relevante após re-ranking.")
-            return "Erro: Não foi possível encontrar documentos relevantes para análise."
-          # Concatena o conteúdo dos documentos relevantes para o contexto
-        context = "\n\n---\n\n".join([doc.page_content for doc in relevant_docs])
-
-        # 5. Passo Generate: Usa o Sabiá para gerar a correção final com o contexto
-        correction_template = """
+CORRECTION_TEMPLATE = """
         Você é um corretor de redações do ENEM extremamente competente. Sua tarefa é fornecer uma análise detalhada e construtiva da redação a seguir, baseando-se nos materiais de referência fornecidos.
 
         **Instruções:**
@@ -99,22 +55,347 @@ def correct_essay_pipeline(essay_text: str):
 
         **Análise Detalhada e Correção:**
         """
-        
-        correction_prompt = PromptTemplate(
-            input_variables=["contexto", "redacao"], 
-            template=correction_template
+
+correction_prompt = PromptTemplate(
+    input_variables=["contexto", "redacao"],
+    template=CORRECTION_TEMPLATE
+)
+
+# Event loop dedicado às chamadas síncronas do pipeline (ex.: execução via __main__).
+# Um único loop de vida longa mantém os clientes HTTP assíncronos presos a ele.
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+
+def _run_sync(coro):
+    """Executa uma corrotina no loop dedicado e bloqueia até o resultado."""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="pipeline-sync-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _sync_loop).result()
+
+
+PIPELINE_MODES = ("full", "fast")
+
+
+def correct_essay_pipeline(essay_text: str, mode: str = None):
+    """
+    Executa o pipeline completo de correção de redação com RAG, HyDE e Re-ranking.
+    Versão bloqueante de `acorrect_essay_pipeline`, para uso fora de um event loop.
+    """
+    return _run_sync(acorrect_essay_pipeline(essay_text, mode))
+
+
+def _resolve_mode(mode: str = None) -> str:
+    """Modo efetivo do pipeline: o pedido ou, na falta dele, config.PIPELINE_MODE."""
+    mode = mode or config.PIPELINE_MODE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Modo de pipeline desconhecido: {mode}")
+    return mode
+
+
+def _select_retrievers(mode: str, base_retriever) -> list:
+    """
+    Retrievers consultados em cada modo. No modo "full", a busca vetorial (com o
+    documento HyDE) é combinada ao BM25; no modo "fast", o BM25 com o texto da
+    redação é a busca principal e o embedding da redação é opcional.
+    """
+    bm25_retriever = get_registry().bm25_retriever
+    if mode == "fast":
+        retrievers = [bm25_retriever] if bm25_retriever is not None else []
+        if config.FAST_MODE_USE_EMBEDDING or not retrievers:
+            retrievers.append(base_retriever)
+        return retrievers
+    return [base_retriever] + ([bm25_retriever] if bm25_retriever is not None else [])
+
+
+async def _aprepare_context(essay_text: str, llm_openai, base_retriever, mode: str = "full"):
+    """
+    Executa as etapas anteriores à geração (HyDE, busca e re-ranking).
+    Gera tuplas (evento, dados) à medida que cada etapa termina; a última é
+    ("context", {"text": contexto, "documents": documentos reordenados}). Sem
+    documentos de referência, levanta NoReferenceDocumentsError. No modo "fast" o
+    HyDE é pulado e a própria redação é usada como consulta. Com GENERATION_MODE =
+    "competency", o contexto é montado por ramo na geração: não há evento "packed"
+    e o texto do contexto é None.
+
+    A busca usa várias consultas em paralelo: o documento HyDE, a redação (iniciada
+    enquanto o HyDE ainda é gerado) e, opcionalmente, cada seção da redação. Os
+    candidatos são fundidos sem duplicatas antes do re-ranking.
+    """
+    retrievers = _select_retrievers(mode, base_retriever)
+    logging.info(f"Buscando documentos iniciais (modo {mode}, {len(retrievers)} retriever(s))...")
+
+    # 3. Passo Retrieve: as buscas com a redação (e, opcionalmente, com cada seção)
+    # começam imediatamente, em paralelo com o HyDE
+    branches = {"redacao": essay_text}
+    if config.MULTI_QUERY_PARAGRAPHS:
+        branches.update(essay_section_queries(essay_text))
+    if mode != "fast" and not config.MULTI_QUERY_ENABLED:
+        branches = {}
+    uses_embeddings = base_retriever in retrievers
+
+    async def retrieve(name: str, branch_query: str):
+        # Ramos com busca vetorial chamam a API de embeddings: respeitam o limite dessa etapa
+        if not uses_embeddings:
+            return await aretrieve_branch(name, branch_query, retrievers, config.RRF_K)
+        async with stage_slot(STAGE_EMBEDDING):
+            return await aretrieve_branch(name, branch_query, retrievers, config.RRF_K)
+
+    tasks = [asyncio.create_task(retrieve(name, branch_query)) for name, branch_query in branches.items()]
+
+    try:
+        if mode == "fast":
+            query = essay_text
+        else:
+            # 2. Passo HyDE: Gera um documento hipotético para usar como query de busca
+            with stage("hyde"):
+                async with stage_slot(STAGE_HYDE):
+                    query = await agenerate_hypothetical_document(essay_text, llm_openai, cache=get_registry().hyde_cache)
+            yield "hyde", {"chars": len(query)}
+            tasks.insert(0, asyncio.create_task(retrieve("hyde", query)))
+
+        # A latência da busca é a do ramo mais lento, não a soma dos ramos
+        with stage("retrieval"):
+            branch_results = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    initial_docs = merge_branches(branch_results, limit=config.MULTI_QUERY_MAX_CANDIDATES, rrf_k=config.RRF_K)
+
+    # Verifica se foram encontrados documentos
+    if not initial_docs:
+        logging.warning("Nenhum documento foi encontrado na busca inicial. Verifique se o banco de dados está populado.")
+        raise NoReferenceDocumentsError(
+            "Nenhum documento de referência foi encontrado. Verifique se o banco de dados está configurado corretamente."
         )
-        
-        # Usando RunnableSequence em vez de LLMChain deprecado
-        final_chain = correction_prompt | llm_sabia
-        
-        logging.info("Gerando a correção final com o LLM Sabiá...")
-        final_correction = final_chain.invoke({"contexto": context, "redacao": essay_text})        
-        return final_correction
-        
+    yield "retrieved", {"documents": len(initial_docs), "queries": len(branch_results)}
+
+    # 4. Passo Re-rank: Usa o Cross-Encoder para reordenar os resultados
+    with stage("rerank"):
+        async with stage_slot(STAGE_RERANK):
+            relevant_docs = await arerank_with_cross_encoder(query=query, documents=initial_docs)
+
+    # Verifica se há documentos após o re-ranking
+    if not relevant_docs:
+        logging.warning("Nenhum documento relevante após re-ranking.")
+        raise NoReferenceDocumentsError("Não foi possível encontrar documentos relevantes para análise.")
+    yield "reranked", {
+        "documents": len(relevant_docs),
+        "sources": [doc.metadata.get("filename") for doc in relevant_docs],
+    }
+
+    if config.GENERATION_MODE == "competency":
+        # Cada ramo monta a sua fatia do contexto (COMPETENCY_CONTEXT_TOKEN_BUDGET); o prompt único não é usado
+        yield "context", {"text": None, "documents": relevant_docs}
+        return
+
+    # 5. Monta o contexto: une chunks vizinhos e respeita o orçamento de tokens do prompt
+    with stage("packing"):
+        context, packing = await asyncio.to_thread(_pack_context, essay_text, relevant_docs)
+    yield "packed", {
+        "context_tokens": packing["context_tokens"],
+        "prompt_tokens": packing["prompt_tokens"],
+        "blocks": packing["blocks_used"],
+    }
+    yield "context", {"text": context, "documents": relevant_docs}
+
+
+def _pack_context(essay_text: str, relevant_docs: list):
+    """
+    Monta o contexto dentro do orçamento: o menor entre CONTEXT_TOKEN_BUDGET e o que
+    resta de PROMPT_TOKEN_LIMIT depois do template e da redação. Registra os tokens do prompt.
+    """
+    base_tokens = count_tokens(correction_prompt.format(contexto="", redacao=essay_text))
+    budget = min(config.CONTEXT_TOKEN_BUDGET, config.PROMPT_TOKEN_LIMIT - base_tokens)
+    if budget <= 0:
+        logging.warning(f"Redação longa ({base_tokens} tokens no prompt): sem espaço para materiais de referência.")
+        budget = 0
+
+    context, packing = pack_context(relevant_docs, budget)
+    packing["prompt_tokens"] = base_tokens + packing["context_tokens"]
+    logging.info(
+        f"Contexto: {packing['context_tokens']} tokens em {packing['blocks_used']} bloco(s) de {packing['chunks']} chunk(s) "
+        f"({packing['chars_saved']} caracteres repetidos removidos, {packing['chars_truncated']} cortados pelo orçamento); "
+        f"prompt: {packing['prompt_tokens']} tokens."
+    )
+    return context, packing
+
+
+def _agenerate_by_competency(essay_text: str, documents: list, llm_sabia):
+    """Geração por competência (GENERATION_MODE = "competency") com os parâmetros de config."""
+    logging.info("Gerando a correção por competência com o LLM Sabiá (5 chamadas em paralelo)...")
+    return agenerate_by_competency(
+        essay_text,
+        documents,
+        llm_sabia,
+        timeout=config.COMPETENCY_TIMEOUT_SECONDS,
+        max_tokens=config.COMPETENCY_MAX_TOKENS,
+        merge_max_tokens=config.COMPETENCY_MERGE_MAX_TOKENS,
+        context_token_budget=config.COMPETENCY_CONTEXT_TOKEN_BUDGET,
+    )
+
+
+def _check_api_keys():
+    """Levanta ConfigurationError se as chaves de API não estiverem configuradas."""
+    if not all([config.OPENAI_API_KEY, config.MARITACA_API_KEY]):
+        error_msg = "Chaves de API (OpenAI, Maritaca) não foram encontradas. Verifique seus arquivos .env e config.py."
+        logging.error(error_msg)
+        raise ConfigurationError(error_msg)
+
+
+def _check_generated(correction: str) -> str:
+    """Garante que o LLM devolveu uma correção não vazia."""
+    if not correction or not correction.strip():
+        raise GenerationError("O LLM retornou uma correção vazia.")
+    return correction
+
+
+async def acorrect_essay_pipeline(essay_text: str, mode: str = None):
+    """
+    Executa o pipeline completo de correção de redação com RAG, HyDE e Re-ranking,
+    sem bloquear o event loop: as chamadas de rede usam `ainvoke` e a inferência
+    do Cross-Encoder roda fora do loop. `mode` é "full" ou "fast" (padrão: config.PIPELINE_MODE).
+    Falhas levantam CorrectionError (ou uma subclasse, com o status HTTP correspondente).
+    """
+    try:
+        mode = _resolve_mode(mode)
+
+        # Verifica se as chaves de API estão configuradas
+        _check_api_keys()
+
+        # 1. Obtém os componentes compartilhados
+        llm_openai, llm_sabia, base_retriever = initialize_components()
+
+        context = None
+        async for event, data in _aprepare_context(essay_text, llm_openai, base_retriever, mode):
+            if event == "context":
+                context = data
+
+        # 6. Passo Generate: Usa o Sabiá para gerar a correção final com o contexto
+        with stage("generation"):
+            if config.GENERATION_MODE == "competency":
+                async for event, data in _agenerate_by_competency(essay_text, context["documents"], llm_sabia):
+                    if event == "result":
+                        return data
+
+            final_chain = correction_prompt | llm_sabia
+
+            logging.info("Gerando a correção final com o LLM Sabiá...")
+            async with stage_slot(STAGE_GENERATION):
+                final_correction = await final_chain.ainvoke({"contexto": context["text"], "redacao": essay_text})
+            return _check_generated(final_correction)
+
+    except CorrectionError as e:
+        logging.error(f"Erro no pipeline de correção: {e}")
+        record_error(e)
+        raise
     except Exception as e:
         logging.error(f"Erro no pipeline de correção: {e}")
-        return f"Erro interno: {str(e)}. Verifique os logs para mais detalhes."
+        record_error(e)
+        raise CorrectionError(f"Erro interno: {str(e)}. Verifique os logs para mais detalhes.") from e
+
+
+def lookup_cached_correction(essay_text: str):
+    """
+    Procura no cache uma correção já gerada para esta redação (ou uma quase idêntica).
+    Retorna (correção, status), com status "exact", "near" ou "miss".
+    """
+    result_cache = get_registry().result_cache
+    if result_cache is None:
+        return None, CACHE_MISS
+    correction, status = result_cache.lookup(essay_text)
+    record_cache("result", status)
+    return correction, status
+
+
+def is_partial_correction(correction: str) -> bool:
+    """Correção em que algum ramo por competência falhou (a seção traz UNAVAILABLE_SECTION)."""
+    return UNAVAILABLE_SECTION in correction
+
+
+def store_correction(essay_text: str, correction: str, mode: str = None):
+    """
+    Armazena no cache uma correção gerada com sucesso. Apenas correções do modo
+    "full" são armazenadas, para que uma correção do modo "fast" nunca seja
+    servida a quem pediu o pipeline completo.
+    """
+    result_cache = get_registry().result_cache
+    if result_cache is None or not correction:
+        return
+    if is_partial_correction(correction):
+        # Correção parcial (algum ramo por competência falhou): não é reaproveitada
+        return
+    if _resolve_mode(mode) != "full":
+        return
+    result_cache.store(essay_text, correction)
+
+
+async def acorrect_essay_with_cache(essay_text: str, mode: str = None):
+    """
+    Executa o pipeline apenas se não houver correção em cache para uma redação
+    idêntica ou quase idêntica. Retorna (correção, status do cache); falhas
+    levantam CorrectionError, como em `acorrect_essay_pipeline`.
+    """
+    cached, cache_status = lookup_cached_correction(essay_text)
+    if cached is not None:
+        return cached, cache_status
+
+    correction = await acorrect_essay_pipeline(essay_text, mode)
+    store_correction(essay_text, correction, mode)
+    return correction, CACHE_MISS
+
+
+async def astream_correction(essay_text: str, mode: str = None):
+    """
+    Executa o pipeline emitindo eventos de progresso e a correção token a token.
+    Gera tuplas (evento, dados): "hyde", "retrieved" e "reranked" ao fim de cada
+    etapa, "packed" com os tokens do prompt, "token" para cada trecho gerado pelo
+    Sabiá e, por fim, "done" ou "error" ({"detail": mensagem, "status": status HTTP}).
+    No modo "fast" não há evento "hyde". Com GENERATION_MODE = "competency", não há
+    "packed", há um evento "competency" por ramo concluído e a correção vem em um único "token".
+    """
+    try:
+        mode = _resolve_mode(mode)
+        _check_api_keys()
+
+        llm_openai, llm_sabia, base_retriever = initialize_components()
+
+        context = None
+        async for event, data in _aprepare_context(essay_text, llm_openai, base_retriever, mode):
+            if event == "context":
+                context = data
+            else:
+                yield event, data
+
+        with stage("generation"):
+            if config.GENERATION_MODE == "competency":
+                # As seções só ficam prontas ao fim de cada ramo: envia o progresso e o texto final
+                async for event, data in _agenerate_by_competency(essay_text, context["documents"], llm_sabia):
+                    if event == "result":
+                        yield "token", {"text": data}
+                    else:
+                        yield event, data
+            else:
+                final_chain = correction_prompt | llm_sabia
+
+                logging.info("Gerando a correção final com o LLM Sabiá (streaming)...")
+                async with stage_slot(STAGE_GENERATION):
+                    async for token in final_chain.astream({"contexto": context["text"], "redacao": essay_text}):
+                        yield "token", {"text": token}
+        yield "done", {}
+
+    except CorrectionError as e:
+        logging.error(f"Erro no pipeline de correção (streaming): {e}")
+        record_error(e)
+        yield "error", {"detail": str(e), "status": e.status_code}
+    except Exception as e:
+        logging.error(f"Erro no pipeline de correção (streaming): {e}")
+        record_error(e)
+        yield "error", {"detail": f"Erro interno: {str(e)}. Verifique os logs para mais detalhes.", "status": 500}
 
 
 if __name__ == '__main__':
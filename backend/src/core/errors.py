@@ -0,0 +1,99 @@
+"""
+Exceções do pipeline de correção.
+
+Cada exceção traz o status HTTP com que a API deve responder; assim os chamadores
+(API, fila de jobs, scripts) tratam falhas pelo tipo, e não procurando "Erro" no texto.
+"""
+import math
+
+
+class CorrectionError(Exception):
+    """Falha ao corrigir uma redação."""
+
+    status_code = 500
+
+
+class ConfigurationError(CorrectionError):
+    """Configuração ausente ou inválida (ex.: chaves de API)."""
+
+    status_code = 500
+
+
+class NoReferenceDocumentsError(CorrectionError):
+    """A busca ou o re-ranking não encontrou materiais de referência."""
+
+    status_code = 500
+
+
+class UpstreamError(CorrectionError):
+    """Erro de um serviço externo (OpenAI, Maritaca)."""
+
+    status_code = 502
+
+    def __init__(self, upstream: str, message: str, retryable: bool = False):
+        super().__init__(f"Erro na chamada da API ({upstream}): {message}")
+        self.upstream = upstream
+        self.retryable = retryable
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """O serviço externo não respondeu dentro do tempo limite."""
+
+    status_code = 504
+
+    def __init__(self, upstream: str, timeout: float):
+        CorrectionError.__init__(self, f"A API ({upstream}) não respondeu em {timeout:g}s.")
+        self.upstream = upstream
+        self.retryable = True
+
+
+class CircuitOpenError(UpstreamError):
+    """O circuito do serviço está aberto: falhas recentes demais, a chamada nem é feita."""
+
+    status_code = 503
+
+    def __init__(self, upstream: str, retry_after: float):
+        CorrectionError.__init__(self, f"A API ({upstream}) está indisponível no momento. Tente novamente em {math.ceil(retry_after)}s.")
+        self.upstream = upstream
+        self.retryable = False
+        self.retry_after = retry_after
+
+
+class GenerationError(CorrectionError):
+    """O LLM não produziu uma correção utilizável."""
+
+    status_code = 502
+
+
+class OverloadedError(CorrectionError):
+    """O servidor está no limite de correções simultâneas e a espera na fila seria longa demais."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(OverloadedError):
+    """A fila de espera por uma vaga de correção está cheia."""
+
+    status_code = 429
+
+
+class FileExtractionError(CorrectionError):
+    """Não foi possível extrair o texto do arquivo enviado (corrompido, protegido ou sem texto)."""
+
+    status_code = 422
+
+
+class UnsupportedFileTypeError(FileExtractionError):
+    """O arquivo enviado não é PDF, DOCX nem texto."""
+
+    status_code = 415
+
+
+class FileTooLargeError(FileExtractionError):
+    """O arquivo enviado passa de UPLOAD_MAX_BYTES."""
+
+    status_code = 413
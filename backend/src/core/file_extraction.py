@@ -0,0 +1,244 @@
+"""
+Extração do texto das redações enviadas como arquivo (PDF, DOCX ou TXT).
+
+A extração de PDF (pdfminer.six) e DOCX (python-docx) é CPU-bound e, com arquivos
+malformados, pode demorar ou consumir muita memória. Por isso cada arquivo é
+extraído em um processo próprio (no máximo `max_workers` ao mesmo tempo), com tempo
+limite e, onde o sistema permite, limite de memória: um arquivo problemático não
+trava o event loop da API e, ao estourar o tempo, só o processo dele é encerrado,
+sem afetar as extrações de outros usuários em andamento.
+
+O texto extraído é guardado em cache pelo hash (SHA-256) do conteúdo, de modo que
+reenvios do mesmo arquivo não passam pela extração.
+"""
+import io
+import re
+import asyncio
+import hashlib
+import logging
+import unicodedata
+import multiprocessing
+
+from .errors import FileExtractionError, FileTooLargeError, UnsupportedFileTypeError
+from .metrics import record_cache
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Versão do extrator na chave do cache: mudanças na extração invalidam o texto já guardado
+EXTRACTOR_VERSION = "1"
+
+READ_CHUNK_BYTES = 64 * 1024
+
+PDF = "pdf"
+DOCX = "docx"
+TXT = "txt"
+
+
+def detect_file_type(filename: str, head: bytes) -> str:
+    """
+    Tipo do arquivo pelo conteúdo (assinatura) e, para texto, pela extensão. O tipo
+    informado pelo navegador não é confiável (ex.: DOCX enviado como octet-stream).
+    """
+    extension = (filename or "").lower().rsplit(".", 1)[-1] if "." in (filename or "") else ""
+    if head.startswith(b"%PDF"):
+        return PDF
+    if head.startswith(b"PK\x03\x04") and extension in ("docx", ""):
+        return DOCX
+    if extension in ("txt", "md", ""):
+        return TXT
+    raise UnsupportedFileTypeError("Formato de arquivo não suportado. Envie um arquivo .pdf, .docx ou .txt.")
+
+
+def clean_extracted_text(text: str) -> str:
+    """Normaliza o texto extraído (Unicode NFC, espaços) preservando os parágrafos."""
+    text = unicodedata.normalize("NFC", text).replace("\x00", "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\f", "\n")
+    lines = [re.sub(r"[ \t\u00a0]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _decode_text(data: bytes) -> str:
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def _extract_pdf(data: bytes, max_pages: int) -> str:
+    from pdfminer.high_level import extract_text
+    return extract_text(io.BytesIO(data), maxpages=max_pages)
+
+
+def _extract_docx(data: bytes) -> str:
+    from docx import Document
+    return "\n".join(paragraph.text for paragraph in Document(io.BytesIO(data)).paragraphs)
+
+
+def extract_text(file_type: str, data: bytes, max_pages: int = 20) -> str:
+    """Extrai o texto do conteúdo do arquivo. Roda no processo de extração."""
+    if file_type == PDF:
+        text = _extract_pdf(data, max_pages)
+    elif file_type == DOCX:
+        text = _extract_docx(data)
+    else:
+        text = _decode_text(data)
+    return clean_extracted_text(text)
+
+
+def _limit_worker_memory(memory_mb: int):
+    """Limita a memória virtual do processo de extração (só em sistemas POSIX)."""
+    if not memory_mb:
+        return
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        logging.warning(f"Não foi possível limitar a memória do processo de extração: {e}")
+
+
+def _extraction_process(conn, file_type: str, data: bytes, max_pages: int, memory_mb: int):
+    """Alvo do processo de extração: envia ("ok", texto) ou ("error", mensagem) pelo pipe."""
+    try:
+        _limit_worker_memory(memory_mb)
+        conn.send(("ok", extract_text(file_type, data, max_pages)))
+    except BaseException as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def _mp_context():
+    # O processo da API tem threads (event loop, re-ranking), que o fork não copia com segurança:
+    # "forkserver" cria os processos a partir de um servidor limpo e aquecido; sem ele, "spawn"
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class FileExtractor:
+    """Extração em processos isolados (um por arquivo), com tempo limite por arquivo."""
+
+    def __init__(self, max_workers: int = 2, timeout: float = 20.0, max_pages: int = 20, memory_mb: int = 0):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.max_pages = max_pages
+        self.memory_mb = memory_mb
+        self._context = _mp_context()
+        self._slots = None
+        self._processes = set()
+        self.extracted = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _run(self, file_type: str, data: bytes) -> tuple:
+        """
+        Extrai em um processo novo e espera o resultado por até `timeout` segundos.
+        Roda em uma thread; ao estourar o tempo, encerra só este processo.
+        """
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_extraction_process, args=(sender, file_type, data, self.max_pages, self.memory_mb), daemon=True
+        )
+        process.start()
+        sender.close()
+        self._processes.add(process)
+        try:
+            if not receiver.poll(self.timeout):
+                process.terminate()
+                return "timeout", None
+            try:
+                return receiver.recv()
+            except EOFError:
+                # Processo encerrado sem resposta (ex.: limite de memória)
+                return "crashed", None
+        finally:
+            receiver.close()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            self._processes.discard(process)
+
+    async def extract(self, file_type: str, data: bytes) -> str:
+        """Texto do arquivo; levanta FileExtractionError se a extração falhar ou passar do tempo limite."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            status, value = await asyncio.to_thread(self._run, file_type, data)
+
+        if status == "timeout":
+            self.timeouts += 1
+            logging.warning(f"Extração de {file_type.upper()} passou de {self.timeout:g}s; processo de extração encerrado.")
+            raise FileExtractionError(f"A extração do texto do arquivo passou do tempo limite ({self.timeout:g}s).")
+        if status == "crashed":
+            self.failures += 1
+            raise FileExtractionError("Não foi possível extrair o texto do arquivo (processo de extração interrompido).")
+        if status == "error":
+            self.failures += 1
+            logging.warning(f"Falha ao extrair o texto de um arquivo {file_type.upper()}: {value}")
+            raise FileExtractionError(f"Não foi possível extrair o texto do arquivo {file_type.upper()}. Verifique se ele não está corrompido ou protegido.")
+        self.extracted += 1
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "active": len(self._processes),
+            "extracted": self.extracted,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+    def shutdown(self):
+        for process in list(self._processes):
+            process.terminate()
+
+
+async def read_upload(upload, max_bytes: int):
+    """
+    Lê o arquivo enviado (UploadFile, já em um arquivo temporário "spooled") em blocos,
+    calculando o SHA-256 e interrompendo a leitura assim que passar de `max_bytes`.
+    Retorna (conteúdo, hash).
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    while True:
+        chunk = await upload.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        buffer.extend(chunk)
+        if len(buffer) > max_bytes:
+            raise FileTooLargeError(f"O arquivo passa do limite de {max_bytes // (1024 * 1024)} MB.")
+        digest.update(chunk)
+    return bytes(buffer), digest.hexdigest()
+
+
+async def aextract_upload_text(upload, extractor: FileExtractor, cache=None, max_bytes: int = 5 * 1024 * 1024):
+    """
+    Texto da redação enviada como arquivo. Com `cache`, reenvios do mesmo arquivo
+    reutilizam o texto já extraído. Retorna (texto, status do cache: "hit" ou "miss").
+    """
+    data, file_hash = await read_upload(upload, max_bytes)
+    if not data:
+        raise FileExtractionError("O arquivo enviado está vazio.")
+
+    key = f"{EXTRACTOR_VERSION}:{file_hash}"
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        record_cache("extraction", "hit" if cached is not None else "miss")
+        if cached is not None:
+            logging.info("Texto do arquivo encontrado no cache de extração.")
+            return cached, "hit"
+
+    file_type = detect_file_type(upload.filename, data[:8])
+    logging.info(f"Extraindo o texto de um arquivo {file_type.upper()} ({len(data) / 1024:.0f} KB)...")
+    text = await extractor.extract(file_type, data)
+    if not text:
+        raise FileExtractionError("O arquivo não contém texto legível (PDFs escaneados como imagem não são suportados).")
+
+    if cache is not None:
+        await asyncio.to_thread(cache.set, key, text)
+    return text, "miss"
@@ -0,0 +1,380 @@
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+from .tracing import trace_request
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+JOB_PARTIAL = "partial"
+
+
+class JobStore:
+    """
+    Persistência dos lotes de correção em SQLite: um job por lote e um item por
+    redação, com estado, resultado e erro. Assim, reiniciar o servidor não perde
+    o trabalho enfileirado. Uma única conexão, protegida por lock, como no SQLiteCache.
+
+    O banco é a própria fila, compartilhada pelos processos da API (uvicorn --workers):
+    cada item é reservado por um único worker com um UPDATE atômico, que grava o
+    `worker_id` e o prazo da reserva (`lease_expires_at`). O worker renova a reserva
+    enquanto corrige; se o processo morrer, a reserva expira e o item volta à fila.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " mode TEXT,"
+            " total INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS items ("
+            " job_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " text TEXT NOT NULL,"
+            " result TEXT,"
+            " cache_status TEXT,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL,"
+            " worker_id TEXT,"
+            " lease_expires_at REAL,"
+            " PRIMARY KEY (job_id, idx))"
+        )
+        # Bancos criados antes das reservas por worker não têm as colunas
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(items)")}
+        for column, kind in (("worker_id", "TEXT"), ("lease_expires_at", "REAL")):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE items ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_items_status ON items (status)")
+        self._conn.commit()
+
+    def create_job(self, texts: list, mode: Optional[str] = None) -> str:
+        """Registra um lote com todas as redações na fila. Retorna o id do job."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO jobs (id, mode, total, created_at) VALUES (?, ?, ?, ?)", (job_id, mode, len(texts), now))
+            self._conn.executemany(
+                "INSERT INTO items (job_id, idx, status, text, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, idx, JOB_QUEUED, text, now) for idx, text in enumerate(texts)]
+            )
+            self._conn.commit()
+        return job_id
+
+    def requeue_interrupted(self) -> int:
+        """
+        Devolve à fila os itens em execução cuja reserva expirou (worker parado ou
+        morto). Itens reservados por workers vivos, que renovam a reserva, não são tocados.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, time.time())
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def claim_next(self, worker_id: str, lease_seconds: float) -> Optional[tuple]:
+        """
+        Reserva o próximo item da fila (do job mais antigo para o mais novo) para
+        `worker_id`, em um único UPDATE: entre processos, só um deles leva o item.
+        Retorna (job_id, idx, texto, modo), ou None se a fila estiver vazia.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE items SET status = ?, worker_id = ?, lease_expires_at = ?, updated_at = ?"
+                " WHERE rowid = ("
+                "  SELECT items.rowid FROM items JOIN jobs ON jobs.id = items.job_id"
+                "  WHERE items.status = ? ORDER BY jobs.created_at, items.idx LIMIT 1"
+                " ) AND status = ?"
+                " RETURNING job_id, idx, text",
+                (JOB_RUNNING, worker_id, now + lease_seconds, now, JOB_QUEUED, JOB_QUEUED)
+            ).fetchone()
+            self._conn.commit()
+            if row is None:
+                return None
+            (mode,) = self._conn.execute("SELECT mode FROM jobs WHERE id = ?", (row[0],)).fetchone()
+        return row[0], row[1], row[2], mode
+
+    def renew_leases(self, worker_id: str, lease_seconds: float) -> int:
+        """Estende as reservas dos itens em execução por `worker_id`."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET lease_expires_at = ? WHERE status = ? AND worker_id = ?",
+                (time.time() + lease_seconds, JOB_RUNNING, worker_id)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def release(self, worker_id: str) -> int:
+        """Devolve à fila os itens em execução por `worker_id` (parada do servidor)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE items SET status = ?, worker_id = NULL, lease_expires_at = NULL, updated_at = ?"
+                " WHERE status = ? AND worker_id = ?",
+                (JOB_QUEUED, time.time(), JOB_RUNNING, worker_id)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def update_item(self, job_id: str, idx: int, status: str, result: str = None, cache_status: str = None,
+                    error: str = None, worker_id: str = None) -> bool:
+        """
+        Grava o estado do item. Com `worker_id`, só grava se o item ainda estiver
+        reservado por ele (a reserva pode ter expirado e o item ido para outro worker).
+        """
+        query = (
+            "UPDATE items SET status = ?, result = ?, cache_status = ?, error = ?, updated_at = ?,"
+            " worker_id = NULL, lease_expires_at = NULL WHERE job_id = ? AND idx = ?"
+        )
+        params = [status, result, cache_status, error, time.time(), job_id, idx]
+        if worker_id is not None:
+            query += " AND status = ? AND worker_id = ?"
+            params += [JOB_RUNNING, worker_id]
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            self._conn.commit()
+            return cursor.rowcount > 0
+
+    def get_job(self, job_id: str, include_results: bool = True) -> Optional[dict]:
+        """Estado do job e de cada redação, ou None se o job não existir."""
+        with self._lock:
+            job = self._conn.execute("SELECT id, mode, total, created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            items = self._conn.execute(
+                "SELECT idx, status, result, cache_status, error, updated_at FROM items WHERE job_id = ? ORDER BY idx",
+                (job_id,)
+            ).fetchall()
+
+        counts = {status: 0 for status in (JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_ERROR)}
+        for _, status, *_ in items:
+            counts[status] = counts.get(status, 0) + 1
+
+        return {
+            "job_id": job[0],
+            "mode": job[1],
+            "status": self._job_status(counts, job[2]),
+            "total": job[2],
+            "counts": counts,
+            "created_at": job[3],
+            "updated_at": max((item[5] for item in items), default=job[3]),
+            "items": [
+                {
+                    "index": idx,
+                    "status": status,
+                    "correction": result if include_results else None,
+                    "cache": cache_status,
+                    "error": error,
+                }
+                for idx, status, result, cache_status, error, _ in items
+            ],
+        }
+
+    @staticmethod
+    def _job_status(counts: dict, total: int) -> str:
+        if counts[JOB_DONE] == total:
+            return JOB_DONE
+        if counts[JOB_ERROR] == total:
+            return JOB_ERROR
+        if counts[JOB_DONE] + counts[JOB_ERROR] == total:
+            return JOB_PARTIAL
+        if counts[JOB_QUEUED] == total:
+            return JOB_QUEUED
+        return JOB_RUNNING
+
+    def purge_finished(self, older_than_seconds: float) -> int:
+        """Remove jobs sem itens pendentes criados há mais de `older_than_seconds`."""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            old_jobs = [row[0] for row in self._conn.execute(
+                "SELECT id FROM jobs WHERE created_at < ? AND NOT EXISTS ("
+                " SELECT 1 FROM items WHERE items.job_id = jobs.id AND items.status IN (?, ?))",
+                (cutoff, JOB_QUEUED, JOB_RUNNING)
+            )]
+            for job_id in old_jobs:
+                self._conn.execute("DELETE FROM items WHERE job_id = ?", (job_id,))
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+        return len(old_jobs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+            (jobs,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return {"jobs": jobs, "items": dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Fila de correções em lote com um pool limitado de workers assíncronos no
+    event loop do servidor. O recebimento (POST /correct/batch) só grava o job; os
+    workers reservam os itens direto no banco (JobStore.claim_next), de modo que
+    vários processos da API dividem a mesma fila sem corrigir a mesma redação duas
+    vezes, e processam no ritmo permitido pelos limites de concorrência de cada
+    etapa do pipeline (ver concurrency.py).
+    """
+
+    def __init__(self, store: JobStore, workers: int = 4, retention_seconds: float = 7 * 24 * 3600,
+                 lease_seconds: float = 60.0, poll_interval: float = 1.0):
+        self.store = store
+        self.workers = workers
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        # Identifica este processo nas reservas; os workers assíncronos dele o compartilham
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = None
+        self._tasks = []
+        self._process = None
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self, process):
+        """
+        Inicia os workers. `process(texto, modo)` é a corrotina que corrige uma redação
+        e retorna (correção, status do cache), levantando uma exceção em caso de falha.
+        Itens de workers que pararam sem devolvê-los voltam para a fila quando a reserva expira.
+        """
+        if self._tasks:
+            return
+        self._process = process
+        self._wakeup = asyncio.Event()
+
+        purged = await asyncio.to_thread(self.store.purge_finished, self.retention_seconds)
+        requeued = await asyncio.to_thread(self.store.requeue_interrupted)
+        if requeued or purged:
+            logging.info(f"Fila de jobs retomada: {requeued} itens interrompidos de volta à fila, {purged} jobs antigos removidos.")
+
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Devolve à fila o que estava em andamento, para outro processo assumir sem esperar a reserva expirar
+        released = await asyncio.to_thread(self.store.release, self.worker_id)
+        if released:
+            logging.info(f"{released} itens em andamento devolvidos à fila de jobs.")
+
+    async def submit(self, texts: list, mode: Optional[str] = None) -> str:
+        """Grava o lote (os itens já ficam na fila). Retorna o id do job imediatamente."""
+        job_id = await asyncio.to_thread(self.store.create_job, texts, mode)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        logging.info(f"Job {job_id} criado com {len(texts)} redações.")
+        return job_id
+
+    async def get(self, job_id: str, include_results: bool = True) -> Optional[dict]:
+        return await asyncio.to_thread(self.store.get_job, job_id, include_results)
+
+    async def _next_item(self) -> tuple:
+        """Reserva o próximo item; com a fila vazia, consulta o banco a cada `poll_interval` (ou ao receber um lote)."""
+        while True:
+            item = await asyncio.to_thread(self.store.claim_next, self.worker_id, self.lease_seconds)
+            if item is not None:
+                return item
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _renew_leases(self):
+        """Renova as reservas deste processo e devolve à fila as expiradas (de processos que morreram)."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.renew_leases, self.worker_id, self.lease_seconds)
+                requeued = await asyncio.to_thread(self.store.requeue_interrupted)
+                if requeued:
+                    logging.warning(f"{requeued} itens com a reserva expirada voltaram à fila de jobs.")
+                    self._wakeup.set()
+            except Exception as e:
+                logging.error(f"Erro ao renovar as reservas da fila de jobs: {e}")
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job_id, idx, text, mode = await self._next_item()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ex.: banco bloqueado por outro processo; o worker não pode morrer com a fila cheia
+                logging.error(f"Worker {worker_id}: erro ao buscar o próximo item da fila de jobs: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                error = None
+                with trace_request(f"{job_id}:{idx}") as trace:
+                    try:
+                        correction, cache_status = await self._process(text, mode)
+                    except Exception as e:
+                        correction, cache_status, error = None, None, str(e)
+                if trace.stages:
+                    logging.info(f"[{trace.request_id}] item do lote — {trace.summary()}")
+
+                if error is not None or not correction:
+                    self.failed += 1
+                    stored = await asyncio.to_thread(
+                        self.store.update_item, job_id, idx, JOB_ERROR, error=error or "Correção vazia.", worker_id=self.worker_id
+                    )
+                else:
+                    self.processed += 1
+                    stored = await asyncio.to_thread(
+                        self.store.update_item, job_id, idx, JOB_DONE, result=correction, cache_status=cache_status, worker_id=self.worker_id
+                    )
+                if not stored:
+                    logging.warning(f"Worker {worker_id}: a reserva do item {idx} do job {job_id} expirou; resultado descartado.")
+            except asyncio.CancelledError:
+                # Parada do servidor: o item é devolvido à fila em stop()
+                raise
+            except Exception as e:
+                logging.error(f"Worker {worker_id}: erro ao processar o item {idx} do job {job_id}: {e}")
+
+    def stats(self) -> dict:
+        store_stats = self.store.stats()
+        return {
+            "workers": self.workers,
+            "worker_id": self.worker_id,
+            "running": self.is_running,
+            "queued": store_stats["items"].get(JOB_QUEUED, 0),
+            "processed": self.processed,
+            "failed": self.failed,
+            **store_stats,
+        }
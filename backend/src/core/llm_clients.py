@@ -0,0 +1,413 @@
+"""
+Camada de clientes dos LLMs (OpenAI e Maritaca).
+
+- Pool de conexões HTTP compartilhado por serviço (keep-alive entre requisições).
+- Tempo limite por etapa em cada chamada (HyDE, geração, embeddings).
+- Retry com backoff exponencial e jitter para erros transitórios (timeout, conexão, 429, 5xx).
+- Circuito por serviço: depois de falhas seguidas, as chamadas falham na hora por
+  CIRCUIT_RESET_SECONDS, em vez de esperar o tempo limite de um serviço fora do ar.
+- Requisições "hedged" (opcional): se a chamada passar do p95 recente da operação,
+  uma cópia é disparada e vale a primeira resposta.
+
+Os erros viram as exceções de errors.py.
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+import config
+from .errors import CircuitOpenError, UpstreamError, UpstreamTimeoutError
+from .metrics import UPSTREAM_EVENTS
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+UPSTREAM_OPENAI = "openai"
+UPSTREAM_MARITACA = "maritaca"
+UPSTREAMS = (UPSTREAM_OPENAI, UPSTREAM_MARITACA)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+# --- Pool de conexões ---
+
+_http_clients = {}
+_async_http_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _http_timeout() -> httpx.Timeout:
+    # O tempo limite de leitura padrão é o maior entre as etapas; cada chamada passa o seu
+    read = max(config.HYDE_TIMEOUT_SECONDS, config.EMBEDDING_TIMEOUT_SECONDS, config.GENERATION_TIMEOUT_SECONDS)
+    return httpx.Timeout(read, connect=config.LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=30.0,
+    )
+
+
+def http_client(upstream: str) -> httpx.Client:
+    """Cliente HTTP síncrono compartilhado do serviço `upstream`."""
+    with _clients_lock:
+        client = _http_clients.get(upstream)
+        if client is None:
+            client = httpx.Client(timeout=_http_timeout(), limits=_http_limits())
+            _http_clients[upstream] = client
+        return client
+
+
+def async_http_client(upstream: str) -> httpx.AsyncClient:
+    """
+    Cliente HTTP assíncrono compartilhado do serviço `upstream`. Como os demais
+    clientes assíncronos do processo, fica preso ao event loop em que é usado
+    (o do servidor, ou o loop dedicado das chamadas síncronas do pipeline).
+    """
+    with _clients_lock:
+        client = _async_http_clients.get(upstream)
+        if client is None:
+            client = httpx.AsyncClient(timeout=_http_timeout(), limits=_http_limits())
+            _async_http_clients[upstream] = client
+        return client
+
+
+def openai_clients(upstream: str, api_key: str, base_url: Optional[str] = None):
+    """
+    Clientes (OpenAI, AsyncOpenAI) sobre o pool do serviço. Os retries do SDK ficam
+    desligados: a política de retry é a desta camada (`call_upstream`/`acall_upstream`).
+    """
+    client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client(upstream), max_retries=0)
+    async_client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=async_http_client(upstream), max_retries=0)
+    return client, async_client
+
+
+# --- Circuito por serviço ---
+
+class CircuitBreaker:
+    """
+    Circuito de um serviço externo. Fechado: as chamadas passam. Aberto (após
+    `failure_threshold` falhas seguidas): as chamadas falham na hora com
+    CircuitOpenError. Passados `reset_seconds`, uma única chamada de teste passa
+    (meio-aberto); se ela funcionar o circuito fecha, senão abre de novo.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """
+        Autoriza a chamada ou levanta CircuitOpenError. Retorna True se a chamada é
+        a de teste do circuito meio-aberto (o resultado dela fecha ou reabre o circuito).
+        """
+        with self._lock:
+            if self.state == CIRCUIT_OPEN:
+                remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+                if remaining > 0:
+                    self.rejected += 1
+                    UPSTREAM_EVENTS.labels(self.name, "circuit_rejected").inc()
+                    raise CircuitOpenError(self.name, remaining)
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN:
+                if self._trial_in_flight:
+                    self.rejected += 1
+                    UPSTREAM_EVENTS.labels(self.name, "circuit_rejected").inc()
+                    raise CircuitOpenError(self.name, 1.0)
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def after_call(self, failed: Optional[bool], trial: bool = False):
+        """
+        Registra o resultado: `failed` indica falha do serviço (timeout, conexão, 5xx);
+        None quando o resultado não diz nada sobre o serviço (cancelamento, 429, erro
+        4xx ou local). `trial` é o retorno de `before_call` para esta chamada.
+        """
+        with self._lock:
+            if trial:
+                self._trial_in_flight = False
+            if failed is None:
+                return
+            if not failed:
+                if self.state != CIRCUIT_CLOSED:
+                    logging.info(f"Circuito de '{self.name}' fechado: o serviço voltou a responder.")
+                self.state = CIRCUIT_CLOSED
+                self.consecutive_failures = 0
+                return
+
+            self.consecutive_failures += 1
+            if trial or self.consecutive_failures >= self.failure_threshold:
+                if self.state != CIRCUIT_OPEN:
+                    self.times_opened += 1
+                    logging.warning(
+                        f"Circuito de '{self.name}' aberto após {self.consecutive_failures} falha(s) seguida(s); "
+                        f"chamadas recusadas por {self.reset_seconds:g}s."
+                    )
+                self.state = CIRCUIT_OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+# --- Latência recente por operação (base do atraso das requisições "hedged") ---
+
+class LatencyWindow:
+    """Últimas `size` latências de sucesso de uma operação."""
+
+    def __init__(self, size: int = 200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._values)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))]
+
+    def __len__(self):
+        return len(self._values)
+
+
+_breakers = {}
+_latencies = {}
+_counters = {}
+_state_lock = threading.Lock()
+
+
+def circuit_breaker(upstream: str) -> CircuitBreaker:
+    with _state_lock:
+        breaker = _breakers.get(upstream)
+        if breaker is None:
+            breaker = CircuitBreaker(upstream, config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SECONDS)
+            _breakers[upstream] = breaker
+        return breaker
+
+
+def _latency(upstream: str, operation: str) -> LatencyWindow:
+    with _state_lock:
+        return _latencies.setdefault((upstream, operation), LatencyWindow())
+
+
+def _count(upstream: str, name: str):
+    with _state_lock:
+        counters = _counters.setdefault(upstream, {"calls": 0, "retries": 0, "failures": 0, "hedges": 0, "hedges_won": 0})
+        counters[name] += 1
+    UPSTREAM_EVENTS.labels(upstream, name).inc()
+
+
+def hedge_delay(upstream: str, operation: str) -> Optional[float]:
+    """Atraso até disparar a cópia: o p95 recente da operação (None sem amostras suficientes)."""
+    window = _latency(upstream, operation)
+    if len(window) < config.HEDGE_MIN_SAMPLES:
+        return None
+    return max(config.HEDGE_MIN_DELAY_SECONDS, window.percentile(0.95))
+
+
+# --- Classificação dos erros ---
+
+def as_upstream_error(upstream: str, error: Exception, timeout: float) -> Exception:
+    """
+    Converte um erro do SDK/HTTP em UpstreamError (com `retryable` preenchido).
+    Erros que não vêm do serviço (ex.: bugs locais) são devolvidos sem conversão.
+    """
+    if isinstance(error, UpstreamError):
+        return error
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError, httpx.TimeoutException)):
+        return UpstreamTimeoutError(upstream, timeout)
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return UpstreamError(upstream, f"falha de conexão ({error})", retryable=True)
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        retryable = status in (408, 409, 429) or status >= 500
+        upstream_error = UpstreamError(upstream, f"HTTP {status}: {error.message}", retryable=retryable)
+        upstream_error.http_status = status
+        upstream_error.retry_after = _retry_after_header(error.response)
+        return upstream_error
+    return error
+
+
+def _retry_after_header(response) -> Optional[float]:
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_outage(error: Exception) -> bool:
+    """Falha que indica serviço fora do ar (conta para o circuito). 429 é limite de taxa, não queda."""
+    if not isinstance(error, UpstreamError) or not error.retryable:
+        return False
+    return getattr(error, "http_status", None) != 429
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Backoff exponencial com jitter completo, respeitando o Retry-After do serviço."""
+    ceiling = min(config.LLM_RETRY_MAX_DELAY_SECONDS, config.LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        delay = max(delay, min(retry_after, config.LLM_RETRY_MAX_DELAY_SECONDS))
+    return delay
+
+
+# --- Chamadas ---
+
+def call_upstream(upstream: str, operation: str, call, timeout: float, retries: int = None):
+    """
+    Executa `call()` (chamada síncrona ao serviço, que deve repassar `timeout` ao SDK)
+    com retry e circuito. Levanta UpstreamError, UpstreamTimeoutError ou CircuitOpenError.
+    """
+    breaker = circuit_breaker(upstream)
+    retries = config.LLM_MAX_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        trial = breaker.before_call()
+        _count(upstream, "calls")
+        start = time.perf_counter()
+        failed = None
+        try:
+            result = call()
+            failed = False
+        except Exception as e:
+            error = as_upstream_error(upstream, e, timeout)
+            # Só quedas do serviço contam para o circuito; 429, 4xx e erros locais não são sucesso nem falha
+            failed = True if _is_outage(error) else None
+            if not isinstance(error, UpstreamError):
+                raise
+            _count(upstream, "failures")
+            if not error.retryable or attempt == retries:
+                raise error from e
+            delay = _backoff(attempt, error)
+            logging.warning(f"{error} — nova tentativa em {delay:.1f}s ({attempt + 1}/{retries}).")
+        else:
+            _latency(upstream, operation).record(time.perf_counter() - start)
+            return result
+        finally:
+            breaker.after_call(failed, trial)
+        _count(upstream, "retries")
+        time.sleep(delay)
+
+
+async def _attempt(call, timeout: float):
+    return await asyncio.wait_for(call(), timeout=timeout)
+
+
+async def _ahedged(upstream: str, operation: str, call, timeout: float):
+    """Uma tentativa com cópia: se passar do atraso de hedge, dispara outra e vale a primeira que responder."""
+    delay = hedge_delay(upstream, operation)
+    first = asyncio.ensure_future(_attempt(call, timeout))
+    if delay is None:
+        return await first
+
+    tasks = {first}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done:
+            _count(upstream, "hedges")
+            logging.info(f"Chamada a '{upstream}' ({operation}) passou de {delay:.1f}s; disparando cópia.")
+            tasks.add(asyncio.ensure_future(_attempt(call, timeout)))
+
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not first:
+                        _count(upstream, "hedges_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def acall_upstream(upstream: str, operation: str, call, timeout: float, retries: int = None, hedge: bool = False):
+    """
+    Versão assíncrona de `call_upstream`: `call()` retorna a corrotina da chamada.
+    Cada tentativa é limitada a `timeout` segundos no total (inclusive respostas que
+    chegam aos poucos). Com `hedge`, a tentativa pode ser duplicada (ver `_ahedged`).
+    """
+    breaker = circuit_breaker(upstream)
+    retries = config.LLM_MAX_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        trial = breaker.before_call()
+        _count(upstream, "calls")
+        start = time.perf_counter()
+        failed = None
+        try:
+            if hedge:
+                result = await _ahedged(upstream, operation, call, timeout)
+            else:
+                result = await _attempt(call, timeout)
+            failed = False
+        except Exception as e:
+            error = as_upstream_error(upstream, e, timeout)
+            # Só quedas do serviço contam para o circuito; 429, 4xx e erros locais não são sucesso nem falha
+            failed = True if _is_outage(error) else None
+            if not isinstance(error, UpstreamError):
+                raise
+            _count(upstream, "failures")
+            if not error.retryable or attempt == retries:
+                raise error from e
+            delay = _backoff(attempt, error)
+            logging.warning(f"{error} — nova tentativa em {delay:.1f}s ({attempt + 1}/{retries}).")
+        else:
+            _latency(upstream, operation).record(time.perf_counter() - start)
+            return result
+        finally:
+            breaker.after_call(failed, trial)
+        _count(upstream, "retries")
+        await asyncio.sleep(delay)
+
+
+def stats() -> dict:
+    """Estado do circuito, contadores e latências recentes, por serviço."""
+    with _state_lock:
+        counters = {upstream: dict(values) for upstream, values in _counters.items()}
+        latencies = dict(_latencies)
+    result = {}
+    for upstream in UPSTREAMS:
+        result[upstream] = {
+            "circuit": circuit_breaker(upstream).stats(),
+            **counters.get(upstream, {}),
+            "latency": {
+                operation: {"p50": window.percentile(0.5), "p95": window.percentile(0.95), "samples": len(window)}
+                for (name, operation), window in latencies.items()
+                if name == upstream and len(window)
+            },
+        }
+    return result
@@ -1,26 +1,33 @@
 import config
-from typing import Any, List, Mapping, Optional
-from langchain.callbacks.manager import CallbackManagerForLLMRun
+from typing import Any, AsyncIterator, Iterator, List, Mapping, Optional
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
 from langchain.llms.base import LLM
-from openai import OpenAI
+from langchain_core.outputs import GenerationChunk
+
+from .context_packer import count_tokens
+from .llm_clients import UPSTREAM_MARITACA, acall_upstream, as_upstream_error, call_upstream, openai_clients
+from .tracing import record_tokens
 
 class SabiáLLM(LLM):
     """
     Wrapper customizado do LangChain para o LLM Sabiá da Maritaca AI.
     Agora usa a nova API compatível com OpenAI.
+    As chamadas passam pela camada de llm_clients (pool HTTP, tempo limite, retry,
+    circuito e, opcionalmente, hedge) e as falhas levantam as exceções de errors.py.
     """
     model: str = "sabia-3"  
     temperature: float = 0.35
     max_tokens: int = 2048
+    timeout: float = config.GENERATION_TIMEOUT_SECONDS
+    hedge: bool = config.HEDGE_ENABLED
     client: Any = None
+    async_client: Any = None
 
     def model_post_init(self, __context: Any) -> None:
         super().model_post_init(__context)
-        # Inicializa o cliente OpenAI com endpoint da Maritaca
-        self.client = OpenAI(
-            api_key=config.MARITACA_API_KEY,
-            base_url="https://chat.maritaca.ai/api"  # Nova URL da API
-        )
+        # Inicializa os clientes OpenAI (síncrono e assíncrono) com endpoint da Maritaca,
+        # sobre o pool de conexões compartilhado do serviço
+        self.client, self.async_client = openai_clients(UPSTREAM_MARITACA, config.MARITACA_API_KEY, config.MARITACA_BASE_URL)
 
     @property
     def _llm_type(self) -> str:
@@ -33,24 +40,148 @@ class SabiáLLM(LLM):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> str:
+        params = self._request_params(prompt, stop, **kwargs)
+        # Faz a chamada para a API usando o cliente OpenAI
+        response = call_upstream(
+            UPSTREAM_MARITACA,
+            self._operation(params),
+            lambda: self.client.chat.completions.create(**params, timeout=self.timeout),
+            timeout=self.timeout,
+        )
+        # Extrai e retorna o conteúdo da resposta
+        text = response.choices[0].message.content or ""
+        self._record_usage(params, response.usage, text)
+        return text
+
+    async def _acall(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        params = self._request_params(prompt, stop, **kwargs)
+        # Mesma chamada de `_call`, mas sem bloquear o event loop
+        response = await acall_upstream(
+            UPSTREAM_MARITACA,
+            self._operation(params),
+            lambda: self.async_client.chat.completions.create(**params, timeout=self.timeout),
+            timeout=self.timeout,
+            hedge=self.hedge,
+        )
+        text = response.choices[0].message.content or ""
+        self._record_usage(params, response.usage, text)
+        return text
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        """
+        Gera a resposta token a token usando a API de streaming da Maritaca. O retry
+        vale só para abrir o stream; uma falha no meio dele é levantada como UpstreamError.
+        """
+        params = self._request_params(prompt, stop, stream=True, **kwargs)
+        stream = call_upstream(
+            UPSTREAM_MARITACA,
+            "stream",
+            lambda: self.client.chat.completions.create(**params, timeout=self.timeout),
+            timeout=self.timeout,
+        )
+        usage, pieces = None, []
         try:
-            # Prepara as mensagens no formato da API
-            messages = [{"role": "user", "content": prompt}]
-            
-            # Faz a chamada para a API usando o cliente OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                **kwargs
-            )
-            
-            # Extrai e retorna o conteúdo da resposta
-            return response.choices[0].message.content
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if not text:
+                    continue
+                pieces.append(text)
+                generation = GenerationChunk(text=text)
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=generation)
+                yield generation
+        except Exception as e:
+            error = as_upstream_error(UPSTREAM_MARITACA, e, self.timeout)
+            if error is e:
+                raise
+            raise error from e
+        self._record_usage(params, usage, "".join(pieces))
 
+    async def _astream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[GenerationChunk]:
+        """Versão assíncrona de `_stream`."""
+        params = self._request_params(prompt, stop, stream=True, **kwargs)
+        stream = await acall_upstream(
+            UPSTREAM_MARITACA,
+            "stream",
+            lambda: self.async_client.chat.completions.create(**params, timeout=self.timeout),
+            timeout=self.timeout,
+        )
+        usage, pieces = None, []
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if not text:
+                    continue
+                pieces.append(text)
+                generation = GenerationChunk(text=text)
+                if run_manager:
+                    await run_manager.on_llm_new_token(text, chunk=generation)
+                yield generation
         except Exception as e:
-            return f"Erro na chamada da API da Maritaca: {e}"
+            error = as_upstream_error(UPSTREAM_MARITACA, e, self.timeout)
+            if error is e:
+                raise
+            raise error from e
+        self._record_usage(params, usage, "".join(pieces))
+
+    def _request_params(self, prompt: str, stop: Optional[List[str]] = None, **kwargs: Any) -> dict:
+        """Monta os parâmetros da chamada; `kwargs` sobrescrevem os valores padrão."""
+        # Prepara as mensagens no formato da API
+        params = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+        }
+        if stop:
+            params["stop"] = stop
+        params.update(kwargs)
+        if params.get("stream") and config.MARITACA_STREAM_USAGE:
+            # Servidores compatíveis com a OpenAI só enviam o uso no streaming se pedido (último pedaço);
+            # o parâmetro é uma extensão da OpenAI, por isso só é enviado se habilitado
+            params.setdefault("stream_options", {"include_usage": True})
+        return params
+
+    def _record_usage(self, params: dict, usage, completion: str) -> None:
+        """
+        Registra os tokens informados pela API; se ela não informar o uso, estima
+        pelo prompt e pelo texto gerado (`count_tokens`).
+        """
+        operation = "stream" if params.get("stream") else self._operation(params)
+        if usage is not None:
+            record_tokens(UPSTREAM_MARITACA, operation, usage.prompt_tokens, usage.completion_tokens)
+            return
+        prompt = "\n".join(message["content"] for message in params["messages"])
+        record_tokens(UPSTREAM_MARITACA, operation, count_tokens(prompt), count_tokens(completion))
+
+    @staticmethod
+    def _operation(params: dict) -> str:
+        """
+        Nome da operação para as latências recentes (atraso do hedge). Chamadas com
+        limites de tokens diferentes (correção completa, competência, fechamento)
+        têm latências bem diferentes e ficam separadas.
+        """
+        return f"generation:{params.get('max_tokens')}"
 
     @property
     def _identifying_params(self) -> Mapping[str, Any]:
@@ -0,0 +1,48 @@
+"""
+Métricas do pipeline no formato do Prometheus, expostas em GET /metrics.
+
+Histogramas da duração de cada etapa e das requisições; contadores de tokens
+(informados pelas APIs), consultas aos caches, contingências (fallbacks), erros,
+recusas do controle de admissão e eventos dos clientes dos LLMs. Cada processo
+(worker do uvicorn) mantém as suas próprias métricas.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Segundos: das etapas locais (dezenas de ms) às gerações longas do Sabiá
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+STAGE_SECONDS = Histogram(
+    "elysia_stage_seconds", "Duração de cada etapa do pipeline de correção.", ["stage"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "elysia_request_seconds",
+    "Duração das requisições HTTP (no streaming, até o início da resposta).",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("elysia_llm_tokens", "Tokens informados pelas APIs dos LLMs.", ["upstream", "operation", "kind"])
+CACHE_LOOKUPS = Counter("elysia_cache_lookups", "Consultas aos caches, por resultado.", ["cache", "result"])
+FALLBACKS = Counter("elysia_fallbacks", "Etapas que usaram o resultado de contingência.", ["kind"])
+ERRORS = Counter("elysia_errors", "Falhas do pipeline de correção, por tipo de exceção.", ["type"])
+ADMISSION_REJECTIONS = Counter("elysia_admission_rejections", "Requisições recusadas pelo controle de admissão.", ["reason"])
+UPSTREAM_EVENTS = Counter(
+    "elysia_upstream_events", "Chamadas, retries, falhas e hedges dos clientes dos LLMs.", ["upstream", "event"]
+)
+
+
+def record_cache(cache: str, result: str, amount: int = 1):
+    if amount:
+        CACHE_LOOKUPS.labels(cache, result).inc(amount)
+
+
+def record_fallback(kind: str):
+    FALLBACKS.labels(kind).inc()
+
+
+def record_error(error: Exception):
+    ERRORS.labels(type(error).__name__).inc()
+
+
+def render():
+    """Conteúdo e content-type da resposta de GET /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
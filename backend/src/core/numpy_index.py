@@ -0,0 +1,143 @@
+"""
+Índice vetorial em processo com NumPy, alternativo ao Chroma.
+
+Layout do diretório do índice (gerado por scripts/embedding_indexing/export_numpy_index.py):
+    vectors.npy      matriz float32 (N x D) contígua e normalizada, aberta com memory-map
+    metadata.json    lista com os metadados de cada linha (mesma ordem da matriz)
+    chunks.jsonl     conteúdo dos chunks (chunk store), lido apenas para os resultados
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from .chunk_store import ChunkStore
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+CHUNKS_FILE = "chunks.jsonl"
+
+
+class NumpyVectorIndex:
+    """Busca exata por similaridade de cosseno com produto de matrizes e top-k por `argpartition`."""
+
+    def __init__(self, path: str):
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        if not os.path.exists(vectors_path):
+            raise FileNotFoundError(
+                f"Índice NumPy não encontrado em {path}. Execute scripts/embedding_indexing/export_numpy_index.py."
+            )
+
+        self.path = path
+        self.vectors = np.load(vectors_path, mmap_mode="r")
+        with open(os.path.join(path, METADATA_FILE), "r", encoding="utf-8") as f:
+            self.metadata = json.load(f)
+        self.chunks = ChunkStore(os.path.join(path, CHUNKS_FILE))
+        self._columns = {}
+
+        if len(self.metadata) != self.vectors.shape[0]:
+            raise ValueError("Índice NumPy inconsistente: metadados e vetores com tamanhos diferentes.")
+        logging.info(f"Índice NumPy carregado: {self.vectors.shape[0]} vetores de dimensão {self.vectors.shape[1]}.")
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def _column(self, field: str) -> np.ndarray:
+        """Coluna de metadados como array, para filtros vetorizados (cacheada por campo)."""
+        column = self._columns.get(field)
+        if column is None:
+            column = np.array([row.get(field) for row in self.metadata], dtype=object)
+            self._columns[field] = column
+        return column
+
+    def filter_mask(self, metadata_filter: Optional[dict]):
+        """
+        Máscara booleana das linhas que satisfazem o filtro. Cada campo aceita um
+        valor ou uma lista de valores permitidos. Retorna None se não houver filtro.
+        """
+        if not metadata_filter:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for field, allowed in metadata_filter.items():
+            values = allowed if isinstance(allowed, (list, tuple, set)) else [allowed]
+            mask &= np.isin(self._column(field), list(values))
+        return mask
+
+    def search(self, query_vectors, k: int = 20, metadata_filter: Optional[dict] = None) -> list:
+        """
+        Busca os `k` vizinhos mais próximos de cada consulta em um único produto de matrizes.
+        Retorna, para cada consulta, uma lista de (linha, similaridade) em ordem decrescente.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+
+        scores = queries @ self.vectors.T
+        mask = self.filter_mask(metadata_filter)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+
+        k = min(k, scores.shape[1])
+        if k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row_scores, candidates in zip(scores, top):
+            ordered = candidates[np.argsort(-row_scores[candidates])]
+            results.append([(int(i), float(row_scores[i])) for i in ordered if np.isfinite(row_scores[i])])
+        return results
+
+    def documents(self, hits: list) -> List[Document]:
+        """Converte (linha, similaridade) em Documents, lendo o conteúdo do chunk store."""
+        chunk_ids = [self.metadata[row]["chunk_id"] for row, _ in hits]
+        by_id = {doc.metadata["chunk_id"]: doc for doc in self.chunks.get_many(chunk_ids)}
+
+        documents = []
+        for row, score in hits:
+            metadata = dict(self.metadata[row])
+            doc = by_id.get(metadata["chunk_id"])
+            if doc is None:
+                continue
+            metadata["retrieval_score"] = score
+            documents.append(Document(page_content=doc.page_content, metadata=metadata))
+        return documents
+
+
+class NumpyRetriever(BaseRetriever):
+    """Retriever do LangChain sobre o `NumpyVectorIndex`."""
+
+    index: Any
+    embeddings: Any
+    k: int = 20
+    metadata_filter: Optional[dict] = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        hits = self.index.search([query_vector], k=self.k, metadata_filter=self.metadata_filter)[0]
+        return self.index.documents(hits)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = await self.embeddings.aembed_query(query)
+        # O produto de matrizes é CPU: roda fora do event loop
+        hits = (await asyncio.to_thread(self.index.search, [query_vector], self.k, self.metadata_filter))[0]
+        return await asyncio.to_thread(self.index.documents, hits)
+
+    def search_many(self, queries: List[str]) -> List[List[Document]]:
+        """Várias consultas com um único lote de embeddings e um único produto de matrizes."""
+        query_vectors = self.embeddings.embed_documents(queries)
+        return [self.index.documents(hits) for hits in self.index.search(query_vectors, self.k, self.metadata_filter)]
+
+    async def asearch_many(self, queries: List[str]) -> List[List[Document]]:
+        """Versão assíncrona de `search_many`."""
+        query_vectors = await self.embeddings.aembed_documents(queries)
+        results = await asyncio.to_thread(self.index.search, query_vectors, self.k, self.metadata_filter)
+        return [await asyncio.to_thread(self.index.documents, hits) for hits in results]
@@ -0,0 +1,142 @@
+"""
+Backend ONNX Runtime (quantizado em int8) para o Cross-Encoder de re-ranking.
+
+Na primeira execução, o modelo do Hugging Face é exportado para ONNX e quantizado
+dinamicamente (pesos em int8); o artefato fica em cache no disco:
+    <ONNX_CACHE_DIR>/<modelo>/model.int8.onnx   modelo quantizado
+    <ONNX_CACHE_DIR>/<modelo>/tokenizer*        tokenizer salvo junto do modelo
+    <ONNX_CACHE_DIR>/<modelo>/export.json       origem e versões da exportação
+"""
+import os
+import re
+import json
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+
+MODEL_FILE = "model.int8.onnx"
+EXPORT_INFO_FILE = "export.json"
+
+
+def onnx_model_dir(model_name: str, cache_dir: str) -> str:
+    """Diretório do artefato exportado para `model_name`."""
+    return os.path.join(cache_dir, re.sub(r"[^\w.-]+", "__", model_name))
+
+
+def export_onnx_cross_encoder(model_name: str, output_dir: str, opset: int = 14) -> str:
+    """
+    Exporta o Cross-Encoder para ONNX e aplica a quantização dinâmica em int8.
+    A exportação é feita em um diretório temporário e movida ao final, para que
+    uma execução interrompida não deixe um artefato incompleto no cache.
+    """
+    import torch
+    import onnxruntime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    logging.info(f"Exportando o Cross-Encoder '{model_name}' para ONNX (int8)...")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    parent_dir = os.path.dirname(output_dir) or "."
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".onnx-export-", dir=parent_dir)
+    try:
+        sample = tokenizer(["consulta"], ["documento de exemplo"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        fp32_path = os.path.join(tmp_dir, "model.fp32.onnx")
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["logits"],
+                dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in input_names}, "logits": {0: "batch"}},
+                opset_version=opset,
+            )
+
+        quantize_dynamic(fp32_path, os.path.join(tmp_dir, MODEL_FILE), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+        tokenizer.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, EXPORT_INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "model_name": model_name,
+                "num_labels": model.config.num_labels,
+                "max_length": min(tokenizer.model_max_length, 512),
+                "opset": opset,
+                "torch": torch.__version__,
+                "onnxruntime": onnxruntime.__version__,
+            }, f, indent=2)
+
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(tmp_dir, output_dir)
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    size_mb = os.path.getsize(os.path.join(output_dir, MODEL_FILE)) / (1024 * 1024)
+    logging.info(f"Modelo ONNX int8 salvo em {output_dir} ({size_mb:.0f} MB)")
+    return output_dir
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-Encoder executado com ONNX Runtime. `predict` tem a mesma interface e a
+    mesma saída do `CrossEncoder.predict` (logits para 2 classes, sigmoide para 1),
+    de modo que pode substituí-lo no micro-batching e no re-ranking.
+    """
+
+    def __init__(self, model_dir: str, num_threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, EXPORT_INFO_FILE), "r", encoding="utf-8") as f:
+            info = json.load(f)
+        self.model_name = info["model_name"]
+        self.num_labels = info["num_labels"]
+        self.max_length = info["max_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads and num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = [model_input.name for model_input in self.session.get_inputs()]
+        logging.info(f"Cross-Encoder ONNX int8 carregado de {model_dir}")
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not len(pairs):
+            return np.empty((0, self.num_labels) if self.num_labels > 1 else (0,), dtype=np.float32)
+
+        outputs = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            encoded = self.tokenizer(
+                [pair[0] for pair in batch], [pair[1] for pair in batch],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            feed = {name: encoded[name].astype(np.int64) for name in self._input_names}
+            outputs.append(self.session.run(None, feed)[0])
+
+        logits = np.concatenate(outputs).astype(np.float32)
+        if self.num_labels == 1:
+            return 1.0 / (1.0 + np.exp(-logits[:, 0]))
+        return logits
+
+
+def load_onnx_cross_encoder(model_name: str, cache_dir: str, num_threads: int = 0) -> OnnxCrossEncoder:
+    """Carrega o Cross-Encoder ONNX int8 do cache, exportando-o na primeira vez."""
+    model_dir = onnx_model_dir(model_name, cache_dir)
+    if not os.path.exists(os.path.join(model_dir, MODEL_FILE)):
+        export_onnx_cross_encoder(model_name, model_dir)
+    return OnnxCrossEncoder(model_dir, num_threads=num_threads)
@@ -1,93 +1,392 @@
+import time
+import asyncio
+import hashlib
 import logging
-from sentence_transformers import CrossEncoder
+import numpy as np
+import config
 from langchain.prompts import PromptTemplate
 
+from .components import get_registry
+from .llm_clients import UPSTREAM_OPENAI, acall_upstream, call_upstream
+from .metrics import record_cache, record_fallback
+from .tracing import record_tokens
+from .bm25 import portuguese_tokens
+from .rerank_batcher import MicroBatchReranker
+from .rerank_cache import RerankScoreCache
+from .retrieval import doc_key
+from .text_normalization import normalize_essay_text
+
 # Configura o logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def generate_hypothetical_document(essay_text: str, llm):
-    """
-    Gera um documento hipotético (análise/correção) usando um LLM para melhorar a busca.
-    Esta é a implementação da técnica HyDE.
-    """
-    template = """
-    Você é um assistente especialista em redações do ENEM. 
-    Com base na redação abaixo, gere um parágrafo de análise que capture os temas centrais, 
-    os argumentos principais e a proposta de intervenção. Este parágrafo será usado para encontrar 
+HYDE_TEMPLATE = """
+    Você é um assistente especialista em redações do ENEM.
+    Com base na redação abaixo, gere um parágrafo de análise que capture os temas centrais,
+    os argumentos principais e a proposta de intervenção. Este parágrafo será usado para encontrar
     exemplos e guias de correção relevantes.
 
     Redação:
     ---
     {redacao}
     ---
-    
+
     Análise Hipotética:
     """
-    prompt = PromptTemplate(input_variables=["redacao"], template=template)
-    
+
+
+def _hyde_chain(llm):
+    """Monta a cadeia prompt | llm usada pelo HyDE."""
+    prompt = PromptTemplate(input_variables=["redacao"], template=HYDE_TEMPLATE)
+    return prompt | llm
+
+
+def _llm_identity(llm) -> str:
+    """Identifica o modelo e seus parâmetros de geração."""
+    try:
+        params = llm._identifying_params
+    except Exception:
+        params = {}
+    return f"{type(llm).__name__}:{sorted((str(k), str(v)) for k, v in dict(params).items())}"
+
+
+def hyde_cache_key(essay_text: str, llm) -> str:
+    """
+    Chave do cache do HyDE: hash da redação normalizada, do prompt e da identidade
+    do modelo. Alterar o prompt ou o modelo invalida as entradas antigas.
+    """
+    key_material = "\x1f".join([HYDE_TEMPLATE, _llm_identity(llm), normalize_essay_text(essay_text)])
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+def _hyde_result(result) -> str:
+    """Texto do documento hipotético; registra os tokens informados pela API, se houver."""
+    usage = getattr(result, "usage_metadata", None)
+    if usage:
+        record_tokens(UPSTREAM_OPENAI, "hyde", usage.get("input_tokens"), usage.get("output_tokens"))
+    return result if isinstance(result, str) else result.content
+
+
+def generate_hypothetical_document(essay_text: str, llm, cache=None):
+    """
+    Gera um documento hipotético (análise/correção) usando um LLM para melhorar a busca.
+    Esta é a implementação da técnica HyDE. Se `cache` for informado, reenvios da
+    mesma redação reutilizam o documento já gerado.
+    """
+    key = hyde_cache_key(essay_text, llm) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        record_cache("hyde", "hit" if cached is not None else "miss")
+        if cached is not None:
+            logging.info("Documento hipotético encontrado no cache (HyDE).")
+            return cached
+
     # Usando o novo método invoke em vez do run deprecado
-    chain = prompt | llm
-    
+    chain = _hyde_chain(llm)
+
     logging.info("Gerando documento hipotético para a busca (HyDE)...")
     try:
-        result = chain.invoke({"redacao": essay_text})
-        return result if isinstance(result, str) else result.content
+        result = call_upstream(
+            UPSTREAM_OPENAI, "hyde", lambda: chain.invoke({"redacao": essay_text}), timeout=config.HYDE_TIMEOUT_SECONDS
+        )
+        hypothetical_doc = _hyde_result(result)
     except Exception as e:
+        # Inclui o circuito aberto: com a OpenAI fora do ar, a busca segue sem esperar o tempo limite
         logging.error(f"Erro ao gerar documento hipotético: {e}")
         # Fallback: retorna parte da redação original
+        record_fallback("hyde")
         return essay_text[:500]
 
+    if key is not None:
+        cache.set(key, hypothetical_doc)
+    return hypothetical_doc
+
+
+async def agenerate_hypothetical_document(essay_text: str, llm, cache=None):
+    """Versão assíncrona de `generate_hypothetical_document`."""
+    key = hyde_cache_key(essay_text, llm) if cache is not None else None
+    if key is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        record_cache("hyde", "hit" if cached is not None else "miss")
+        if cached is not None:
+            logging.info("Documento hipotético encontrado no cache (HyDE).")
+            return cached
 
-def rerank_with_cross_encoder(query: str, documents: list, top_n: int = 5):
+    chain = _hyde_chain(llm)
+
+    logging.info("Gerando documento hipotético para a busca (HyDE)...")
+    try:
+        result = await acall_upstream(
+            UPSTREAM_OPENAI,
+            "hyde",
+            lambda: chain.ainvoke({"redacao": essay_text}),
+            timeout=config.HYDE_TIMEOUT_SECONDS,
+            hedge=config.HEDGE_ENABLED,
+        )
+        hypothetical_doc = _hyde_result(result)
+    except Exception as e:
+        logging.error(f"Erro ao gerar documento hipotético: {e}")
+        # Fallback: retorna parte da redação original
+        record_fallback("hyde")
+        return essay_text[:500]
+
+    if key is not None:
+        await asyncio.to_thread(cache.set, key, hypothetical_doc)
+    return hypothetical_doc
+
+
+def _relevance_scores(raw_scores) -> np.ndarray:
     """
-    Reordena uma lista de documentos com base na relevância para a consulta usando um Cross-Encoder.
+    Converte a saída do Cross-Encoder em uma pontuação de relevância por par.
+    Modelos com duas classes (ex.: msmarco) retornam logits [irrelevante, relevante];
+    nesse caso usa-se a probabilidade da classe relevante.
+    """
+    scores = np.asarray(raw_scores, dtype=np.float32)
+    if scores.ndim == 2 and scores.shape[1] > 1:
+        return 1.0 / (1.0 + np.exp(scores[:, 0] - scores[:, 1]))
+    return scores.reshape(-1)
+
+
+def _build_pairs(query: str, documents: list):
+    """Cria pares de [consulta, conteúdo do documento] para o modelo, ignorando documentos vazios."""
+    pairs = []
+    valid_documents = []
+
+    for doc in documents:
+        if hasattr(doc, 'page_content') and doc.page_content.strip():
+            pairs.append([query, doc.page_content])
+            valid_documents.append(doc)
+        else:
+            logging.warning("Documento sem conteúdo válido encontrado, ignorando.")
+
+    return pairs, valid_documents
+
+
+def _stage_one_scores(query: str, documents: list) -> np.ndarray:
+    """
+    Primeira etapa (barata) da cascata: combina a pontuação da busca (RRF, similaridade
+    vetorial ou, na falta delas, a posição no resultado) com a sobreposição léxica
+    entre consulta e documento. Ambas são normalizadas para [0, 1] entre os candidatos.
+    """
+    def normalized(values) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float32)
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.ones_like(values)
+
+    prior = [1.0 / (rank + 1) for rank in range(len(documents))]
+    for field in ("rrf_score", "retrieval_score", "bm25_score"):
+        if all(field in doc.metadata for doc in documents):
+            prior = [doc.metadata[field] for doc in documents]
+            break
+
+    query_terms = set(portuguese_tokens(query))
+    overlap = [
+        len(query_terms & set(portuguese_tokens(doc.page_content))) / len(query_terms) if query_terms else 0.0
+        for doc in documents
+    ]
+    return 0.5 * normalized(prior) + 0.5 * normalized(overlap)
+
+
+def _cascade_plan(query: str, documents: list, top_n: int):
+    """
+    Divide os candidatos em aceitos (claramente acima do corte do top-n na primeira
+    etapa), podados (claramente abaixo do corte ou além de RERANK_CASCADE_MAX_CANDIDATES)
+    e incertos, os únicos pontuados pelo Cross-Encoder. Retorna (aceitos, incertos)
+    como índices de `documents`; com a cascata desabilitada, todos são incertos.
+    """
+    if not config.RERANK_CASCADE_ENABLED or len(documents) <= top_n:
+        return [], list(range(len(documents)))
+
+    scores = _stage_one_scores(query, documents)
+    order = [int(i) for i in np.argsort(-scores, kind="stable")]
+    last_in, first_out = scores[order[top_n - 1]], scores[order[top_n]]
+    margin = config.RERANK_CASCADE_MARGIN
+    # Nunca menos candidatos que o top-n: os que estão dentro do corte não podem ser podados
+    max_candidates = max(config.RERANK_CASCADE_MAX_CANDIDATES, top_n)
+
+    accepted, uncertain = [], []
+    for rank, i in enumerate(order):
+        if scores[i] - first_out >= margin:
+            accepted.append(i)
+        elif rank < max_candidates and last_in - scores[i] < margin:
+            uncertain.append(i)
+    return accepted, uncertain
+
+
+def _predict(cross_encoder, pairs: list):
     """
+    Pontuações brutas dos pares e o tempo de inferência. Com o MicroBatchReranker, o
+    tempo é a parte da chamada no lote, sem a espera na fila (base da economia estimada).
+    """
+    if isinstance(cross_encoder, MicroBatchReranker):
+        future = cross_encoder.submit(pairs)
+        return future.result(), future.predict_seconds
+    start = time.perf_counter()
+    scores = cross_encoder.predict(pairs)
+    return scores, time.perf_counter() - start
+
+
+async def _apredict(cross_encoder, pairs: list):
+    """Versão assíncrona de `_predict`: a inferência roda fora do event loop."""
+    if isinstance(cross_encoder, MicroBatchReranker):
+        future = cross_encoder.submit(pairs)
+        scores = await asyncio.wrap_future(future)
+        return scores, future.predict_seconds
+    return await asyncio.to_thread(_predict, cross_encoder, pairs)
+
+
+def _cached_scores(query_key: str, documents: list, indices: list, score_cache):
+    """Busca no cache as pontuações dos candidatos. Retorna ({índice: pontuação}, índices ausentes)."""
+    if score_cache is None:
+        return {}, list(indices)
+    found = score_cache.get_many(query_key, [doc_key(documents[i]) for i in indices])
+    scores = {i: found[doc_key(documents[i])] for i in indices if doc_key(documents[i]) in found}
+    record_cache("rerank_score", "hit", len(scores))
+    record_cache("rerank_score", "miss", len(indices) - len(scores))
+    return scores, [i for i in indices if i not in scores]
+
+
+def _finish_cascade(query_key, documents, accepted, uncertain, scores, new_scores, elapsed, top_n, score_cache) -> list:
+    """
+    Guarda as novas pontuações no cache, registra as estatísticas e monta o resultado:
+    os aceitos na ordem da primeira etapa, seguidos dos incertos com maior pontuação.
+    """
+    if score_cache is not None:
+        score_cache.set_many(query_key, {doc_key(documents[i]): score for i, score in new_scores.items()})
+        saved = score_cache.record(len(new_scores), len(documents) - len(new_scores), elapsed)
+    else:
+        saved = 0.0
+    scores = {**scores, **new_scores}
+
+    best = sorted(uncertain, key=lambda i: scores[i], reverse=True)[:max(0, top_n - len(accepted))]
+    reranked_docs = [documents[i] for i in accepted[:top_n] + best]
+
+    logging.info(
+        f"Documentos reordenados. Retornando os {len(reranked_docs)} melhores de {len(documents)} documentos válidos "
+        f"(cascata: {len(accepted)} aceitos, {len(uncertain)} incertos, {len(documents) - len(accepted) - len(uncertain)} podados; "
+        f"{len(new_scores)} pares no Cross-Encoder, {len(uncertain) - len(new_scores)} do cache; "
+        f"~{saved * 1000.0:.0f} ms economizados)."
+    )
+    return reranked_docs
+
+
+def _rerank_top_n(documents: list, top_n: int) -> int:
+    """Registra o início do re-ranking e limita `top_n` ao número de documentos."""
     logging.info("Reordenando documentos com Cross-Encoder...")
-    
+
     # Verifica se há documentos para reordenar
     if not documents:
         logging.warning("Nenhum documento fornecido para re-ranking.")
-        return []
-    
+        return 0
+
     # Limita o número de documentos se necessário
     if len(documents) < top_n:
         top_n = len(documents)
         logging.info(f"Ajustando top_n para {top_n} devido ao número limitado de documentos.")
-    
+    return top_n
+
+
+def _rerank_plan(query: str, documents: list, top_n: int, cross_encoder, score_cache):
+    """
+    Etapas comuns às versões síncrona e assíncrona do re-ranking: resolve o modelo e o
+    cache compartilhados, monta os pares, planeja a cascata e consulta o cache.
+    Retorna `(cross_encoder, score_cache, pairs, valid_documents, query_key, accepted,
+    uncertain, scores, missing)`, ou None quando não há documentos válidos.
+    """
+    # Usa o modelo já carregado no processo em vez de recarregá-lo a cada chamada
+    if cross_encoder is None:
+        cross_encoder = get_registry().reranker
+        score_cache = score_cache or get_registry().rerank_score_cache
+
+    pairs, valid_documents = _build_pairs(query, documents)
+    if not pairs:
+        logging.warning("Nenhum documento válido para re-ranking.")
+        return None
+
+    query_key = RerankScoreCache.query_key(query)
+    accepted, uncertain = _cascade_plan(query, valid_documents, min(top_n, len(valid_documents)))
+    scores, missing = _cached_scores(query_key, valid_documents, uncertain, score_cache)
+    return cross_encoder, score_cache, pairs, valid_documents, query_key, accepted, uncertain, scores, missing
+
+
+def _rerank_fallback(documents: list, top_n: int, error: Exception = None) -> list:
+    """Fallback do re-ranking: retorna os primeiros documentos sem reordená-los."""
+    if error is not None:
+        logging.error(f"Erro no re-ranking com Cross-Encoder: {error}")
+        logging.info("Usando fallback: retornando documentos sem re-ranking.")
+    record_fallback("rerank")
+    return documents[:top_n]
+
+
+def rerank_with_cross_encoder(query: str, documents: list, top_n: int = 5, cross_encoder=None, score_cache=None):
+    """
+    Reordena uma lista de documentos com base na relevância para a consulta usando um Cross-Encoder.
+    Se `cross_encoder` não for informado, usa o motor de re-ranking compartilhado do
+    registro de componentes, que agrupa os pares de requisições concorrentes em lotes,
+    e o cache de pontuações compartilhado.
+
+    O re-ranking é em cascata: uma primeira etapa barata aceita ou poda os candidatos
+    bem separados e o Cross-Encoder pontua apenas a faixa incerta (ver `_cascade_plan`).
+    """
+    top_n = _rerank_top_n(documents, top_n)
+    if not documents:
+        return []
+
     try:
-        # Inicializa o modelo. Na primeira execução, ele será baixado.
-        cross_encoder = CrossEncoder('amberoad/bert-multilingual-passage-reranking-msmarco')
-        
-        # Cria pares de [consulta, conteúdo do documento] para o modelo
-        pairs = []
-        valid_documents = []
-        
-        for doc in documents:
-            if hasattr(doc, 'page_content') and doc.page_content.strip():
-                pairs.append([query, doc.page_content])
-                valid_documents.append(doc)
-            else:
-                logging.warning("Documento sem conteúdo válido encontrado, ignorando.")
-        
-        if not pairs:
-            logging.warning("Nenhum documento válido para re-ranking.")
-            return documents[:top_n]  # Retorna os primeiros documentos como fallback
-        
-        # Calcula as pontuações de relevância
-        scores = cross_encoder.predict(pairs)
-        
-        # Combina os documentos com suas pontuações e ordena
-        doc_scores = list(zip(valid_documents, scores))
-        doc_scores.sort(key=lambda x: x[1], reverse=True)
-        
-        # Retorna os 'top_n' documentos mais relevantes
-        reranked_docs = [doc for doc, score in doc_scores[:top_n]]
-        
-        logging.info(f"Documentos reordenados. Retornando os {top_n} melhores de {len(valid_documents)} documentos válidos.")
-        return reranked_docs
-        
+        plan = _rerank_plan(query, documents, top_n, cross_encoder, score_cache)
+        if plan is None:
+            return _rerank_fallback(documents, top_n)
+        cross_encoder, score_cache, pairs, valid_documents, query_key, accepted, uncertain, scores, missing = plan
+
+        # Calcula as pontuações de relevância apenas dos pares que faltam
+        new_scores, elapsed = {}, 0.0
+        if missing:
+            raw_scores, elapsed = _predict(cross_encoder, [pairs[i] for i in missing])
+            new_scores = dict(zip(missing, _relevance_scores(raw_scores)))
+
+        return _finish_cascade(query_key, valid_documents, accepted, uncertain, scores, new_scores, elapsed, top_n, score_cache)
+
+    except Exception as e:
+        return _rerank_fallback(documents, top_n, e)
+
+
+async def arerank_with_cross_encoder(query: str, documents: list, top_n: int = 5, cross_encoder=None, score_cache=None):
+    """
+    Versão assíncrona de `rerank_with_cross_encoder`. A inferência (CPU) nunca roda no
+    event loop: vai para a thread do micro-batching ou para o executor padrão.
+    """
+    top_n = _rerank_top_n(documents, top_n)
+    if not documents:
+        return []
+
+    try:
+        plan = _rerank_plan(query, documents, top_n, cross_encoder, score_cache)
+        if plan is None:
+            return _rerank_fallback(documents, top_n)
+        cross_encoder, score_cache, pairs, valid_documents, query_key, accepted, uncertain, scores, missing = plan
+
+        new_scores, elapsed = {}, 0.0
+        if missing:
+            raw_scores, elapsed = await _apredict(cross_encoder, [pairs[i] for i in missing])
+            new_scores = dict(zip(missing, _relevance_scores(raw_scores)))
+
+        return _finish_cascade(query_key, valid_documents, accepted, uncertain, scores, new_scores, elapsed, top_n, score_cache)
+
+    except Exception as e:
+        return _rerank_fallback(documents, top_n, e)
+
+        query_key = RerankScoreCache.query_key(query)
+        accepted, uncertain = _cascade_plan(query, valid_documents, min(top_n, len(valid_documents)))
+        scores, missing = _cached_scores(query_key, valid_documents, uncertain, score_cache)
+
+        new_scores, elapsed = {}, 0.0
+        if missing:
+            raw_scores, elapsed = await _apredict(cross_encoder, [pairs[i] for i in missing])
+            new_scores = dict(zip(missing, _relevance_scores(raw_scores)))
+
+        return _finish_cascade(query_key, valid_documents, accepted, uncertain, scores, new_scores, elapsed, top_n, score_cache)
+
     except Exception as e:
         logging.error(f"Erro no re-ranking com Cross-Encoder: {e}")
-        # Fallback: retorna os primeiros documentos sem re-ranking
         logging.info("Usando fallback: retornando documentos sem re-ranking.")
-        return documents[:top_n]
\ No newline at end of file
+        record_fallback("rerank")
+        return documents[:top_n]
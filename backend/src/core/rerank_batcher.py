@@ -0,0 +1,171 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class _RerankRequest:
+    """Pares (consulta, documento) de uma chamada e o future que receberá as pontuações."""
+
+    __slots__ = ("pairs", "future")
+
+    def __init__(self, pairs: list):
+        self.pairs = pairs
+        self.future = Future()
+
+
+class MicroBatchReranker:
+    """
+    Motor de re-ranking em processo que agrupa pares de requisições concorrentes.
+
+    Uma thread dedicada coleta os pares enfileirados até atingir `max_batch_size`
+    pares ou esperar `max_wait_ms` desde o primeiro pedido do lote, executa um
+    único `predict` do Cross-Encoder e devolve a cada chamador as suas pontuações.
+    """
+
+    def __init__(self, cross_encoder, max_batch_size: int = 64, max_wait_ms: float = 5.0, num_threads: int = 0):
+        self.cross_encoder = cross_encoder
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.num_threads = num_threads
+
+        self._queue = queue.Queue()
+        self._carry = None
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._requests = 0
+        self._pairs = 0
+        self._predict_seconds = 0.0
+        self._closed = False
+
+        self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, pairs: list) -> Future:
+        """
+        Enfileira os pares e retorna um future com as pontuações brutas de cada par.
+        Concluído, o future tem `predict_seconds`: a parte desta chamada no tempo de
+        inferência do lote, sem a espera na fila.
+        """
+        if self._closed:
+            raise RuntimeError("O motor de re-ranking foi encerrado.")
+
+        request = _RerankRequest(pairs)
+        if not pairs:
+            request.future.predict_seconds = 0.0
+            request.future.set_result(np.empty((0,), dtype=np.float32))
+        else:
+            self._queue.put(request)
+        return request.future
+
+    def predict(self, pairs: list, **kwargs) -> np.ndarray:
+        """Versão bloqueante de `submit`, com a mesma interface do `CrossEncoder.predict`."""
+        return self.submit(pairs).result()
+
+    def close(self):
+        """Encerra a thread de inferência após processar o que já está na fila."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def stats(self) -> dict:
+        """Estatísticas dos lotes efetivamente executados."""
+        with self._stats_lock:
+            batches = sum(self._batch_sizes.values())
+            return {
+                "batches": batches,
+                "requests": self._requests,
+                "pairs": self._pairs,
+                "avg_batch_size": (self._pairs / batches) if batches else 0.0,
+                "avg_requests_per_batch": (self._requests / batches) if batches else 0.0,
+                "avg_predict_ms": (self._predict_seconds * 1000.0 / batches) if batches else 0.0,
+                "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000.0,
+                "num_threads": self.num_threads,
+            }
+
+    def _configure_threads(self):
+        """Limita as threads de inferência do PyTorch, se configurado."""
+        if self.num_threads and self.num_threads > 0:
+            try:
+                import torch
+                torch.set_num_threads(self.num_threads)
+            except ImportError:
+                logging.warning("PyTorch não disponível; ignorando o número de threads configurado.")
+
+    def _next_request(self, timeout=None):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return self._queue.get(timeout=timeout) if timeout is not None else self._queue.get()
+
+    def _collect_batch(self):
+        """Bloqueia até o primeiro pedido e agrupa os seguintes até o limite de tamanho ou tempo."""
+        first = self._next_request()
+        if first is None:
+            return None
+
+        batch = [first]
+        size = len(first.pairs)
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._next_request(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Reenfileira o sinal de parada para encerrar após este lote
+                self._queue.put(None)
+                break
+            if size + len(request.pairs) > self.max_batch_size:
+                # Não cabe neste lote: abre o próximo
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request.pairs)
+
+        return batch
+
+    def _run(self):
+        self._configure_threads()
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+
+            pairs = [pair for request in batch for pair in request.pairs]
+            start = time.perf_counter()
+            try:
+                scores = np.asarray(self.cross_encoder.predict(pairs, batch_size=len(pairs)))
+            except Exception as e:
+                logging.error(f"Erro na inferência em lote do Cross-Encoder: {e}")
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            for request in batch:
+                # Parte do tempo de inferência do lote que cabe a esta chamada (sem o tempo na fila)
+                request.future.predict_seconds = elapsed * len(request.pairs) / len(pairs)
+                request.future.set_result(scores[offset:offset + len(request.pairs)])
+                offset += len(request.pairs)
+
+            with self._stats_lock:
+                self._batch_sizes[len(pairs)] += 1
+                self._requests += len(batch)
+                self._pairs += len(pairs)
+                self._predict_seconds += elapsed
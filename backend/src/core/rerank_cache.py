@@ -0,0 +1,90 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class RerankScoreCache:
+    """
+    Cache LRU das pontuações do Cross-Encoder, por (hash da consulta, chunk_id).
+    Repetições da mesma consulta (reenvios, novas tentativas) não voltam ao modelo.
+    Também acumula as estatísticas da cascata de re-ranking (pares pontuados,
+    pares evitados e o tempo estimado economizado).
+    """
+
+    # Peso da última medição na média móvel do tempo por par
+    _TIMING_ALPHA = 0.2
+
+    def __init__(self, max_entries: int = 20000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pairs_scored = 0
+        self.pairs_skipped = 0
+        self.seconds_per_pair = None
+        self.seconds_saved = 0.0
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+    def get_many(self, query_key: str, chunk_ids: list) -> dict:
+        """Retorna {chunk_id: pontuação} das entradas presentes no cache."""
+        found = {}
+        with self._lock:
+            for chunk_id in chunk_ids:
+                key = (query_key, chunk_id)
+                score = self._entries.get(key)
+                if score is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                found[chunk_id] = score
+                self.hits += 1
+        return found
+
+    def set_many(self, query_key: str, scores: dict):
+        with self._lock:
+            for chunk_id, score in scores.items():
+                key = (query_key, chunk_id)
+                self._entries[key] = float(score)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record(self, pairs_scored: int, pairs_skipped: int, seconds: float) -> float:
+        """
+        Registra uma chamada da cascata e retorna o tempo estimado economizado,
+        com base na média móvel do tempo do Cross-Encoder por par.
+        """
+        with self._lock:
+            if pairs_scored:
+                per_pair = seconds / pairs_scored
+                if self.seconds_per_pair is None:
+                    self.seconds_per_pair = per_pair
+                else:
+                    self.seconds_per_pair += self._TIMING_ALPHA * (per_pair - self.seconds_per_pair)
+            saved = pairs_skipped * (self.seconds_per_pair or 0.0)
+            self.pairs_scored += pairs_scored
+            self.pairs_skipped += pairs_skipped
+            self.seconds_saved += saved
+            return saved
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "pairs_scored": self.pairs_scored,
+                "pairs_skipped": self.pairs_skipped,
+                "avg_ms_per_pair": (self.seconds_per_pair or 0.0) * 1000.0,
+                "seconds_saved": self.seconds_saved,
+            }
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+from .text_normalization import normalize_essay_text, word_tokens
+
+# Configura o logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Primo de Mersenne usado no hashing universal das permutações do MinHash
+_MERSENNE_PRIME = (1 << 31) - 1
+
+CACHE_EXACT = "exact"
+CACHE_NEAR = "near"
+CACHE_MISS = "miss"
+
+
+class NearDuplicateResultCache:
+    """
+    Cache das correções finais que reconhece redações idênticas e quase idênticas.
+
+    Cada redação vira uma assinatura MinHash sobre shingles de palavras. Um índice
+    LSH (bandas da assinatura) limita a comparação aos candidatos que colidem em
+    alguma banda, mantendo a busca sublinear. Um candidato é aceito quando a
+    similaridade de Jaccard estimada atinge `threshold`. A remoção é LRU, limitada
+    a `max_entries`.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries: int = 2000,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm deve ser múltiplo de bands.")
+
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # chave exata -> (assinatura, resultado)
+        self._buckets = defaultdict(set)  # (banda, hash da banda) -> chaves exatas
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _exact_key(essay_text: str) -> str:
+        return hashlib.sha256(normalize_essay_text(essay_text).encode("utf-8")).hexdigest()
+
+    def _shingles(self, essay_text: str) -> set:
+        tokens = word_tokens(essay_text)
+        if len(tokens) <= self.shingle_size:
+            return {" ".join(tokens)}
+        return {" ".join(tokens[i:i + self.shingle_size]) for i in range(len(tokens) - self.shingle_size + 1)}
+
+    def _signature(self, essay_text: str) -> np.ndarray:
+        """Assinatura MinHash: o menor hash de cada permutação sobre os shingles."""
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little") % _MERSENNE_PRIME
+                for shingle in self._shingles(essay_text)
+            ),
+            dtype=np.uint64,
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def lookup(self, essay_text: str):
+        """
+        Procura uma correção já gerada para esta redação.
+        Retorna (resultado, status), com status "exact", "near" ou "miss".
+        """
+        exact_key = self._exact_key(essay_text)
+        with self._lock:
+            entry = self._entries.get(exact_key)
+            if entry is not None:
+                self._entries.move_to_end(exact_key)
+                self.exact_hits += 1
+                return entry[1], CACHE_EXACT
+
+        signature = self._signature(essay_text)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates.update(self._buckets.get(band_key, ()))
+
+            best_key, best_similarity = None, 0.0
+            for candidate in candidates:
+                candidate_signature, _ = self._entries[candidate]
+                similarity = float(np.mean(candidate_signature == signature))
+                if similarity > best_similarity:
+                    best_key, best_similarity = candidate, similarity
+
+            if best_key is not None and best_similarity >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self.near_hits += 1
+                logging.info(f"Correção quase duplicada encontrada no cache (similaridade estimada {best_similarity:.2f}).")
+                return self._entries[best_key][1], CACHE_NEAR
+
+            self.misses += 1
+            return None, CACHE_MISS
+
+    def store(self, essay_text: str, result: str):
+        """Armazena a correção gerada para esta redação."""
+        exact_key = self._exact_key(essay_text)
+        signature = self._signature(essay_text)
+        with self._lock:
+            if exact_key in self._entries:
+                self._remove(exact_key)
+            self._entries[exact_key] = (signature, result)
+            for band_key in self._band_keys(signature):
+                self._buckets[band_key].add(exact_key)
+
+            while self.max_entries and len(self._entries) > self.max_entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def _remove(self, exact_key: str):
+        signature, _ = self._entries.pop(exact_key)
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(exact_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.near_hits + self.misses
+            return {
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": ((self.exact_hits + self.near_hits) / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+            }
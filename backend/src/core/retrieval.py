@@ -0,0 +1,102 @@
+"""
+Combinação de resultados de vários retrievers (vetorial e BM25) e de várias consultas
+(documento HyDE, redação, parágrafos) com Reciprocal Rank Fusion.
+"""
+import re
+import asyncio
+import hashlib
+import logging
+from typing import List
+
+from langchain_core.documents import Document
+
+from .metrics import record_fallback
+
+
+def doc_key(doc: Document) -> str:
+    """Chave de deduplicação de um documento: o `chunk_id` ou, na falta dele, o hash do conteúdo."""
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id:
+        return chunk_id
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists, k: int = 60, limit: int = None) -> List[Document]:
+    """
+    Funde listas ranqueadas somando 1 / (k + posição) de cada documento em cada lista.
+    Documentos repetidos são unificados pela `doc_key`; a pontuação final fica em
+    `metadata["rrf_score"]`.
+    """
+    scores, documents = {}, {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+
+    fused = []
+    for key in sorted(scores, key=scores.get, reverse=True)[:limit]:
+        doc = documents[key]
+        metadata = dict(doc.metadata)
+        metadata["rrf_score"] = scores[key]
+        fused.append(Document(page_content=doc.page_content, metadata=metadata))
+    return fused
+
+
+async def aretrieve_fused(query: str, retrievers: list, limit: int = None, rrf_k: int = 60) -> List[Document]:
+    """
+    Consulta todos os retrievers em paralelo e funde os resultados com RRF.
+    Um retriever que falha é ignorado (com aviso) desde que ao menos um responda.
+    """
+    results = await asyncio.gather(*(retriever.ainvoke(query) for retriever in retrievers), return_exceptions=True)
+
+    result_lists = []
+    for retriever, result in zip(retrievers, results):
+        if isinstance(result, Exception):
+            logging.warning(f"Falha no retriever {type(retriever).__name__}: {result}")
+        else:
+            result_lists.append(result)
+
+    if not result_lists:
+        raise results[0]
+    if len(result_lists) == 1:
+        return result_lists[0][:limit]
+    return reciprocal_rank_fusion(result_lists, k=rrf_k, limit=limit)
+
+
+def essay_section_queries(essay_text: str) -> dict:
+    """
+    Divide a redação em introdução, desenvolvimento e conclusão, para consultas por
+    seção. Os parágrafos são separados por linhas em branco ou, na falta delas, por
+    quebras de linha. Retorna {} se a redação tiver menos de três parágrafos.
+    """
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", essay_text) if p.strip()]
+    if len(paragraphs) < 3:
+        paragraphs = [p.strip() for p in essay_text.splitlines() if p.strip()]
+    if len(paragraphs) < 3:
+        return {}
+    return {
+        "introducao": paragraphs[0],
+        "desenvolvimento": "\n\n".join(paragraphs[1:-1]),
+        "conclusao": paragraphs[-1],
+    }
+
+
+async def aretrieve_branch(name: str, query: str, retrievers: list, rrf_k: int = 60) -> List[Document]:
+    """Um ramo da busca com várias consultas. Falhas são registradas e resultam em lista vazia."""
+    try:
+        documents = await aretrieve_fused(query, retrievers, rrf_k=rrf_k)
+    except Exception as e:
+        logging.warning(f"Falha na busca do ramo '{name}': {e}")
+        record_fallback("retrieval_branch")
+        return []
+    logging.info(f"Ramo '{name}': {len(documents)} documentos")
+    return documents
+
+
+def merge_branches(branch_results: list, limit: int = None, rrf_k: int = 60) -> List[Document]:
+    """Funde os candidatos de todos os ramos, sem duplicatas de `chunk_id`, antes do re-ranking."""
+    non_empty = [documents for documents in branch_results if documents]
+    if len(non_empty) == 1:
+        return non_empty[0][:limit]
+    return reciprocal_rank_fusion(non_empty, k=rrf_k, limit=limit)
@@ -0,0 +1,13 @@
+import re
+import unicodedata
+
+
+def normalize_essay_text(essay_text: str) -> str:
+    """Normaliza a redação (Unicode NFC e espaços) para que reenvios idênticos gerem a mesma chave."""
+    text = unicodedata.normalize("NFC", essay_text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def word_tokens(text: str) -> list:
+    """Divide o texto normalizado em palavras minúsculas."""
+    return re.findall(r"\w+", normalize_essay_text(text).lower())
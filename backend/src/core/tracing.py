@@ -0,0 +1,93 @@
+"""
+Medição do tempo de cada etapa do pipeline por requisição.
+
+`trace_request()` abre um registro no contexto atual (contextvars), identificado
+pelo id da requisição, e `stage(nome)` acumula nele a duração do bloco. Tarefas
+criadas dentro da requisição herdam o registro. Fora de um `trace_request()`, as
+etapas só alimentam as métricas do Prometheus.
+"""
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from . import metrics
+
+_current_trace = ContextVar("pipeline_trace", default=None)
+
+
+class RequestTrace:
+    """Etapas, spans e tokens de uma requisição."""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started_at = time.perf_counter()
+        self.stages = {}  # etapa -> segundos (somados, se a etapa rodar mais de uma vez)
+        self.spans = []   # [{"stage", "start", "seconds"}], com início relativo à requisição
+        self.tokens = {"prompt": 0, "completion": 0}
+
+    def add_span(self, name: str, start: float, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.spans.append({"stage": name, "start": round(start - self.started_at, 4), "seconds": round(seconds, 4)})
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def timings_ms(self) -> dict:
+        """Duração de cada etapa em milissegundos, mais o total."""
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings["total"] = round(self.elapsed() * 1000, 1)
+        return timings
+
+    def server_timing(self) -> str:
+        """Valor do cabeçalho Server-Timing (ex.: "hyde;dur=812.3, rerank;dur=95.0, total;dur=2410.7")."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings_ms().items())
+
+    def summary(self) -> str:
+        """Resumo de uma linha para o log."""
+        stages = " ".join(f"{name}={seconds:.2f}s" for name, seconds in self.stages.items()) or "-"
+        return (
+            f"total={self.elapsed():.2f}s etapas: {stages} | "
+            f"tokens: prompt={self.tokens['prompt']} completion={self.tokens['completion']}"
+        )
+
+
+@contextmanager
+def trace_request(request_id: str = None):
+    """Abre um registro de etapas para a requisição; produz o RequestTrace."""
+    trace = RequestTrace(request_id or uuid.uuid4().hex)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def stage(name: str):
+    """Mede a duração do bloco como a etapa `name` (métricas e registro atual, se houver)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.STAGE_SECONDS.labels(name).observe(seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, start, seconds)
+
+
+def record_tokens(upstream: str, operation: str, prompt_tokens: int, completion_tokens: int):
+    """Registra os tokens informados pela API na requisição atual e nas métricas."""
+    prompt_tokens, completion_tokens = int(prompt_tokens or 0), int(completion_tokens or 0)
+    metrics.LLM_TOKENS.labels(upstream, operation, "prompt").inc(prompt_tokens)
+    metrics.LLM_TOKENS.labels(upstream, operation, "completion").inc(completion_tokens)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tokens["prompt"] += prompt_tokens
+        trace.tokens["completion"] += completion_tokens
+
+
+def current_trace():
+    """O registro de etapas da requisição atual, ou None."""
+    return _current_trace.get()
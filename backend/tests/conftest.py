@@ -0,0 +1,11 @@
+"""
+Configuração dos testes (a partir da raiz do repositório: python -m pytest backend/tests).
+
+Os módulos do backend são importados como na API (`import config`, `src.core...`).
+Os testes cobrem as partes sensíveis a concorrência e não acessam a rede.
+"""
+import os
+import sys
+
+# Adiciona o diretório raiz do backend ao path para encontrar os módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
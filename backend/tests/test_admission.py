@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from src.core.admission import AdmissionController
+from src.core.errors import OverloadedError, QueueFullError
+
+
+def test_queue_full_is_rejected_with_429():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, max_wait_seconds=5)
+        ticket = await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+        assert controller.waiting == 1
+
+        with pytest.raises(QueueFullError) as excinfo:
+            await controller.acquire()
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.retry_after >= 1
+        assert controller.rejected_queue_full == 1
+
+        ticket.release()
+        (await waiter).release()
+
+    asyncio.run(scenario())
+
+
+def test_wait_timeout_is_rejected_with_503():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, max_wait_seconds=0.05)
+        ticket = await controller.acquire()
+        with pytest.raises(OverloadedError) as excinfo:
+            await controller.acquire()
+        assert not isinstance(excinfo.value, QueueFullError)
+        assert excinfo.value.status_code == 503
+        assert controller.waiting == 0
+        assert controller.rejected_wait == 1
+        ticket.release()
+
+    asyncio.run(scenario())
+
+
+def test_release_is_idempotent():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        ticket = await controller.acquire()
+        ticket.release()
+        ticket.release()
+        assert controller.in_flight == 0
+
+        # Uma segunda liberação não pode abrir uma vaga extra
+        first = await controller.acquire()
+        with pytest.raises(QueueFullError):
+            await controller.acquire()
+        first.release()
+
+    asyncio.run(scenario())
+
+
+def test_waiters_are_admitted_in_order_after_release():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=4, max_wait_seconds=5)
+        ticket = await controller.acquire()
+        order = []
+
+        async def waiter(name):
+            async with controller.admit():
+                order.append(name)
+
+        tasks = [asyncio.create_task(waiter(name)) for name in "abc"]
+        await asyncio.sleep(0)
+        assert controller.waiting == 3
+        ticket.release()
+        await asyncio.gather(*tasks)
+
+        assert order == ["a", "b", "c"]
+        assert controller.in_flight == 0
+        assert controller.admitted == 4
+
+    asyncio.run(scenario())
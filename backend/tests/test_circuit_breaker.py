@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import config
+from src.core import llm_clients
+from src.core.errors import CircuitOpenError, UpstreamError
+from src.core.llm_clients import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker
+
+
+def _fail(breaker, times=1):
+    for _ in range(times):
+        trial = breaker.before_call()
+        breaker.after_call(True, trial)
+
+
+def _open_breaker(reset_seconds=0.05):
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_seconds=reset_seconds)
+    _fail(breaker, 2)
+    assert breaker.state == CIRCUIT_OPEN
+    return breaker
+
+
+def test_opens_after_consecutive_failures_and_rejects():
+    breaker = CircuitBreaker("teste", failure_threshold=3, reset_seconds=60)
+    _fail(breaker, 2)
+    assert breaker.state == CIRCUIT_CLOSED
+
+    _fail(breaker)
+    assert breaker.state == CIRCUIT_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.rejected == 1
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker("teste", failure_threshold=2, reset_seconds=60)
+    _fail(breaker)
+    trial = breaker.before_call()
+    breaker.after_call(False, trial)
+    _fail(breaker)
+    assert breaker.state == CIRCUIT_CLOSED
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+
+    assert breaker.before_call() is True
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_trial_success_closes_and_trial_failure_reopens():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+    breaker.after_call(True, breaker.before_call())
+    assert breaker.state == CIRCUIT_OPEN
+
+    time.sleep(0.06)
+    breaker.after_call(False, breaker.before_call())
+    assert breaker.state == CIRCUIT_CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+def test_other_calls_do_not_clear_the_trial_flag():
+    breaker = _open_breaker()
+    time.sleep(0.06)
+    trial = breaker.before_call()
+
+    # Uma chamada iniciada antes da abertura termina durante o teste
+    breaker.after_call(None, False)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.after_call(None, trial)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    assert breaker.before_call() is True
+
+
+@pytest.fixture
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(llm_clients, "_breakers", {})
+    monkeypatch.setattr(config, "CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(config, "CIRCUIT_RESET_SECONDS", 60)
+
+
+def _raise(error):
+    def call():
+        raise error
+    return call
+
+
+def test_rate_limits_and_local_errors_do_not_count_as_success(fresh_breakers):
+    breaker = llm_clients.circuit_breaker(llm_clients.UPSTREAM_OPENAI)
+    outage = UpstreamError(llm_clients.UPSTREAM_OPENAI, "HTTP 503", retryable=True)
+    rate_limited = UpstreamError(llm_clients.UPSTREAM_OPENAI, "HTTP 429", retryable=True)
+    rate_limited.http_status = 429
+
+    with pytest.raises(UpstreamError):
+        llm_clients.call_upstream(llm_clients.UPSTREAM_OPENAI, "teste", _raise(outage), timeout=1, retries=0)
+    with pytest.raises(UpstreamError):
+        llm_clients.call_upstream(llm_clients.UPSTREAM_OPENAI, "teste", _raise(rate_limited), timeout=1, retries=0)
+    with pytest.raises(KeyError):
+        llm_clients.call_upstream(llm_clients.UPSTREAM_OPENAI, "teste", _raise(KeyError("bug")), timeout=1, retries=0)
+    assert breaker.consecutive_failures == 1
+
+    with pytest.raises(UpstreamError):
+        llm_clients.call_upstream(llm_clients.UPSTREAM_OPENAI, "teste", _raise(outage), timeout=1, retries=0)
+    assert breaker.state == CIRCUIT_OPEN
@@ -0,0 +1,137 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from src.core.job_queue import JOB_DONE, JOB_ERROR, JOB_QUEUED, JOB_RUNNING, JobQueue, JobStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def test_each_item_is_claimed_by_a_single_worker(db_path):
+    first, second = JobStore(db_path), JobStore(db_path)
+    job_id = first.create_job(["a", "b", "c"], mode="fast")
+
+    claimed = []
+    while True:
+        item = (first if len(claimed) % 2 == 0 else second).claim_next(f"worker-{len(claimed) % 2}", lease_seconds=60)
+        if item is None:
+            break
+        claimed.append(item)
+
+    assert [(job, idx, text, mode) for job, idx, text, mode in claimed] == [
+        (job_id, 0, "a", "fast"), (job_id, 1, "b", "fast"), (job_id, 2, "c", "fast")
+    ]
+    assert first.get_job(job_id)["counts"][JOB_RUNNING] == 3
+
+
+def test_only_expired_leases_are_requeued(db_path):
+    store = JobStore(db_path)
+    job_id = store.create_job(["a", "b"])
+    store.claim_next("vivo", lease_seconds=60)
+    store.claim_next("morto", lease_seconds=-1)
+
+    assert store.requeue_interrupted() == 1
+    counts = store.get_job(job_id)["counts"]
+    assert counts[JOB_RUNNING] == 1 and counts[JOB_QUEUED] == 1
+    assert store.claim_next("outro", lease_seconds=60)[1] == 1
+
+
+def test_result_is_discarded_after_losing_the_lease(db_path):
+    store = JobStore(db_path)
+    job_id = store.create_job(["a"])
+    store.claim_next("lento", lease_seconds=-1)
+    store.requeue_interrupted()
+    store.claim_next("novo", lease_seconds=60)
+
+    assert not store.update_item(job_id, 0, JOB_DONE, result="antigo", worker_id="lento")
+    assert store.update_item(job_id, 0, JOB_DONE, result="novo", worker_id="novo")
+    assert store.get_job(job_id)["items"][0]["correction"] == "novo"
+
+
+def test_queue_resumes_interrupted_items_and_processes_each_once(db_path):
+    store = JobStore(db_path)
+    job_id = store.create_job([f"redação {i}" for i in range(6)])
+    store.claim_next("processo-parado", lease_seconds=-1)  # item interrompido por uma parada anterior
+    processed = []
+
+    async def process(text, mode):
+        processed.append(text)
+        if text == "redação 5":
+            raise RuntimeError("falha")
+        return f"correção de {text}", "miss"
+
+    async def scenario():
+        queues = [JobQueue(JobStore(db_path), workers=2, poll_interval=0.01) for _ in range(2)]
+        for queue in queues:
+            await queue.start(process)
+        for _ in range(200):
+            job = await queues[0].get(job_id)
+            if job["counts"][JOB_QUEUED] == 0 and job["counts"][JOB_RUNNING] == 0:
+                break
+            await asyncio.sleep(0.01)
+        for queue in queues:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+    job = store.get_job(job_id)
+    assert sorted(processed) == sorted(f"redação {i}" for i in range(6))
+    assert job["counts"][JOB_DONE] == 5 and job["counts"][JOB_ERROR] == 1
+    assert job["status"] == "partial"
+    assert job["items"][0]["correction"] == "correção de redação 0"
+
+
+def test_stop_releases_items_in_progress(db_path):
+    store = JobStore(db_path)
+    job_id = store.create_job(["a"])
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def process(text, mode):
+            started.set()
+            await asyncio.sleep(60)
+
+        queue = JobQueue(JobStore(db_path), workers=1, poll_interval=0.01)
+        await queue.start(process)
+        await asyncio.wait_for(started.wait(), timeout=5)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert store.get_job(job_id)["counts"][JOB_QUEUED] == 1
+
+
+def test_workers_survive_a_failed_claim(db_path, monkeypatch):
+    store = JobStore(db_path)
+    job_id = store.create_job(["a", "b"])
+    queue = JobQueue(JobStore(db_path), workers=2, poll_interval=0.01)
+
+    original_claim = queue.store.claim_next
+    failures = {"left": 2}
+
+    def flaky_claim(*args, **kwargs):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        return original_claim(*args, **kwargs)
+
+    monkeypatch.setattr(queue.store, "claim_next", flaky_claim)
+
+    async def process(text, mode):
+        return f"correção de {text}", "miss"
+
+    async def scenario():
+        await queue.start(process)
+        for _ in range(200):
+            if (await queue.get(job_id))["counts"][JOB_DONE] == 2:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert failures["left"] == 0
+    assert store.get_job(job_id)["status"] == JOB_DONE
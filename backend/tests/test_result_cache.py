@@ -0,0 +1,46 @@
+from src.core.result_cache import NearDuplicateResultCache
+
+ESSAY = (
+    "A educação pública no Brasil enfrenta desafios históricos, como a evasão escolar e a falta de "
+    "investimento na formação de professores. Nesse sentido, é necessário que o governo amplie os "
+    "recursos destinados às escolas e valorize os profissionais da educação, garantindo que todos os "
+    "jovens tenham acesso a um ensino de qualidade. Além disso, a participação das famílias na vida "
+    "escolar contribui para reduzir o abandono e melhorar o desempenho dos estudantes em todo o país."
+)
+UNRELATED = (
+    "O desmatamento da Amazônia ameaça a biodiversidade e o equilíbrio climático do planeta. As "
+    "queimadas ilegais e a expansão da fronteira agrícola avançam sobre áreas protegidas, enquanto a "
+    "fiscalização ambiental permanece insuficiente. Portanto, cabe ao Estado fortalecer os órgãos de "
+    "controle e incentivar a economia sustentável nas comunidades da floresta."
+)
+
+
+def test_exact_and_whitespace_variants_hit():
+    cache = NearDuplicateResultCache(threshold=0.8)
+    cache.store(ESSAY, "correção")
+    assert cache.lookup(ESSAY) == ("correção", "exact")
+    assert cache.lookup("  " + ESSAY.replace(". ", ".\n\n") + "  ")[0] == "correção"
+
+
+def test_small_edit_is_a_near_hit():
+    cache = NearDuplicateResultCache(threshold=0.8)
+    cache.store(ESSAY, "correção")
+    edited = ESSAY.replace("em todo o país.", "em todo o território nacional.")
+    assert cache.lookup(edited) == ("correção", "near")
+
+
+def test_different_essay_misses():
+    cache = NearDuplicateResultCache(threshold=0.8)
+    cache.store(ESSAY, "correção")
+    assert cache.lookup(UNRELATED) == (None, "miss")
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["near_hits"] == 0
+
+
+def test_lru_eviction_removes_the_oldest_entry():
+    cache = NearDuplicateResultCache(threshold=0.8, max_entries=1)
+    cache.store(ESSAY, "primeira")
+    cache.store(UNRELATED, "segunda")
+    assert cache.lookup(ESSAY) == (None, "miss")
+    assert cache.lookup(UNRELATED) == ("segunda", "exact")
+    assert cache.stats()["evictions"] == 1
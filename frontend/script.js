@@ -27,6 +27,9 @@ document.addEventListener("DOMContentLoaded", function () {
 
   // URL DA SUA API BACKEND LOCAL
   const API_URL = '/correct/';
+  // Arquivos são enviados ao servidor, que extrai o texto (PDF, DOCX ou TXT)
+  const FILE_API_URL = '/correct/file';
+  const MAX_FILE_BYTES = 5 * 1024 * 1024;
 
   // ================================
   // Lógica de Abas (Texto/Arquivo)
@@ -89,35 +92,40 @@ document.addEventListener("DOMContentLoaded", function () {
     e.preventDefault();
     iniciarEnvio();
     
-    let essayText = '';
-    
     try {
+        let response;
         if (currentInputMethod === 'text') {
-            essayText = essayTextarea.value;
+            const essayText = essayTextarea.value;
             if (!essayText.trim()) {
                 throw new Error("Por favor, insira o texto da redação.");
             }
+
+            mostrarFeedback("Analisando com a IA... Isso pode levar um momento.", "#43766c", 15000);
+            response = await fetch(API_URL, {
+                method: 'POST',
+                headers: {
+                  'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ text: essayText })
+            });
         } else { // 'file'
             const file = fileInput.files[0];
             if (!file) {
                 throw new Error("Por favor, selecione um arquivo.");
             }
-            mostrarFeedback("Extraindo texto do arquivo...", "#43766c", 10000);
-            essayText = await extractTextFromFile(file);
-            if (!essayText.trim()) {
-                throw new Error("O arquivo parece estar vazio ou não contém texto legível.");
+            if (file.size > MAX_FILE_BYTES) {
+                throw new Error("O arquivo passa do limite de 5MB.");
             }
+
+            // O servidor extrai o texto do arquivo e segue com a correção
+            const formData = new FormData();
+            formData.append("file", file);
+            mostrarFeedback("Enviando o arquivo e analisando com a IA... Isso pode levar um momento.", "#43766c", 15000);
+            response = await fetch(FILE_API_URL, {
+                method: 'POST',
+                body: formData
+            });
         }
-        
-        mostrarFeedback("Analisando com a IA... Isso pode levar um momento.", "#43766c", 15000);
-  
-        const response = await fetch(API_URL, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ text: essayText })
-        });
 
         if (!response.ok) {
             const errorData = await response.json();
@@ -175,62 +183,6 @@ document.addEventListener("DOMContentLoaded", function () {
     setTimeout(() => { feedback.classList.remove("active"); }, duracao);
   }
   
-  async function extractTextFromFile(file) {
-    // Exemplo para PDF e DOCX
-    if (file.type === "application/pdf") {
-      return await extractTextFromPDF(file);
-    } else if (
-      file.type === "application/vnd.openxmlformats-officedocument.wordprocessingml.document" ||
-      file.name.endsWith(".docx")
-    ) {
-      return await extractTextFromDocx(file);
-    } else if (file.type.startsWith("text/") || file.name.endsWith(".txt")) {
-      return await file.text();
-    } else {
-      throw new Error("Formato de arquivo não suportado.");
-    }
-  }
-
-  async function extractTextFromPDF(file) {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = async function () {
-        try {
-          const typedarray = new Uint8Array(reader.result);
-          const pdf = await pdfjsLib.getDocument({ data: typedarray }).promise;
-          let text = "";
-          for (let i = 1; i <= pdf.numPages; i++) {
-            const page = await pdf.getPage(i);
-            const content = await page.getTextContent();
-            text += content.items.map(item => item.str).join(" ") + "\n";
-          }
-          resolve(text);
-        } catch (err) {
-          reject("Erro ao extrair texto do PDF.");
-        }
-      };
-      reader.onerror = () => reject("Erro ao ler o arquivo PDF.");
-      reader.readAsArrayBuffer(file);
-    });
-  }
-
-  async function extractTextFromDocx(file) {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onload = async function (event) {
-        try {
-          mammoth.extractRawText({ arrayBuffer: event.target.result })
-            .then(result => resolve(result.value))
-            .catch(() => reject("Erro ao extrair texto do DOCX."));
-        } catch (err) {
-          reject("Erro ao processar o arquivo DOCX.");
-        }
-      };
-      reader.onerror = () => reject("Erro ao ler o arquivo DOCX.");
-      reader.readAsArrayBuffer(file);
-    });
-  }
-
   // ================================
   // Event Listeners Principais
   // ================================